@@ -0,0 +1,222 @@
+# coding: utf-8
+
+# Headless batch mode: compute the features (and fit the models) of all the
+# stations of a project without any GUI, e.g. overnight on a cluster node.
+#
+#   python batch.py PROJECT [--features TIME DATA.MEDIAN MODELS.LINEAR ...]
+#                           [--workers N] [--chunk-size N] [--output DIR]
+#
+# The stations are split in chunks, each chunk is loaded and processed by a
+# worker process; the results are written to the features store of the
+# project, {project}_lists/features_cache (see datasets/features_cache.py),
+# read by the GUI when the project is opened. Each value is stored with the
+# key of the data it was computed from, so that the GUI only uses it for
+# the same data (descriptor, time window, precision, models, component,
+# corrections and version of the data files).
+#
+# /!\ Like pygoda.py, must be launched from the pygoda.py folder.
+
+import argparse
+import concurrent.futures
+import glob
+import os
+import sys
+import time
+
+import config as cfg
+import constants as cst
+import projects
+from datasets import dataset
+from datasets import features_cache
+from datasets import fit_data
+from datasets import load_data
+from datasets import models_lib
+from datasets import timeseries_features
+
+CHUNK_SIZE = 1000 # stations processed at once by a worker
+
+# Project opened by each worker process (see initWorker)
+worker_project = None
+
+
+def listConfigFiles():
+    """Default config and themes files, as listed by the GUI"""
+
+    config_files = [cst.DEFAULT_CONFIG_FILE]
+    themes_files = [cst.DEFAULT_THEMES_FILE]
+
+    # Global user files (if any) in config directory
+    config_files += sorted(glob.glob(os.path.join(cst.CONFIG_PATH, 'config*.yaml')))
+    themes_files += sorted(glob.glob(os.path.join(cst.CONFIG_PATH, 'themes*.yaml')))
+
+    return config_files, themes_files
+
+
+def openProject(project_name):
+    """Read the project and load its configuration (made global)"""
+
+    config_files, themes_files = listConfigFiles()
+    projects_list = projects.Projects(cst.DEFAULT_PROJECTS_FILE,
+                                      default_config=config_files,
+                                      default_themes=themes_files)
+    project = projects_list.getProject(project_name)
+
+    project.readProject()
+    project.loadConfig(set_globals=True)
+
+    cfg.project_name = project.name
+    cfg.basedir = project.basedir
+    cfg.basedir_cat = project.cat_lists_path
+    cfg.stations_list = project.stations
+    cfg.nsta_max = project.nsta_max
+
+    return project
+
+
+def listStations(project):
+    """Stations of the project, without loading any data"""
+
+    loader = load_data.LoaderInterface(project.data_desc).getLoader()
+    loader.setTimeWindow(project.time_window)
+
+    return loader.configureLoader(project.data_path,
+                                  stalist=project.stations,
+                                  nsta_max=project.nsta_max)
+
+
+def selectFeatures(names):
+    """Feature IDs matching the names given (full IDs or prefixes)"""
+
+    # Data features and all the model parameters, known without any data
+    features_desc = timeseries_features.load_features_desc()
+    feat_ids = [f'{group}.{name}' for group in features_desc['GROUPS']
+                if group not in ('SPACE', 'MODELS')
+                for name in features_desc['FEATURES'].get(group, {})]
+    models_desc = models_lib.load_models_desc()['MODELS']
+    for model in fit_data.timeseries_models_names:
+        feat_ids += [f'MODELS.{model}.{param}'
+                     for param in models_desc[model]['metaparams']]
+
+    if not names:
+        # Everything but the space features, instantly computed by the GUI
+        return feat_ids
+
+    selected = []
+    for name in names:
+        matches = [feat_id for feat_id in feat_ids
+                   if feat_id == name or feat_id.startswith(name + '.')]
+        if not matches:
+            raise ValueError(f'Unknown feature {name}, available features '
+                             f'are: {", ".join(feat_ids)}')
+        selected += [feat_id for feat_id in matches if feat_id not in selected]
+
+    return selected
+
+
+def initWorker(project_name):
+    """Open the project once in each worker process"""
+
+    global worker_project
+    worker_project = openProject(project_name)
+
+
+def computeChunk(stalist, feat_ids, output):
+    """Load the data of a chunk of stations, compute their features and the
+    keys of their data in the features store"""
+
+    # Own data set with this chunk only, no cache: the store is not meant to
+    # be written by several processes at once (written by runBatch)
+    chunk = dataset.DataSetObject(worker_project.data_path,
+                                  worker_project.data_desc)
+    chunk.loadData(read_categories=False,
+                   time_window=worker_project.time_window,
+                   data_precision=cfg.data_precision,
+                   stalist=stalist)
+
+    # The model features are fitted through the global models
+    cfg.models = chunk.models
+    chunk.features.computeFeatures(feat_ids)
+
+    values = {feat_id: [chunk.features.getStationsFeature(feat_id, sta)
+                        for sta in stalist]
+              for feat_id in feat_ids}
+
+    # Same keys as the GUI (see TimeSeriesFeatures.getCacheKeys)
+    cache_desc = features_cache.get_cache_desc(worker_project.data_desc,
+                                               worker_project.time_window,
+                                               cfg.data_precision)
+    # (only for the keys, nothing is read or written by the workers)
+    chunk.features.setCache(features_cache.FeaturesCache(output, cache_desc),
+                            chunk.getFingerprints)
+    keys = chunk.features.getCacheKeys(stalist)
+
+    return values, keys
+
+
+def runBatch(project_name, feat_names=None, workers=0,
+             chunk_size=CHUNK_SIZE, output=''):
+    """Compute the features of all the stations and write them to the store"""
+
+    project = openProject(project_name)
+    feat_ids = selectFeatures(feat_names)
+
+    print('Listing the stations...')
+    stalist = listStations(project)
+    nsta = len(stalist)
+    chunks = [stalist[i:i + chunk_size] for i in range(0, nsta, chunk_size)]
+
+    output = output or project.features_cache_path
+    workers = workers or os.cpu_count()
+    print(f'Computing {len(feat_ids):d} features of {nsta:d} stations '
+          f'({len(chunks):d} chunks, {workers:d} workers)...')
+
+    values = {feat_id: dict() for feat_id in feat_ids}
+    keys = dict()
+    t0 = time.time()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=initWorker,
+                                                initargs=(project_name,)) as pool:
+        futures = {pool.submit(computeChunk, chunk, feat_ids, output): ichunk
+                   for ichunk, chunk in enumerate(chunks)}
+        ndone = 0
+        for future in concurrent.futures.as_completed(futures):
+            chunk = chunks[futures[future]]
+            chunk_values, chunk_keys = future.result()
+            for feat_id, feat_values in chunk_values.items():
+                values[feat_id].update(zip(chunk, map(timeseries_features.feature_to_float,
+                                                      feat_values)))
+            keys.update(chunk_keys)
+            ndone += len(chunk)
+            print(f'{ndone:d}/{nsta:d} stations done ({time.time() - t0:.1f} s)')
+
+    cache_desc = features_cache.get_cache_desc(project.data_desc, project.time_window,
+                                               cfg.data_precision)
+    cache = features_cache.FeaturesCache(output, cache_desc)
+    for feat_id in feat_ids:
+        cache.putValues(feat_id, values[feat_id], keys)
+    print(f'Features written to {output}')
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Compute the features of a '
+                                     'Pygoda project without GUI')
+    parser.add_argument('project', help='project name (see projects.yaml)')
+    parser.add_argument('-f', '--features', nargs='+', default=None,
+                        help='feature IDs or groups, e.g. TIME DATA.MEDIAN '
+                        'MODELS.LINEAR (default: all but SPACE.*)')
+    parser.add_argument('-w', '--workers', type=int, default=0,
+                        help='number of worker processes (default: all cores)')
+    parser.add_argument('-c', '--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='stations per chunk (default: %(default)d)')
+    parser.add_argument('-o', '--output', default='',
+                        help='features store (default: '
+                        '{basedir}/{project}_lists/features_cache)')
+    args = parser.parse_args()
+
+    try:
+        runBatch(args.project, args.features, args.workers,
+                 args.chunk_size, args.output)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
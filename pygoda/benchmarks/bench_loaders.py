@@ -0,0 +1,244 @@
+# coding: utf-8
+
+"""Loader benchmarks on synthetic datasets
+
+Times the main entry points of the loaders (configureLoader, loadAllData,
+loadData on a subset of stations and loadStationData for single stations)
+on GlobalMass HDF5 and MultiCSV datasets (see synthetic_data), and reports
+the throughput (stations/s, MB/s of data arrays loaded) and the peak RSS.
+
+Each measurement runs in a new process, so that the peak RSS is the one of
+this measurement only and nothing is kept in memory between the runs.
+Must be launched from the pygoda.py folder:
+
+    python -m benchmarks.bench_loaders --sizes 1k 10k 100k --output new.json
+    python -m benchmarks.bench_loaders --compare new.json  # regression check
+"""
+
+import argparse
+import collections.abc
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from . import synthetic_data
+
+try:
+    import resource
+except ImportError:
+    resource = None # Windows, no peak RSS
+
+CASES = ('configureLoader', 'loadAllData', 'loadData', 'loadStationData')
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'pygoda_benchmarks')
+MB = 1 << 20
+
+
+def data_size(value):
+    """Size in bytes of all the arrays of a data dict (as loaded)"""
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, collections.abc.Mapping):
+        return sum(data_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(data_size(v) for v in value)
+    return 0
+
+
+def peak_rss():
+    """Peak resident set size of the process and its children, in MB"""
+
+    if resource is None:
+        return np.nan
+
+    # kB on Linux, bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    return rss*unit/MB
+
+
+def run_case(case, data_path, data_desc, load_workers, nsubset, nsingle, seed,
+             verbose):
+    """Time one case in the current process"""
+
+    from datasets import load_data
+
+    loader = load_data.LoaderInterface(data_desc).getLoader()
+    loader.setLoadWorkers(load_workers)
+
+    output = sys.stdout if verbose else open(os.devnull, mode='w')
+    with contextlib.redirect_stdout(output):
+        startt = time.perf_counter()
+        stalist = loader.configureLoader(data_path)
+        elapsed = time.perf_counter() - startt
+        nsta, size = len(stalist), 0
+
+        rng = np.random.default_rng(seed)
+        if case == 'loadAllData':
+            startt = time.perf_counter()
+            timeseries_dict = loader.loadAllData()
+            elapsed = time.perf_counter() - startt
+            size = sum(ts.getDataSize() for ts in timeseries_dict.values())
+        elif case == 'loadData':
+            subset = list(rng.choice(stalist, min(nsubset, nsta), replace=False))
+            startt = time.perf_counter()
+            timeseries_dict = loader.loadData(subset)
+            elapsed = time.perf_counter() - startt
+            nsta = len(subset)
+            size = sum(timeseries_dict[sta].getDataSize() for sta in subset)
+        elif case == 'loadStationData':
+            single = list(rng.choice(stalist, min(nsingle, nsta), replace=False))
+            startt = time.perf_counter()
+            for sta in single:
+                size += data_size(loader.loadStationData(sta))
+            elapsed = time.perf_counter() - startt
+            nsta = len(single)
+
+    if not verbose:
+        output.close()
+
+    return {'case': case,
+            'nsta': nsta,
+            'time': elapsed,
+            'stations_per_s': nsta/elapsed,
+            'mb': size/MB,
+            'mb_per_s': size/MB/elapsed if size else np.nan,
+            'peak_rss_mb': peak_rss()}
+
+
+def _run_case_worker(connection, *args):
+
+    try:
+        connection.send(run_case(*args))
+    except Exception as e:
+        connection.send(e)
+    connection.close()
+
+
+def run_isolated(*args):
+    """Run a case in a new process (not a daemon: loaders may use a pool)"""
+
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case_worker, args=(sender, *args))
+    process.start()
+    sender.close()
+    result = receiver.recv()
+    process.join()
+    if isinstance(result, Exception):
+        raise result
+
+    return result
+
+
+def run_benchmarks(sizes, formats, cases, data_dir, load_workers=1,
+                   nsubset=500, nsingle=50, repeat=3, seed=0, verbose=False):
+    """Best time of each case (repeated runs) for each dataset"""
+
+    results = []
+    for data_format in formats:
+        for size in sizes:
+            nsta = synthetic_data.SIZES[size]
+            data_path, data_desc = synthetic_data.generate_dataset(data_dir, data_format,
+                                                                   nsta, seed=seed)
+            for case in cases:
+                runs = [run_isolated(case, data_path, data_desc, load_workers,
+                                     nsubset, nsingle, seed, verbose)
+                        for _ in range(repeat)]
+                best = min(runs, key=lambda run: run['time'])
+                best['peak_rss_mb'] = max(run['peak_rss_mb'] for run in runs)
+                best.update({'format': data_format, 'size': size,
+                             'load_workers': load_workers})
+                results.append(best)
+                print_result(best)
+
+    return results
+
+
+def print_result(result):
+
+    print(f"{result['format']:>5s} {result['size']:>5s} {result['case']:<16s} "
+          f"{result['nsta']:>7d} sta {result['time']:>9.3f} s "
+          f"{result['stations_per_s']:>10.1f} sta/s {result['mb_per_s']:>8.1f} MB/s "
+          f"{result['peak_rss_mb']:>8.1f} MB peak RSS")
+
+
+def compare_results(results, baseline, tolerance):
+    """Cases slower than the baseline by more than tolerance (fraction)"""
+
+    def key(result):
+        return (result['format'], result['size'], result['case'],
+                result['load_workers'])
+
+    reference = {key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        if key(result) not in reference:
+            continue
+        ratio = result['time']/reference[key(result)]['time']
+        status = 'REGRESSION' if ratio > 1 + tolerance else 'ok'
+        print(f"{result['format']:>5s} {result['size']:>5s} {result['case']:<16s} "
+              f"x{ratio:.2f} vs baseline: {status}")
+        if status != 'ok':
+            regressions.append(result)
+
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Benchmark the loaders on '
+                                     'synthetic datasets')
+    parser.add_argument('--sizes', nargs='+', default=['1k', '10k'],
+                        choices=list(synthetic_data.SIZES),
+                        help='number of stations (default: %(default)s)')
+    parser.add_argument('--formats', nargs='+', default=list(synthetic_data.FORMATS),
+                        choices=list(synthetic_data.FORMATS))
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=CASES)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR,
+                        help='where the datasets are generated (default: %(default)s)')
+    parser.add_argument('--load-workers', type=int, default=1)
+    parser.add_argument('--subset', type=int, default=500,
+                        help='stations loaded by loadData (default: %(default)d)')
+    parser.add_argument('--single', type=int, default=50,
+                        help='stations loaded by loadStationData (default: %(default)d)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs of each case, best time kept (default: %(default)d)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='', help='write the results to a JSON file')
+    parser.add_argument('--compare', default='',
+                        help='baseline JSON file, exit with an error on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown accepted vs baseline (default: %(default)s)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='show the output of the loaders')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.formats, args.cases, args.data_dir,
+                             load_workers=args.load_workers,
+                             nsubset=args.subset, nsingle=args.single,
+                             repeat=args.repeat, seed=args.seed,
+                             verbose=args.verbose)
+
+    if args.output:
+        with open(args.output, mode='w', encoding='utf8') as f:
+            json.dump({'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'platform': platform.platform(),
+                       'cpu_count': os.cpu_count(),
+                       'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, mode='r', encoding='utf8') as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,192 @@
+# coding: utf-8
+
+"""Synthetic GNSS-like datasets for the loader benchmarks
+
+Daily time series of a vertical component Z (trend, annual signal, noise
+and jumps) with its uncertainty, an atmospheric loading correction and the
+dates of the jumps as events. Each station has its own span, with random
+data gaps (missing epochs) and a few missing values (NaN).
+
+Two formats are generated from the same stations: one GlobalMass HDF5
+file (GLOBALMASS_GPS) and one directory of CSV files (MULTI_CSV), the
+latter without the correction and events which are not read by MultiCSV.
+"""
+
+import copy
+import os
+
+import h5py
+import numpy as np
+
+from tools import datetime_tools
+
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+DAY = 86400
+T0 = 788961600 # 1995-01-01 12:00 UTC, first possible epoch
+MAX_DAYS = 10227 # last possible epoch at the end of 2022
+MIN_LENGTH = 365 # days
+MAX_LENGTH = 6000 # days, log-uniform lengths between these bounds
+
+GLOBALMASS_DESC = {
+    'FILE_TYPE': 'BINARY',
+    'DATA_TYPE': 'HDF5',
+    'DATA_SPEC': 'GLOBALMASS_GPS',
+    'VERSION': '1.0',
+    'MAPPING': {'LONGITUDE': 'lon', 'LATITUDE': 'lat',
+                'ELEVATION': 'h', 'TIME': 't'},
+    'ATTRIBUTES': {'lon': {'name': 'Longitude', 'unit': 'deg', 'accuracy': '1e-2'},
+                   'lat': {'name': 'Latitude', 'unit': 'deg', 'accuracy': '1e-2'},
+                   'h': {'name': 'Elevation', 'unit': 'm', 'accuracy': '1e-3'}},
+    'VARIABLES': {'t': {'name': 'Time vector', 'unit': 'yr'}},
+    'COMPONENTS': {'Z': {'name': 'Vertical land motion', 'unit': 'mm',
+                         'accuracy': '1e-2', 'std': 'stdZ',
+                         'events': ['jumps']},
+                   '_corrections': {'atm': {'factor': '1.0', 'applied': 'false',
+                                            'apply': 'true'}}},
+    'CORRECTIONS': {'atm': {'name': 'Atmospheric loading', 'unit': 'mm',
+                            'path': 'atm'}},
+    'EVENTS': {'jumps': {'name': 'Jumps dates', 'path': 'jumps'}},
+}
+
+MULTI_CSV_DESC = {
+    'FILE_TYPE': 'TEXT',
+    'DATA_TYPE': 'CSV',
+    'DATA_SPEC': 'MULTI_CSV',
+    'VERSION': '1.0',
+    'COMMENT': '#',
+    'HEADER_SEP': ':',
+    'COLUMN_HEADER': 'true',
+    'DELIMITER': ',',
+    'MAPPING': {'LONGITUDE': 'lon', 'LATITUDE': 'lat',
+                'ELEVATION': 'h', 'TIME': 't'},
+    'ATTRIBUTES': {'lon': {'name': 'Longitude', 'unit': 'deg', 'accuracy': '1e-2'},
+                   'lat': {'name': 'Latitude', 'unit': 'deg', 'accuracy': '1e-2'},
+                   'h': {'name': 'Elevation', 'unit': 'm', 'accuracy': '1e-3'}},
+    'VARIABLES': {'t': {'name': 'Time vector', 'field': 'date',
+                        'format': 'YYYY-MM-DD'}},
+    'COMPONENTS': {'Z': {'name': 'Vertical land motion', 'unit': 'mm',
+                         'accuracy': '1e-2', 'std': 'stdZ', 'missing': 'NaN'}},
+}
+
+FORMATS = {'hdf5': GLOBALMASS_DESC, 'csv': MULTI_CSV_DESC}
+
+
+def station_names(nsta):
+    """Names of the synthetic stations"""
+
+    return [f'S{ista:06d}' for ista in range(nsta)]
+
+
+def station_series(rng):
+    """Epochs (UNIX timestamps), Z, stdZ, atm and jumps of one station"""
+
+    length = int(np.exp(rng.uniform(np.log(MIN_LENGTH), np.log(MAX_LENGTH))))
+    start = rng.integers(0, MAX_DAYS - length + 1)
+    days = np.arange(start, start + length)
+
+    # Data gaps: a few blocks of missing epochs, and some isolated ones
+    keep = rng.random(length) > 0.02
+    for _ in range(rng.poisson(3)):
+        gap_start = rng.integers(0, length)
+        keep[gap_start:gap_start + rng.integers(5, 120)] = False
+    keep[[0, -1]] = True
+    days = days[keep]
+    t = T0 + DAY*days.astype(np.float64)
+
+    # Signal in mm, with jumps at the events dates
+    t_yr = (t - t[0])/(365.2425*DAY)
+    annual = rng.uniform(1, 5)*np.cos(2*np.pi*t_yr + rng.uniform(0, 2*np.pi))
+    Z = rng.normal(0, 2)*t_yr + annual + rng.normal(0, 3, len(t))
+    jumps = np.sort(rng.choice(t[1:-1], size=min(rng.poisson(1), len(t) - 2),
+                               replace=False))
+    for jump in jumps:
+        Z[t >= jump] += rng.normal(0, 10)
+    stdZ = rng.uniform(1, 3) * (1 + 0.2*rng.random(len(t)))
+    atm = rng.uniform(0.5, 3)*np.sin(2*np.pi*t_yr + rng.uniform(0, 2*np.pi))
+
+    # Missing values
+    Z[rng.random(len(t)) < 0.002] = np.nan
+
+    return t, Z, stdZ, atm, jumps
+
+
+def station_positions(rng, nsta):
+    """Longitude, latitude and elevation of the stations"""
+
+    lon = rng.uniform(-180, 180, nsta)
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, nsta)))
+    h = rng.uniform(-50, 3000, nsta)
+
+    return lon, lat, h
+
+
+def write_globalmass_hdf5(filepath, nsta, seed=0):
+    """One group per station with t (decimal years), Z, stdZ, atm, jumps"""
+
+    rng = np.random.default_rng(seed)
+    lon, lat, h = station_positions(rng, nsta)
+    with h5py.File(filepath, 'w') as h5f:
+        for ista, sta in enumerate(station_names(nsta)):
+            t, Z, stdZ, atm, jumps = station_series(rng)
+            grp = h5f.create_group(sta)
+            grp.attrs['lon'] = lon[ista]
+            grp.attrs['lat'] = lat[ista]
+            grp.attrs['h'] = h[ista]
+            grp['t'] = datetime_tools.timestamp2decyr(t)
+            # The correction is removed from the data in the file
+            grp['Z'] = Z - atm
+            grp['stdZ'] = stdZ
+            grp['atm'] = atm
+            if len(jumps):
+                grp['jumps'] = datetime_tools.timestamp2decyr(jumps)
+
+
+def write_multi_csv(dirpath, nsta, seed=0):
+    """One CSV file per station, position in the header, same series"""
+
+    rng = np.random.default_rng(seed)
+    lon, lat, h = station_positions(rng, nsta)
+    os.makedirs(dirpath, exist_ok=True)
+    for ista, sta in enumerate(station_names(nsta)):
+        t, Z, stdZ, atm, _ = station_series(rng)
+        dates = np.datetime_as_string(t.astype('datetime64[s]'), unit='D')
+        values = np.char.mod('%.2f', Z)
+        stds = np.char.mod('%.2f', stdZ)
+        rows = np.char.add(np.char.add(np.char.add(dates, ','),
+                                       np.char.add(values, ',')), stds)
+        with open(os.path.join(dirpath, sta + '.csv'), mode='w',
+                  encoding='ascii') as f:
+            f.write(f'# lon: {lon[ista]:.5f}\n# lat: {lat[ista]:.5f}\n'
+                    f'# h: {h[ista]:.3f}\ndate,Z,stdZ\n')
+            f.write('\n'.join(rows))
+            f.write('\n')
+
+
+def generate_dataset(data_dir, data_format, nsta, seed=0):
+    """Data path and descriptor of a synthetic dataset, created if needed"""
+
+    name = f'synthetic_{nsta:d}_{seed:d}'
+    os.makedirs(data_dir, exist_ok=True)
+    done_filepath = os.path.join(data_dir, f'{name}_{data_format}.done')
+
+    if data_format == 'hdf5':
+        path = os.path.join(data_dir, name + '.hdf5')
+        data_path = path
+        writer = write_globalmass_hdf5
+    elif data_format == 'csv':
+        path = os.path.join(data_dir, name + '_csv')
+        data_path = os.path.join(path, '*.csv')
+        writer = write_multi_csv
+    else:
+        raise ValueError(f'Unknown format {data_format}, available formats '
+                         f'are: {", ".join(FORMATS)}')
+
+    if not os.path.isfile(done_filepath):
+        print(f'Generating {nsta:d} stations ({data_format}) in {path}...')
+        writer(path, nsta, seed=seed)
+        with open(done_filepath, mode='w'):
+            pass # complete dataset (not interrupted)
+
+    # The loaders modify their descriptor in place
+    return data_path, copy.deepcopy(FORMATS[data_format])
@@ -10,6 +10,7 @@ import strictyaml as yaml
 import constants as cst
 from geo import geotools
 from tools import yaml2bool
+from tools import datetime_tools
 
 
 class ProjectConfiguration():
@@ -47,13 +48,24 @@ class ProjectConfiguration():
         self.load_nsta = -1 # load this number of stations at startup (-1 == all)
         self.load_first_page = True # always load all the data for the first grid page
         self.load_on_the_fly = False # load the data only when needed
-        #self.max_in_memory = -1 # keep no more than this number of stations in memory (-1 == no limit)
+        self.max_in_memory = -1 # keep no more than this number of stations in memory (-1 == no limit)
+        self.max_memory_size = -1 # keep no more than this size of data in memory (MB, -1 == no limit)
+        self.prefetch_pages = 1 # with load_on_the_fly, grid pages loaded in the background around the current one
+        self.live_update = 0 # check the data files for new epochs every n seconds (0 == never)
+        self.load_workers = 1 # processes loading multi-file data sets (1 == serial, -1 == all cores)
+        self.data_cache = False # keep the parsed data in a binary store, reused at next opening
+        self.pack_data = False # store the data of all the stations in contiguous arrays
+        self.lazy_components = False # only load the main component, the others when selected
+        self.data_precision = 'double' # data, std and corrections in 'double' (float64) or 'single' (float32)
+        self.features_cache = False # keep the computed features in a store, reused at next opening
+        self.features_workers = 1 # processes fitting the models of the features (1 == serial, -1 == all cores)
         self.downsampling_rate = 1 # no downsampling by default
         self.downsampling_threshold = 1000 # no subsampling if there are less than n data
         self.downsampling_method = 'naive' # only option is 'naive' for now
         self.best_quality_on_hover = True # remove downsampling when hovering/selecting
         self.keep_best_quality = True # make previous option persistent
         self.largeplot_update_threshold = 10000 # don't auto update big plot if len(data) > threshold
+        self.decyr_backend = 'formula' # decimal years conversion: 'formula' or 'table' (decyr.txt)
 
         # Anything related to the categories
         self.CATEGORIES = dict()
@@ -94,6 +106,9 @@ class ProjectConfiguration():
            self.load_nsta < self.nplots:
             self.load_nsta = self.nplots
 
+        # Decimal years conversion (the table requires decyr.txt)
+        datetime_tools.set_decyr_backend(self.decyr_backend)
+
         # Create Cartopy map projections
         PROJ_FUNC = {'lcc': ccrs.LambertConformal, # Lambert Conformal Conic
                     'eqc': ccrs.EquidistantConic} # Equidistant Conic
@@ -164,15 +179,26 @@ class ProjectConfiguration():
 
         if 'PERFORMANCES' in cfg:
             self.load_nsta = int(cfg['PERFORMANCES'].get('load_nsta', -1))
-            self.load_first_page = yaml2bool(cfg['PERFORMANCES'].get('load_first_page', True))
-            self.load_on_the_fly = yaml2bool(cfg['PERFORMANCES'].get('load_on_the_fly', False))
-            #self.max_in_memory = int(cfg['PERFORMANCES'].get('max_in_memory', -1))
+            self.load_first_page = yaml2bool(cfg['PERFORMANCES'].get('load_first_page', 'True'))
+            self.load_on_the_fly = yaml2bool(cfg['PERFORMANCES'].get('load_on_the_fly', 'False'))
+            self.max_in_memory = int(cfg['PERFORMANCES'].get('max_in_memory', -1))
+            self.max_memory_size = float(cfg['PERFORMANCES'].get('max_memory_size', -1))
+            self.prefetch_pages = int(cfg['PERFORMANCES'].get('prefetch_pages', 1))
+            self.live_update = float(cfg['PERFORMANCES'].get('live_update', 0))
+            self.load_workers = int(cfg['PERFORMANCES'].get('load_workers', 1))
+            self.data_cache = yaml2bool(cfg['PERFORMANCES'].get('data_cache', 'False'))
+            self.pack_data = yaml2bool(cfg['PERFORMANCES'].get('pack_data', 'False'))
+            self.lazy_components = yaml2bool(cfg['PERFORMANCES'].get('lazy_components', 'False'))
+            self.data_precision = cfg['PERFORMANCES'].get('data_precision', 'double').lower()
+            self.features_cache = yaml2bool(cfg['PERFORMANCES'].get('features_cache', 'False'))
+            self.features_workers = int(cfg['PERFORMANCES'].get('features_workers', 1))
             self.downsampling_rate = int(cfg['PERFORMANCES'].get('downsampling_rate', 1))
             self.downsampling_threshold = int(cfg['PERFORMANCES'].get('downsampling_threshold', 0))
             self.downsampling_method = cfg['PERFORMANCES'].get('downsampling_method', 'naive')
             self.best_quality_on_hover = yaml2bool(cfg['PERFORMANCES'].get('best_quality_on_hover', 'True'))
             self.keep_best_quality = yaml2bool(cfg['PERFORMANCES'].get('keep_best_quality', 'True'))
             self.largeplot_update_threshold = int(cfg['PERFORMANCES'].get('largeplot_update_threshold', 10000))
+            self.decyr_backend = cfg['PERFORMANCES'].get('decyr_backend', 'formula')
 
         if 'SUBPLOTS' in cfg:
             self.subplot_type = cfg['SUBPLOTS'].get('plot_type', 'scatter')
@@ -347,13 +373,24 @@ class ProjectConfiguration():
         global load_nsta
         global load_first_page
         global load_on_the_fly
-        #global max_in_memory
+        global max_in_memory
+        global max_memory_size
+        global prefetch_pages
+        global live_update
+        global load_workers
+        global data_cache
+        global pack_data
+        global lazy_components
+        global data_precision
+        global features_cache
+        global features_workers
         global downsampling_rate
         global downsampling_threshold
         global downsampling_method
         global best_quality_on_hover
         global keep_best_quality
         global largeplot_update_threshold
+        global decyr_backend
 
         # Anything related to the categories
         global CATEGORIES
@@ -411,13 +448,24 @@ class ProjectConfiguration():
         load_nsta = self.load_nsta
         load_first_page = self.load_first_page
         load_on_the_fly = self.load_on_the_fly
-        #max_in_memory = self.max_in_memory
+        max_in_memory = self.max_in_memory
+        max_memory_size = self.max_memory_size
+        prefetch_pages = self.prefetch_pages
+        live_update = self.live_update
+        load_workers = self.load_workers
+        data_cache = self.data_cache
+        pack_data = self.pack_data
+        lazy_components = self.lazy_components
+        data_precision = self.data_precision
+        features_cache = self.features_cache
+        features_workers = self.features_workers
         downsampling_rate = self.downsampling_rate
         downsampling_threshold = self.downsampling_threshold
         downsampling_method = self.downsampling_method
         best_quality_on_hover = self.best_quality_on_hover
         keep_best_quality = self.keep_best_quality
         largeplot_update_threshold = self.largeplot_update_threshold
+        decyr_backend = self.decyr_backend
 
         # Anything related to the categories
         CATEGORIES = self.CATEGORIES
@@ -511,13 +559,24 @@ map_overlays = dict()
 load_nsta = -1 # load this number of stations at startup (-1 == all)
 load_first_page = True # always load all the data for the first grid page
 load_on_the_fly = False # load the data only when needed
-#max_in_memory = -1 # keep no more than this number of stations in memory (-1 == no limit)
+max_in_memory = -1 # keep no more than this number of stations in memory (-1 == no limit)
+max_memory_size = -1 # keep no more than this size of data in memory (MB, -1 == no limit)
+prefetch_pages = 1 # with load_on_the_fly, grid pages loaded in the background around the current one
+live_update = 0 # check the data files for new epochs every n seconds (0 == never)
+load_workers = 1 # processes loading multi-file data sets (1 == serial, -1 == all cores)
+data_cache = False # keep the parsed data in a binary store, reused at next opening
+pack_data = False # store the data of all the stations in contiguous arrays
+lazy_components = False # only load the main component, the others when selected
+data_precision = 'double' # data, std and corrections in 'double' (float64) or 'single' (float32)
+features_cache = False # keep the computed features in a store, reused at next opening
+features_workers = 1 # processes fitting the models of the features (1 == serial, -1 == all cores)
 downsampling_rate = 1 # no downsampling by default
 downsampling_threshold = 1000 # no subsampling if there are less than n data
 downsampling_method = 'naive' # only option is 'naive' for now
 best_quality_on_hover = True # remove downsampling when hovering/selecting
 keep_best_quality = True # make previous option persistent
 largeplot_update_threshold = 10000 # don't auto update big plot if len(data) > threshold
+decyr_backend = 'formula' # decimal years conversion: 'formula' or 'table' (decyr.txt)
 
 # Anything related to the categories
 CATEGORIES = dict()
@@ -558,12 +617,14 @@ mode = cst.MODE_DEFAULT
 
 # selected_sta = None # station selected with keyboard
 plotted_sta = dict() # stations whose time series are currently displayed
+plotted_mask = None # same, as a boolean array indexed by station ID
 sta_category = dict()
 current_grp = GRP_QUALITY
 
 # Dataset hook and shortcuts for things defined in dataset.py
 dataset = None # TimeSeries instance: dataset.getData()
 data = None # dict instance: data[staname] = ...
+stations = None # StationRegistry instance: integer ID of each station
 stalist = []
 nsta = 0
 
@@ -70,6 +70,7 @@ class SignalDispatcher(QtCore.QObject):
             # Update the list of stations plotted in the grid
             # Set to False the ones which are not plotted anymore
             cfg.plotted_sta[staname] = state
+            cfg.plotted_mask[cfg.stations.getId(staname)] = state
 
         self.updateStatus(grid='New stations plotted')
         self.broadcastSignal(sta_events)
@@ -78,13 +79,25 @@ class SignalDispatcher(QtCore.QObject):
         # The user has selected another component in the dataset
         # ...or applied different corrections
         # (then we have both 'COMPONENT' and 'CORRECTIONS')
+        old_component = cfg.data_component
         cfg.data_component = sta_events['COMPONENT']
+        cfg.dataset.loadComponent(cfg.data_component)
 
         for sta, data in cfg.dataset.getData().items():
             data.setMainComponent(cfg.data_component)
             if 'CORRECTIONS' in sta_events:
                 data.applyCorrections(sta_events['CORRECTIONS'])
 
+        # Features computed from the previous data, recomputed when needed
+        if cfg.data_component != old_component:
+            dirty = cfg.features.invalidate(('DATA', 'STD', 'EVENTS'))
+        elif 'CORRECTIONS' in sta_events:
+            dirty = cfg.features.invalidate(('DATA', ))
+        else:
+            dirty = []
+        if cfg.sort_by in dirty:
+            self.sortStations(delayed=True)
+
         self.broadcastSignal(sta_events)
 
     def updateDataset(self, sta_events):
@@ -101,15 +114,13 @@ class SignalDispatcher(QtCore.QObject):
             return
 
         # Heavy GUI update, similar to full reload
-        cfg.stalist_all = cfg.features.sortByFeature(cfg.sort_by, cfg.sort_asc)
+        cfg.stalist_all = cfg.features.sortByFeature(cfg.sort_by, cfg.sort_asc,
+                                                     store_result=False)
         cfg.pending_sort = False
 
         # Keep only the stations which were not filtered out
-        sorted_sta = []
-        for sta in cfg.stalist_all:
-            if sta in cfg.stalist:
-                sorted_sta.append(sta)
-        cfg.stalist = sorted_sta
+        cfg.stalist = cfg.stations.filterList(cfg.stalist_all,
+                                              cfg.stations.getMask(cfg.stalist))
 
         if not silent_sort:
             self.send({'SORTED': (cfg.sort_by, cfg.sort_asc)})
@@ -161,8 +172,8 @@ class SignalDispatcher(QtCore.QObject):
 
     def setReferencePoint(self, sta_events):
         cfg.reference_point = sta_events['REFERENCE_POINT']
-        cfg.features.computeFeatures('SPACE.D0')
-        if cfg.sort_by == 'SPACE.D0':
+        dirty = cfg.features.invalidate(('REFERENCE_POINT', ))
+        if cfg.sort_by in dirty:
             # Update immediately
             self.sortStations()
 
@@ -4,6 +4,8 @@ from PySide2 import QtCore, QtWidgets, QtGui
 
 import re
 
+import numpy as np
+
 import cartopy.crs as ccrs
 from cartopy.feature import ShapelyFeature
 import geopandas as gpd
@@ -17,66 +19,54 @@ class CategoryFilter():
     def __init__(self):
 
         self.stalist = cfg.stalist_all
+        self.mask = None # stations kept, indexed by station ID
 
     def applyFilter(self, checked_categories, operator):
 
         if operator == 'AND':
             # AND between different groups
-            self.stalist = self.andFilter(checked_categories)
+            self.mask = self.andFilter(checked_categories)
         elif operator == 'OR':
             # OR between different groups
-            self.stalist = self.orFilter(checked_categories)
+            self.mask = self.orFilter(checked_categories)
+
+        self.stalist = cfg.stations.filterList(cfg.stalist_all, self.mask)
 
         return self.stalist
 
+    def categoryMask(self, group, categories):
+
+        # Stations whose category in the group is one of categories
+        return np.fromiter((cfg.sta_category[sta][group] in categories
+                            for sta in cfg.stations.names),
+                           dtype=bool, count=cfg.stations.nsta)
+
     def andFilter(self, checked_categories):
 
-        # Station selection from quality
-        stalist_all = []
-        checked_qualities = checked_categories[cfg.GRP_QUALITY]
-        if not checked_qualities:
-            # Ignore the filtering by quality
-            stalist_all = cfg.stalist_all
-        else:
-            for sta in cfg.stalist_all:
-                if cfg.sta_category[sta][cfg.GRP_QUALITY] in checked_qualities:
-                    stalist_all.append(sta)
-            del checked_categories[cfg.GRP_QUALITY]
-
-        # Station selection from categories
-        stalist = []
-        for sta in stalist_all:
-            filtered_out = False
-            for grp, cats in checked_categories.items():
-                if not cats:
-                    continue
-                if cfg.sta_category[sta][grp] not in cats:
-                    filtered_out = True
-                    break
-            if not filtered_out:
-                stalist.append(sta)
+        # Station selection from quality and categories,
+        # groups with no checked category are ignored
+        mask = np.ones(cfg.stations.nsta, dtype=bool)
+        for grp, cats in checked_categories.items():
+            if not cats:
+                continue
+            mask &= self.categoryMask(grp, cats)
 
-        return stalist
+        return mask
 
     def orFilter(self, checked_categories):
 
-        stalist_all = cfg.stalist_all
         if not checked_categories[cfg.GRP_QUALITY]:
             # Select all the stations (for consistency)
-            return stalist_all
+            return np.ones(cfg.stations.nsta, dtype=bool)
 
         # Station selection from qualities or categories
-        stalist = []
-        for sta in stalist_all:
-            filtered_out = True
-            for grp, cats in checked_categories.items():
-                if cfg.sta_category[sta][grp] in cats:
-                    filtered_out = False
-                    break
-            if not filtered_out:
-                stalist.append(sta)
+        mask = np.zeros(cfg.stations.nsta, dtype=bool)
+        for grp, cats in checked_categories.items():
+            if not cats:
+                continue
+            mask |= self.categoryMask(grp, cats)
 
-        return stalist
+        return mask
 
 
 class GeoFilter():
@@ -84,6 +74,7 @@ class GeoFilter():
     def __init__(self):
 
         self.stalist = cfg.stalist_all
+        self.mask = None # stations kept, indexed by station ID
 
     def applyFilter(self, territory_tree, state):
 
@@ -106,19 +97,19 @@ class GeoFilter():
         region = shapely.ops.unary_union(regions)
 
         # Filter
-        self.stalist = []
-        for sta in cfg.stalist_all:
+        self.mask = np.zeros(cfg.stations.nsta, dtype=bool)
+        outside_region = not (state == QtCore.Qt.Checked)
+        for ista, sta in enumerate(cfg.stations.names):
             sta_data = cfg.dataset.getData(sta)
             lon, lat = sta_data.lon, sta_data.lat
             point = shapely_geom.Point(lon, lat)
             #print(sta, point)
-            outside_region = not (state == QtCore.Qt.Checked)
-            if region.contains(point) ^ outside_region:
-                # (1) region is region of interest, outside_region = False:
-                #     append when region contains station
-                # (2) region is complement of ROI, outside_region = True:
-                #     append when region does *not* contains station
-                self.stalist.append(sta)
+            # (1) region is region of interest, outside_region = False:
+            #     keep when region contains station
+            # (2) region is complement of ROI, outside_region = True:
+            #     keep when region does *not* contains station
+            self.mask[ista] = region.contains(point) ^ outside_region
+        self.stalist = cfg.stations.filterList(cfg.stalist_all, self.mask)
 
         return self.stalist
 
@@ -0,0 +1,254 @@
+# coding: utf-8
+
+import collections.abc
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+class DataCache():
+
+    # Binary store of the data returned by the loaders (one entry per station).
+    #
+    # All the arrays are appended to a single flat file (data.bin) which is
+    # memory-mapped when reading, the nested dicts around them are kept in
+    # an index (index.json) where each array is replaced by a reference
+    # {ARRAY_KEY: [offset, dtype, shape]} into data.bin.
+    #
+    # Each entry is tagged with the fingerprint of the station source file(s)
+    # given by the loader (path, size, mtime), the whole store is tagged with
+    # a hash of the data descriptor: a changed file only invalidates its
+    # stations, a changed descriptor invalidates everything. The stations
+    # of a data set stored in a single file (e.g. one HDF5 file) share the
+    # fingerprint of that file: any change of the file invalidates all of
+    # them.
+
+    VERSION = 3 # 2: file offsets stored by MultiCSV, 3: file_end by GlobalMassHDF5
+    ARRAY_KEY = '__array__'
+    ALIGNMENT = 64 # bytes
+
+    def __init__(self, cache_path):
+
+        self.cache_path = cache_path
+        self.index_filepath = os.path.join(cache_path, 'index.json')
+        self.data_filepath = os.path.join(cache_path, 'data.bin')
+
+        self.descriptor = ''
+        self.stations = dict() # station -> entry (fingerprint, metadata, data)
+        self.size = 0 # size of data.bin known by the index
+
+        # Mappings of data.bin, reused until it changes (see getMappings)
+        self.mmap = None
+        self.readonly_mmap = None
+        self.mapped = set() # stations whose arrays are views into self.mmap
+
+    def open(self, data_desc):
+
+        os.makedirs(self.cache_path, exist_ok=True)
+        self.resetMappings()
+
+        desc = json.dumps(data_desc, sort_keys=True, default=str)
+        self.descriptor = hashlib.sha1(desc.encode('utf8')).hexdigest()
+
+        try:
+            with open(self.index_filepath, mode='r', encoding='utf8') as f:
+                index = json.load(f)
+            data_size = os.path.getsize(self.data_filepath)
+        except (OSError, ValueError):
+            index, data_size = dict(), 0
+
+        if index.get('version') != self.VERSION or \
+           index.get('descriptor') != self.descriptor or \
+           index.get('size', -1) > data_size:
+            # Nothing valid in the store, start again from scratch
+            self.stations = dict()
+            self.size = 0
+            self._truncate()
+            return
+
+        self.stations = index['stations']
+        self.size = index['size']
+
+        # Reclaim the space of the stale entries before mapping the file
+        if self.size > 2*self._usedSize() + (1 << 20):
+            self._compact()
+
+    def getMetadata(self, stalist, fingerprints):
+
+        # Longitude, latitude and elevation of the stations (NaN if missing)
+        # and list of the stations which are not in the store (or outdated)
+        metadata = np.full((3, len(stalist)), np.nan)
+        stale = []
+        for ista, sta in enumerate(stalist):
+            entry = self.stations.get(sta)
+            if entry and entry['fingerprint'] == fingerprints[sta]:
+                metadata[:, ista] = entry['metadata']
+            else:
+                stale.append(sta)
+
+        return metadata, stale
+
+    def putMetadata(self, stalist, fingerprints, metadata):
+
+        for ista, sta in enumerate(stalist):
+            # New or outdated station: any data previously stored is stale
+            self.stations[sta] = {'fingerprint': fingerprints[sta],
+                                  'metadata': [float(x) for x in metadata[:, ista]]}
+
+        self._writeIndex()
+
+    def getData(self, stalist, fingerprints):
+
+        # Data dicts of the stations up to date in the store
+        data_dict = dict()
+        if not self.size:
+            return data_dict
+
+        for sta in stalist:
+            entry = self.stations.get(sta)
+            if entry and entry['fingerprint'] == fingerprints[sta] and 'data' in entry:
+                if sta in self.mapped:
+                    # Already returned: its arrays may have been modified in
+                    # place, the stored ones are copied instead
+                    data_dict[sta] = _copyArrays(self._decode(entry['data'],
+                                                              self.getMappings(readonly=True)))
+                else:
+                    data_dict[sta] = self._decode(entry['data'], self.getMappings())
+                    self.mapped.add(sta)
+
+        return data_dict
+
+    def getMappings(self, readonly=False):
+
+        # Copy-on-write mapping of data.bin: the arrays can be modified (e.g.
+        # corrections applied in place) without changing the store. Read-only
+        # mapping to copy the arrays of the stations already returned.
+        if self.mmap is None:
+            self.mmap = np.memmap(self.data_filepath, mode='c', shape=(self.size,))
+        if readonly and self.readonly_mmap is None:
+            self.readonly_mmap = np.memmap(self.data_filepath, mode='r', shape=(self.size,))
+
+        return self.readonly_mmap if readonly else self.mmap
+
+    def resetMappings(self):
+
+        # data.bin changed: new mappings at next getData (the arrays already
+        # returned keep the previous ones alive)
+        self.mmap = None
+        self.readonly_mmap = None
+        self.mapped = set()
+
+    def putData(self, data_dict, fingerprints):
+
+        self.resetMappings()
+        with open(self.data_filepath, mode='ab') as f:
+            f.seek(0, os.SEEK_END)
+            for sta, data in data_dict.items():
+                arrays = []
+                skeleton = self._encode(data, arrays)
+                try:
+                    json.dumps(skeleton)
+                except (TypeError, ValueError):
+                    print(f'{sta:s}: data cannot be cached')
+                    continue
+                if any(array.dtype.hasobject for array, _ in arrays):
+                    print(f'{sta:s}: data cannot be cached')
+                    continue
+
+                for array, ref in arrays:
+                    f.write(b'\0' * (-f.tell() % self.ALIGNMENT))
+                    ref[0] = f.tell()
+                    f.write(np.ascontiguousarray(array).tobytes())
+
+                entry = self.stations.setdefault(sta, {'metadata': [np.nan]*3})
+                entry['fingerprint'] = fingerprints[sta]
+                entry['data'] = skeleton
+            self.size = f.tell()
+
+        self._writeIndex()
+
+    def _encode(self, value, arrays):
+
+        if isinstance(value, np.ndarray):
+            ref = [0, value.dtype.str, list(value.shape)] # offset set when written
+            arrays.append((value, ref))
+            return {self.ARRAY_KEY: ref}
+        if isinstance(value, collections.abc.Mapping): # dict, ChainMap
+            return {key: self._encode(v, arrays) for key, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._encode(v, arrays) for v in value]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    def _decode(self, value, mmap):
+
+        if isinstance(value, dict):
+            if self.ARRAY_KEY in value:
+                offset, dtype, shape = value[self.ARRAY_KEY]
+                if not np.prod(shape):
+                    return np.empty(shape, dtype=dtype)
+                return np.ndarray(shape, dtype=dtype, buffer=mmap, offset=offset)
+            return {key: self._decode(v, mmap) for key, v in value.items()}
+        if isinstance(value, list):
+            return [self._decode(v, mmap) for v in value]
+        return value
+
+    def _usedSize(self, value=None):
+
+        # Bytes of data.bin referenced by the index
+        if value is None:
+            value = [entry.get('data', {}) for entry in self.stations.values()]
+        if isinstance(value, dict):
+            if self.ARRAY_KEY in value:
+                _, dtype, shape = value[self.ARRAY_KEY]
+                return np.dtype(dtype).itemsize * int(np.prod(shape))
+            value = value.values()
+        elif not isinstance(value, list):
+            return 0
+
+        return sum(self._usedSize(v) for v in value)
+
+    def _compact(self):
+
+        # Read all the referenced arrays in memory first, then rewrite the file
+        stalist = [sta for sta, entry in self.stations.items() if 'data' in entry]
+        fingerprints = {sta: entry['fingerprint'] for sta, entry in self.stations.items()}
+        data_dict = {sta: _copyArrays(data) for sta, data in
+                     self.getData(stalist, fingerprints).items()}
+
+        self._truncate()
+        self.size = 0
+        self.putData(data_dict, fingerprints)
+
+    def _truncate(self):
+
+        self.resetMappings()
+        with open(self.data_filepath, mode='wb'):
+            pass
+
+    def _writeIndex(self):
+
+        index = {'version': self.VERSION,
+                 'descriptor': self.descriptor,
+                 'size': self.size,
+                 'stations': self.stations}
+
+        tmp_filepath = self.index_filepath + '.tmp'
+        with open(tmp_filepath, mode='w', encoding='utf8') as f:
+            json.dump(index, f)
+        os.replace(tmp_filepath, self.index_filepath)
+
+
+def _copyArrays(value):
+
+    # Deep copy of the arrays of a data dict (out of the memory map)
+    if isinstance(value, np.ndarray):
+        return np.array(value, copy=True)
+    if isinstance(value, collections.abc.Mapping):
+        return {key: _copyArrays(v) for key, v in value.items()}
+    if isinstance(value, list):
+        return [_copyArrays(v) for v in value]
+    return value
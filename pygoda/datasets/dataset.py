@@ -2,14 +2,19 @@
 
 from PySide2 import QtCore, QtWidgets, QtGui
 
+import collections
 import copy
 import numpy as np
 
 import constants as cst
 import config as cfg
+from . import data_cache
 from . import data_categories
+from . import features_cache
 from . import load_data
 from . import fit_data
+from . import prefetch
+from . import station_registry
 from . import timeseries
 from . import timeseries_features
 
@@ -32,11 +37,17 @@ class DataSetObject(QtCore.QObject):
 
         self.sta_category = None
 
+        self.prefetcher = None
+
         if load_now:
             self.loadData()
 
     def loadData(self, read_categories=True,
-                 load_on_the_fly=False, load_nsta=-1, **kwargs):
+                 load_on_the_fly=False, load_nsta=-1, load_workers=1,
+                 cache_path='', pack_data=False, time_window=None,
+                 lazy_components=False, data_precision='double',
+                 features_cache_path='', features_workers=1,
+                 max_in_memory=-1, max_memory_size=-1, **kwargs):
 
         #if 'stalist' in self.data_desc:
         #    self.load_params.update({'stalist': self.data_desc['stalist']})
@@ -44,11 +55,25 @@ class DataSetObject(QtCore.QObject):
             raise ValueError("'load_nsta' must be specified if 'load_on_the_fly' is True")
         self.load_params.update(kwargs)
 
+        self.loader.setLoadWorkers(load_workers)
+        # (tmin, tmax) UNIX timestamps, only the epochs tmin <= t < tmax are loaded
+        self.loader.setTimeWindow(time_window)
+        self.loader.setLazyComponents(lazy_components)
+        self.loader.setDataPrecision(data_precision)
+        # Set before loading: with a memory budget, the stations must not
+        # share their arrays (see GenericLoader.setOwnData)
+        with_budget = (max_in_memory >= 0 or max_memory_size >= 0) and not pack_data
+        self.loader.setOwnData(with_budget)
+        if cache_path:
+            self.loader.setCache(data_cache.DataCache(cache_path))
         stalist = self.loader.configureLoader(self.data_path, **self.load_params)
         nsta = len(stalist)
 
         if load_nsta > nsta:
             load_nsta = nsta
+        if load_on_the_fly and with_budget and 0 <= max_in_memory < load_nsta:
+            # No more stations loaded than kept
+            load_nsta = max(1, max_in_memory)
 
         if load_on_the_fly:
             if load_nsta == nsta:
@@ -60,8 +85,14 @@ class DataSetObject(QtCore.QObject):
             dataset_dict = self.loader.loadAllData()
 
         self.dataset = DataSet(dataset_dict)
+        if pack_data:
+            # Only the stations already loaded (load_on_the_fly)
+            self.dataset.pack([sta for sta, ts in self.dataset.items() if ts.isLoaded()])
+        # Least recently used stations are unloaded past this budget
+        self.setMemoryBudget(max_in_memory, max_memory_size)
         self.getData = self.dataset.getData
         self.hasData = self.dataset.hasData
+        self.touchData = self.dataset.touch
         stalist = self.dataset.getStationsList()
 
         if isinstance(self.dataset[stalist[0]], timeseries.TimeSeries):
@@ -71,12 +102,106 @@ class DataSetObject(QtCore.QObject):
                 self.models[name] = fit_data.timeseries_models[name](self.dataset)
             # (2) Create corresponding Features object (uses models)
             self.features = timeseries_features.TimeSeriesFeatures(self.dataset, self.models)
+            self.features.setWorkers(features_workers)
+            if features_cache_path:
+                # (3) Features computed in previous sessions
+                cache_desc = features_cache.get_cache_desc(self.data_desc, time_window,
+                                                           data_precision)
+                self.features.setCache(features_cache.FeaturesCache(features_cache_path,
+                                                                    cache_desc),
+                                       self.getFingerprints)
         # elif isinstance(self.dataset, profiles.Profiles):
         #     pass
 
         if read_categories:
             self.readCategories()
 
+    def getFingerprints(self, stalist):
+
+        # Version of the data file(s) of the stations
+        return self.loader.getFingerprints(stalist, self.loader.getPaths(stalist))
+
+    def setMemoryBudget(self, max_nsta=-1, max_size=-1):
+
+        # Maximum number of stations and data size (MB) kept in memory
+        if max_nsta < 0 and max_size < 0:
+            return
+        if self.dataset.packed is not None:
+            print('Packed data set: memory budget ignored.')
+            return
+
+        max_bytes = max_size * 1024**2 if max_size >= 0 else -1
+        self.loader.setOwnData(True) # for the stations loaded from now on
+        self.dataset.budget = MemoryBudget(self.dataset, max_nsta, max_bytes)
+
+    def startPrefetcher(self):
+
+        # Load the data in the background when asked with prefetchData
+        self.prefetcher = prefetch.Prefetcher(self.loader)
+        self.loader.setPrefetcher(self.prefetcher)
+
+    def stopPrefetcher(self):
+
+        # Wait for the batch being loaded, if any, then end the thread
+        if self.prefetcher is None:
+            return
+        self.prefetcher.stop()
+        self.loader.setPrefetcher(None)
+        self.prefetcher = None
+
+    def prefetchData(self, stalist):
+
+        if self.prefetcher is None:
+            return
+        self.prefetcher.request([sta for sta in stalist if not self.dataset.hasData(sta)])
+
+    def loadComponent(self, name):
+
+        # The component becomes needed (e.g. selected by the user): read it
+        # at once for all the stations in memory which do not have it yet
+        # (see setLazyComponents), and from now on when loading stations
+        self.loader.addLoadedComponents([name])
+        stalist = [sta for sta, ts in self.dataset.items()
+                   if ts.isLoaded() and name in ts.missing_components]
+        if not stalist:
+            return
+
+        data_dict = self.loader.loadComponentsData(stalist, [name])
+        for sta in stalist:
+            self.dataset[sta].addComponents(data_dict[sta])
+            if self.dataset.budget is not None:
+                self.dataset.budget.add(sta) # new size
+        if self.dataset.packed is not None:
+            self.dataset.pack(self.dataset.packed.stalist)
+        print(f'Component {name:s} loaded for {len(stalist):d} stations.')
+
+    def watchData(self):
+
+        # Check for data appended to the files with updateData
+        self.loader.watchFiles()
+
+    def updateData(self):
+
+        # Append the new epochs of the data files to the stations in memory,
+        # return the list of updated stations
+        updates = self.loader.loadUpdates()
+        if not updates:
+            return []
+
+        stalist = list(updates.keys())
+        for sta, data in updates.items():
+            self.dataset[sta].appendData(data)
+            if self.dataset.budget is not None:
+                self.dataset.budget.add(sta) # new size
+        if self.dataset.packed is not None:
+            # Appended stations are not views into the packed arrays anymore
+            self.dataset.pack(self.dataset.packed.stalist)
+
+        self.features.updateStations(stalist)
+        print(f'New data for {len(stalist):d} stations.')
+
+        return stalist
+
     def readCategories(self):
 
         self.sta_category = self.category_db.readCategories(self.dataset.getStationsList())
@@ -96,6 +221,7 @@ class DataSetObject(QtCore.QObject):
         cfg.data = self.dataset
         cfg.stalist_all = self.dataset.getStationsList()
         cfg.nsta_all = len(cfg.stalist_all)
+        cfg.stations = station_registry.StationRegistry(cfg.stalist_all)
 
         # Categories
         #cfg.sta_category_all = self.sta_category
@@ -139,6 +265,25 @@ class DataSet(dict):
     def __init__(self, dataset):
         dict.__init__(self, dataset)
 
+        self.packed = None
+        self.budget = None
+
+    def pack(self, stalist=None):
+
+        # Move the data of the stations in a few contiguous arrays, the
+        # TimeSeries objects become views into them (see PackedDataSet)
+        if stalist is None:
+            stalist = self.getStationsList()
+        self.packed = PackedDataSet(self, stalist)
+
+        return self.packed
+
+    def touch(self, staname):
+
+        # The data of this station is being used (see MemoryBudget)
+        if self.budget is not None:
+            self.budget.touch(staname)
+
     def getStationsList(self):
 
         return list(self.keys())
@@ -159,3 +304,92 @@ class DataSet(dict):
             return {sta: self[sta].isLoaded() for sta in staname}
         else:
             return self[staname].isLoaded()
+
+
+class MemoryBudget():
+
+    # Keep the data of a limited number of stations (or bytes) in memory:
+    # past the budget, the least recently used stations are unloaded (only
+    # their metadata is kept) and reloaded transparently when accessed again.
+    # Stations are registered when loaded (TimeSeries.on_load) and marked as
+    # used with touch().
+
+    def __init__(self, dataset, max_nsta=-1, max_bytes=-1):
+
+        self.dataset = dataset
+        self.max_nsta = max_nsta
+        self.max_bytes = max_bytes
+
+        self.loaded = collections.OrderedDict() # station -> bytes, oldest first
+        self.nbytes = 0
+
+        for sta, ts in self.dataset.items():
+            ts.on_load = self.add
+            if ts.isLoaded():
+                self.add(sta)
+
+    def touch(self, staname):
+
+        if staname in self.loaded:
+            self.loaded.move_to_end(staname)
+
+    def add(self, staname):
+
+        if staname in self.loaded:
+            self.nbytes -= self.loaded.pop(staname)
+        self.loaded[staname] = self.dataset[staname].getDataSize()
+        self.nbytes += self.loaded[staname]
+
+        self.evict(keep=staname)
+
+    def isOverBudget(self):
+
+        return (0 <= self.max_nsta < len(self.loaded)) or \
+               (0 <= self.max_bytes < self.nbytes)
+
+    def evict(self, keep=None):
+
+        while self.isOverBudget():
+            staname = next(iter(self.loaded))
+            if staname == keep:
+                break # never unload the station being used
+            self.nbytes -= self.loaded.pop(staname)
+            self.dataset[staname].unloadData()
+
+
+class PackedDataSet():
+
+    # Struct-of-arrays version of a DataSet: one PackedArrays for the time
+    # vectors, and one for the data and std of each component, for all the
+    # stations. Whole-dataset operations can work on the packed arrays
+    # directly, the TimeSeries only hold views into them (no copy).
+
+    def __init__(self, dataset, stalist):
+
+        self.stalist = list(stalist)
+        self.index = {sta: ista for ista, sta in enumerate(self.stalist)}
+        series = [dataset[sta] for sta in self.stalist] # data loaded if needed
+
+        self.t = timeseries.PackedArrays([ts.t for ts in series])
+
+        # Components common to all the stations (and loaded)
+        names = [name for name in series[0].components if \
+                 all(name in ts.components and name not in ts.missing_components
+                     for ts in series)] if series else []
+        self.components = dict()
+        self.std = dict()
+        for name in names:
+            comps = [ts.components[name] for ts in series]
+            self.components[name] = timeseries.PackedArrays(comps)
+            # std may be a scalar (0.0 by default)
+            self.std[name] = timeseries.PackedArrays([np.broadcast_to(comp.std, comp.shape)
+                                                      for comp in comps])
+
+        for ista, ts in enumerate(series):
+            components = {name: (self.components[name][ista], self.std[name][ista])
+                          for name in names}
+            ts.setArrays(self.t[ista], components)
+
+    def __len__(self):
+
+        return len(self.stalist)
@@ -1,11 +1,23 @@
 # coding: utf-8
 
+import os
+
 import numpy as np
 import scipy as sp
 import h5py
 
+# Optional, only needed by exportParquet
+try:
+    import pyarrow as pa
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
 import config as cfg
 
+ROW_GROUP_SIZE = 1 << 17 # rows per row group (Parquet) or chunk (Feather)
+
 def exportAttributes(filepath, stalist, attrs=[], sep=' '):
 
     ## Export a list of stations with some attributes
@@ -68,3 +80,74 @@ def exportHDF5GlobalMass(hd5filepath, stalist, attrs=[], fields=[]):
 
     print('done')
 
+
+
+def exportParquet(filepath, stalist, components=[], attrs=[],
+                  row_group_size=ROW_GROUP_SIZE):
+
+    ## Export the time series to a long-format table (Parquet, or Feather for
+    ## .feather/.arrow files) with one row per station and epoch: columns
+    ## station, t, the attributes and, for each component, its data and std
+    ## ('std' + name), i.e. what the LONG_TABLE data spec reads.
+    ## The rows are sorted by station then time so that each row group only
+    ## holds a few stations, the other ones are skipped when reading.
+
+    if pa is None:
+        raise ImportError('pyarrow is required to export Parquet and Feather files')
+
+    if not attrs:
+        attrs = ['lon', 'lat', 'h']
+
+    if not components and stalist:
+        station = cfg.data[stalist[0]]
+        if not station.isLoaded():
+            station.loadData() # components only known once loaded
+        components = list(station.components)
+
+    feather = os.path.splitext(filepath)[1].lower() in ('.feather', '.arrow')
+
+    print('Exporting to {:s} file...'.format('Feather' if feather else 'Parquet'))
+
+    schema = None
+    writer = None
+    tables = []
+    nrows = 0
+    for staname in stalist:
+        station = cfg.data[staname]
+        t = np.asarray(station.t)
+        columns = {'station': pa.array([staname]*len(t), type=pa.string()),
+                   't': pa.array(np.round(t*1000).astype(np.int64), type=pa.timestamp('ms'))}
+        for attr in attrs:
+            columns[attr] = pa.array(np.full(len(t), float(getattr(station, attr))))
+        for name in components:
+            comp = station.getComponent(name)
+            columns[name] = pa.array(np.asarray(comp))
+            columns['std' + name] = pa.array(np.broadcast_to(np.asarray(comp.std, dtype=comp.dtype),
+                                                             comp.shape))
+        table = pa.table(columns)
+        if schema is None:
+            schema = table.schema # same types for all the stations
+        tables.append(table.cast(schema))
+        nrows += len(t)
+
+        if feather or nrows < row_group_size:
+            continue
+
+        # Write the rows gathered so far as (at least) one row group
+        if writer is None:
+            writer = pyarrow.parquet.ParquetWriter(filepath, schema)
+        writer.write_table(pa.concat_tables(tables), row_group_size=row_group_size)
+        tables = []
+        nrows = 0
+
+    if feather and tables:
+        pyarrow.feather.write_feather(pa.concat_tables(tables), filepath,
+                                      chunksize=row_group_size)
+    elif tables:
+        if writer is None:
+            writer = pyarrow.parquet.ParquetWriter(filepath, schema)
+        writer.write_table(pa.concat_tables(tables), row_group_size=row_group_size)
+    if writer is not None:
+        writer.close()
+
+    print('done')
@@ -0,0 +1,111 @@
+# coding: utf-8
+
+import hashlib
+import json
+import os
+
+# Optional, only needed when the store is used (PERFORMANCES/features_cache)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+from . import models_lib
+
+
+def get_cache_desc(data_desc, time_window, data_precision):
+    # What the values depend on, besides the data of each station
+    return dict(data_desc,
+                TIME_WINDOW=list(time_window) if time_window else None,
+                DATA_PRECISION=data_precision,
+                MODELS=models_lib.load_models_desc())
+
+
+class FeaturesCache():
+
+    # Store of the feature values computed in previous sessions.
+    #
+    # One Parquet file per feature (station, key, value), only read when the
+    # feature is requested. The key of each value identifies the data it was
+    # computed from: component, requested corrections, fingerprint of the
+    # station source file(s) given by the loader and hash of the data
+    # descriptor (with time window, precision...). A value whose key has
+    # changed is stale: it is not returned, and replaced once computed again.
+
+    VERSION = 1
+
+    def __init__(self, cache_path, data_desc):
+
+        if pa is None:
+            raise ImportError('pyarrow is required to store the features')
+
+        self.cache_path = cache_path
+        os.makedirs(self.cache_path, exist_ok=True)
+
+        desc = json.dumps([self.VERSION, data_desc], sort_keys=True, default=str)
+        self.descriptor = hashlib.sha1(desc.encode('utf8')).hexdigest()
+
+        self.features = dict() # feature ID -> {station: (key, value)}
+
+    def getKeys(self, stalist, components, corrections, fingerprints):
+
+        # Key of the data of each station
+        keys = dict()
+        for sta in stalist:
+            key = json.dumps([self.descriptor, components[sta], corrections[sta],
+                              fingerprints[sta]], sort_keys=True, default=str)
+            keys[sta] = hashlib.sha1(key.encode('utf8')).hexdigest()
+
+        return keys
+
+    def getValues(self, feat_id, stalist, keys):
+
+        # Values up to date in the store, and stations to compute
+        entries = self._readFeature(feat_id)
+        values = dict()
+        stale = []
+        for sta in stalist:
+            entry = entries.get(sta)
+            if entry is not None and entry[0] == keys[sta]:
+                values[sta] = entry[1]
+            else:
+                stale.append(sta)
+
+        return values, stale
+
+    def putValues(self, feat_id, values, keys):
+
+        entries = self._readFeature(feat_id)
+        entries.update({sta: (keys[sta], value) for sta, value in values.items()})
+
+        stations = list(entries.keys())
+        table = pa.table({'station': pa.array(stations, type=pa.string()),
+                          'key': pa.array([entries[sta][0] for sta in stations],
+                                          type=pa.string()),
+                          'value': pa.array([entries[sta][1] for sta in stations],
+                                            type=pa.float64())})
+
+        filepath = self._getFilepath(feat_id)
+        tmp_filepath = filepath + '.tmp'
+        pyarrow.parquet.write_table(table, tmp_filepath)
+        os.replace(tmp_filepath, filepath)
+
+    def _getFilepath(self, feat_id):
+
+        return os.path.join(self.cache_path, feat_id + '.parquet')
+
+    def _readFeature(self, feat_id):
+
+        if feat_id not in self.features:
+            entries = dict()
+            try:
+                table = pyarrow.parquet.read_table(self._getFilepath(feat_id))
+                entries = dict(zip(table['station'].to_pylist(),
+                                   zip(table['key'].to_pylist(),
+                                       table['value'].to_numpy(zero_copy_only=False).tolist())))
+            except (OSError, KeyError, pa.ArrowInvalid):
+                pass # nothing valid stored yet
+            self.features[feat_id] = entries
+
+        return self.features[feat_id]
@@ -0,0 +1,207 @@
+# coding: utf-8
+
+import concurrent.futures
+import contextlib
+import multiprocessing
+import multiprocessing.shared_memory
+import os
+import types
+
+import numpy as np
+
+import config as cfg
+from . import fit_data
+from . import timeseries
+
+
+class SharedArrays():
+
+    # Arrays of several stations stored in one shared memory block, the
+    # array of the i-th station being data[offsets[i]:offsets[i + 1]] (same
+    # layout as timeseries.PackedArrays): the worker processes attach to the
+    # block by its name (see getArrays), the arrays are neither copied nor
+    # pickled.
+
+    def __init__(self, lengths, dtype=np.float64):
+
+        self.offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.dtype = np.dtype(dtype)
+
+        size = max(1, int(self.offsets[-1])*self.dtype.itemsize) # not 0
+        self.shm = multiprocessing.shared_memory.SharedMemory(create=True, size=size)
+        self.data = np.ndarray(int(self.offsets[-1]), dtype=self.dtype, buffer=self.shm.buf)
+
+    def __getitem__(self, i):
+
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+    def getInfo(self, start, stop):
+
+        # What a worker needs to attach to the arrays of stations start:stop
+        return self.shm.name, self.dtype.str, self.offsets[start:stop + 1]
+
+    def close(self):
+
+        self.data = None # no view of the buffer left
+        self.shm.close()
+        self.shm.unlink()
+
+
+def getArrays(shm, info):
+
+    # Arrays of the stations of a chunk (see SharedArrays.getInfo)
+    _, dtype, offsets = info
+    data = np.ndarray(int(offsets[-1]), dtype=dtype, buffer=shm.buf)
+
+    return [data[i:j] for i, j in zip(offsets[:-1], offsets[1:])]
+
+
+class ChunkData():
+
+    # Minimal data set read by the models (see GenericModel.getData), on
+    # the arrays of a chunk of stations
+
+    def __init__(self, stalist, t, y, sig):
+
+        self.stalist = stalist
+        self.series = {sta: types.SimpleNamespace(t=t[i],
+                                                  data=timeseries.TSComponent(y[i], std=sig[i]))
+                       for i, sta in enumerate(stalist)}
+
+    def getStationsList(self):
+
+        return self.stalist
+
+    def __getitem__(self, sta):
+
+        return self.series[sta]
+
+
+def _fitChunk(model_name, stalist, shms, infos):
+
+    # No view of the shared blocks left once returned
+    t, y, sig, fitted = [getArrays(shm, info) for shm, info in zip(shms, infos)]
+    model = fit_data.timeseries_models[model_name](ChunkData(stalist, t, y, sig))
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        model.fitModel()
+
+    results = dict()
+    for i, sta in enumerate(stalist):
+        fitted[i][:] = model.fitted_models[sta]
+        results[sta] = (model.fitted_params[sta], model.fitted_metaparams[sta],
+                        model.rms[sta], model.wrms[sta])
+
+    return results
+
+
+def _fitWorker(snapshot, model_name, stalist, *infos):
+
+    # Module-level function so that it can be sent to a worker process.
+    # The worker does not share the configuration of the GUI process: the
+    # values needed are given explicitly (see FeaturesPool.CONFIG_SNAPSHOT)
+    for name, value in snapshot.items():
+        setattr(cfg, name, value)
+
+    shms = [multiprocessing.shared_memory.SharedMemory(name=info[0]) for info in infos]
+    try:
+        return _fitChunk(model_name, stalist, shms, infos)
+    finally:
+        for shm in shms:
+            shm.close()
+
+
+class FeaturesPool():
+
+    # Fits the models of the features on a pool of worker processes.
+    #
+    # The stations are split in chunks, each fitted by a worker on the data
+    # given to the model (t, y and sig), copied once in shared memory. The
+    # fitted models are written by the workers in shared memory too, only
+    # the parameters are sent back. Results are stored in the model of the
+    # GUI process as they come, so that the progress can be shown.
+
+    # Minimum number of stations sent to a worker at once
+    MIN_CHUNK_SIZE = 16
+
+    # Configuration values set in the workers
+    CONFIG_SNAPSHOT = ('reference_point', 'data_component')
+
+    def __init__(self, workers):
+
+        if workers < 0:
+            workers = os.cpu_count() or 1
+        self.workers = max(1, int(workers))
+
+        self.executor = None # started when first needed
+
+    def getExecutor(self):
+
+        # Started from scratch ('spawn'): forking the GUI process is unsafe
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                                self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    def getSnapshot(self):
+
+        return {name: getattr(cfg, name) for name in self.CONFIG_SNAPSHOT
+                if hasattr(cfg, name)}
+
+    def fitModel(self, model, stalist, progress=None):
+
+        nchunks = min(4*self.workers, len(stalist)//self.MIN_CHUNK_SIZE)
+        if self.workers <= 1 or nchunks <= 1:
+            model.fitModel(stalist)
+            return
+
+        model.prepareData(stalist)
+
+        print(f'Fitting model {model.name} with {self.workers:d} processes...')
+        lengths = [len(model.y[sta]) for sta in stalist]
+        t = SharedArrays(lengths, dtype=np.float64)
+        np.concatenate([model.t[sta] for sta in stalist], out=t.data)
+        y_dtype = np.result_type(*{np.asarray(model.y[sta]).dtype for sta in stalist})
+        y = SharedArrays(lengths, dtype=y_dtype)
+        np.concatenate([model.y[sta] for sta in stalist], out=y.data)
+        # std may be a scalar (0.0 by default)
+        sig_dtype = np.result_type(*{np.asarray(model.sig[sta]).dtype for sta in stalist})
+        sig = SharedArrays(lengths, dtype=sig_dtype)
+        np.concatenate([np.broadcast_to(model.sig[sta], (n, ))
+                        for sta, n in zip(stalist, lengths)], out=sig.data)
+        fitted = SharedArrays(lengths, dtype=np.float64)
+
+        snapshot = self.getSnapshot()
+        bounds = np.linspace(0, len(stalist), nchunks + 1).astype(int)
+        index = {sta: ista for ista, sta in enumerate(stalist)}
+        ndone = 0
+        try:
+            executor = self.getExecutor()
+            futures = {executor.submit(_fitWorker, snapshot, model.name, stalist[i:j],
+                                       t.getInfo(i, j), y.getInfo(i, j),
+                                       sig.getInfo(i, j), fitted.getInfo(i, j)): (i, j)
+                       for i, j in zip(bounds[:-1], bounds[1:])}
+            for future in concurrent.futures.as_completed(futures):
+                i, j = futures[future]
+                for sta, result in future.result().items():
+                    (model.fitted_params[sta], model.fitted_metaparams[sta],
+                     model.rms[sta], model.wrms[sta]) = result
+                    model.fitted_models[sta] = np.array(fitted[index[sta]]) # copy
+                ndone += j - i
+                if progress is not None:
+                    progress(f'Fitting model {model.name}', ndone, len(stalist))
+        except concurrent.futures.process.BrokenProcessPool as e:
+            print(f'Worker processes failed ({e}), fitting the stations left serially')
+            self.executor = None
+            model.fitModel([sta for sta in stalist if not model.fitted_metaparams[sta]])
+        finally:
+            for shared in (t, y, sig, fitted):
+                shared.close()
+
+        print('done')
+
+    def stop(self):
+
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
@@ -14,6 +14,8 @@ class LoaderInterface():
     LOADERS = {'GLOBALMASS_GPS': loaders_custom.GlobalMassHDF5,
                'RIVERLEVELS.UK': loaders_common.MultiCSV, # for backward compatibility
                'MULTI_CSV': loaders_common.MultiCSV,
+               'CF_TIMESERIES': loaders_common.CFTimeSeriesNetCDF4,
+               'LONG_TABLE': loaders_common.LongTable,
                'ANRIJS_TIDE_GAUGES': loaders_custom.AnrijsNetCDF4}
 
     def __init__(self, data_descriptor):
@@ -1,6 +1,5 @@
 # coding: utf-8
 
-import copy
 import functools
 import glob
 import pathlib
@@ -16,8 +15,135 @@ from tools import datetime_tools
 from . import timeseries as ts
 from . import loaders_generic
 
+
+## Columnar CSV reader
+
+CSV_DATE_WIDTH = 10 # dates are read from the first 10 characters of the field
+
+def read_csv_columns(csvpath, columns, time_field='', delimiter=',',
+                     comment='#', encoding='ascii', column_header=False,
+                     offset=0, time_converter=None, time_window=None):
+    """Read some columns of a CSV file in bulk
+
+    columns is a list of (column index, name, missing value). The time
+    column (named time_field) is returned as raw bytes, or converted by
+    time_converter if given, all the other columns are parsed as float64
+    (missing or empty values are NaN).
+    If offset > 0, only the complete lines after this position in the file
+    are read (e.g. rows appended since the last read), without header.
+    If time_window = (tmin, tmax) is given (with time_converter), only the
+    rows tmin <= t < tmax are kept, the other columns of the rows outside
+    of the window are not parsed at all.
+    Return a dict name -> column, the number of rows of data and the
+    position in the file where the next read should start.
+    """
+
+    with open(csvpath, 'rb') as f:
+        f.seek(offset)
+        raw = f.read()
+    if offset:
+        # The last line may still be being written
+        raw = raw[:raw.rfind(b'\n') + 1]
+        column_header = False
+    end = offset + len(raw)
+
+    comment = comment.encode(encoding) if comment else b''
+    delimiter = delimiter.encode(encoding)
+
+    # Drop comments (whole lines or end of lines) and empty lines
+    lines = raw.splitlines()
+    if comment and comment in raw:
+        lines = [line.partition(comment)[0] for line in lines]
+    lines = [line for line in lines if line.strip()]
+    if column_header and lines:
+        lines = lines[1:]
+
+    nrows = len(lines)
+    if not nrows:
+        return dict(), 0, end
+
+    # Split all the fields at once, one row per line
+    ncols = lines[0].count(delimiter) + 1
+    fields = delimiter.join(lines).split(delimiter)
+    if len(fields) != nrows*ncols:
+        raise ValueError(f'{csvpath}: all the rows must have {ncols} columns')
+    fields = np.array(fields, dtype=bytes).reshape(nrows, ncols)
+
+    csv_data = dict()
+    if time_converter is not None:
+        itime = [icol for icol, name, _ in columns if name == time_field][0]
+        t = time_converter(np.char.strip(fields[:, itime]))
+        if time_window is not None:
+            tmin, tmax = time_window
+            if np.all(t[1:] >= t[:-1]):
+                # Sorted file: the window is a block of rows
+                rows = slice(np.searchsorted(t, tmin), np.searchsorted(t, tmax))
+            else:
+                rows = (t >= tmin) & (t < tmax)
+            fields, t = fields[rows], t[rows]
+            nrows = len(t)
+        csv_data[time_field] = t
+
+    for icol, name, missing_value in columns:
+        if name == time_field:
+            if time_converter is None:
+                csv_data[name] = np.char.strip(fields[:, icol])
+            continue
+        column = np.char.strip(fields[:, icol])
+        missing = column == b''
+        if missing_value is not None:
+            missing |= column == str(missing_value).strip().encode(encoding)
+        try:
+            values = np.where(missing, b'nan', column).astype(np.float64)
+        except ValueError:
+            raise ValueError(f"{csvpath}: invalid value in column '{name}'")
+        if isinstance(missing_value, float):
+            values[values == missing_value] = np.nan # e.g. -999 vs -999.0
+        csv_data[name] = values
+
+    return csv_data, nrows, end
+
+def csv_dates2timestamp(dates, date_format=''):
+    """Convert an array of date bytes to UNIX timestamps (at noon)
+
+    date_format gives the position of the year, month and day in the
+    string (e.g. 'DD/MM/YYYY'), the default is YYYYMMDD with optional
+    '-' or '/' separators. Missing month or day default to 1.
+    """
+
+    dates = np.asarray(dates, dtype=bytes).astype(f'S{CSV_DATE_WIDTH}')
+    if date_format:
+        date_format = date_format.upper()
+    else:
+        # For backward compatibility
+        dates = np.char.replace(np.char.replace(dates, b'-', b''), b'/', b'')
+        dates = dates.astype(f'S{CSV_DATE_WIDTH}')
+        date_format = 'YYYYMMDD'
+
+    # One row of characters per date, missing characters are null bytes
+    chars = np.ascontiguousarray(dates).view(np.uint8).reshape(-1, CSV_DATE_WIDTH)
+    digits = chars.astype(np.int64) - ord('0')
+
+    def parse_field(letter):
+        if letter not in date_format:
+            return 1
+        start, end = date_format.find(letter), date_format.rfind(letter) + 1
+        if end > CSV_DATE_WIDTH:
+            raise ValueError(f'Date format {date_format} is too long')
+        field_digits = digits[:, start:end]
+        if np.any((field_digits < 0) | (field_digits > 9)):
+            raise ValueError(f'Dates do not match the format {date_format}')
+        return field_digits @ 10**np.arange(end - start - 1, -1, -1)
+
+    years, months, days = (parse_field(letter) for letter in 'YMD')
+
+    return datetime_tools.ymd2timestamp(years, months, days)
+
+
 class MultiCSV(loaders_generic.GenericCSV):
 
+    NATIVE_TIME_WINDOW = True
+
     def __init__(self, data_desc):
         super().__init__(data_desc)
 
@@ -25,24 +151,23 @@ class MultiCSV(loaders_generic.GenericCSV):
         assert self.desc['DATA_SPEC'].upper() in ('RIVERLEVELS.UK', 'MULTI_CSV')
         assert self.desc['VERSION'] in ('1.0', )
 
-    def _loadData(self, stalist, path):
+    def _loadData(self, stalist, path, offsets=None):
+
+        # offsets: read only the rows after these positions in the files
+        # (see _loadUpdates), stations with no new rows are left out
 
         total_t = time.time()
         loadtime_t = 0.0
         loadother_t = 0.0
 
-        data_dict = {sta: copy.deepcopy(self.data_schema) for sta in stalist}
+        data_dict = self.newDataDicts(stalist)
         no_data = []
+        if offsets is None:
+            offsets = [0]*len(stalist)
 
         # Get the date format (default is YYYYMMDD)
-        if date_format := self.data_schema['t'].get('format', ''):
-            date_format = date_format.upper()
-            mm, dd = None, None
-            yy = date_format.find('Y'), date_format.rfind('Y') + 1
-            if 'M' in date_format:
-                mm = date_format.find('M'), date_format.rfind('M') + 1
-            if 'D' in date_format:
-                dd = date_format.find('D'), date_format.rfind('D') + 1
+        date_format = self.data_schema['t'].get('format', '')
+        time_converter = functools.partial(csv_dates2timestamp, date_format=date_format)
 
         # Link components in data schema with CSV columns before reading
         csvpath = path[0]
@@ -52,37 +177,44 @@ class MultiCSV(loaders_generic.GenericCSV):
         index_to_comp = self.identifyColumns(headers)
         #print(index_to_comp)
 
-        dtype_desc = []
-        missing_values = []
+        # Columns to read: (column index, field name, missing value)
+        columns = []
         for icol, column_info in index_to_comp.items():
+            if not column_info:
+                continue # column not used
             comp_id, data_type, missing_value = column_info
+            if comp_id in self.data_schema['components'] and \
+               not self.isComponentLoaded(comp_id):
+                continue # component not loaded, column not parsed
             if comp_id == self.TIME:
-                dtype_desc.append((self.TIME, '|S10'))
-                missing_values.append(None)
+                columns.append((icol, self.TIME, None))
             else:
                 suffix = '_' + data_type if data_type != 'data' else ''
-                dtype_desc.append((comp_id + suffix, np.float))
-                missing_values.append(missing_value)
-        #print(dtype_desc, missing_values)
-
-        #for comp_name in self.data_schema['components'].keys():
-        #    if comp_name in ('t', 'corrections', 'events'):
-        #        continue
-        #    dtype_desc.append((comp_name, np.float))
+                columns.append((icol, comp_id + suffix, missing_value))
+        #print(columns)
 
-        for sta, csv in zip(stalist, path):
+        for sta, csv, offset in zip(stalist, path, offsets):
 
             data = data_dict[sta]
 
-            csv_data = np.genfromtxt(csv,
-                                     encoding=self.desc['ENCODING'],
-                                     dtype=dtype_desc,
-                                     delimiter=self.desc['DELIMITER'],
-                                     # skip_header=1,
-                                     missing_values=missing_values)
-            #print(csv_data.dtype.names)
+            startt = time.time()
+            csv_data, nrows, end = read_csv_columns(csv, columns,
+                                                    time_field=self.TIME,
+                                                    delimiter=self.delimiter,
+                                                    comment=self.comment,
+                                                    encoding=self.encoding,
+                                                    column_header=self.column_header,
+                                                    offset=offset,
+                                                    time_converter=time_converter,
+                                                    time_window=self.time_window)
+            data['file_offset'] = end # where to read appended rows
 
-            if not csv_data.shape:
+            if not nrows and offset:
+                # Nothing new
+                del data_dict[sta]
+                continue
+            elif not nrows and self.TIME not in csv_data:
+                # Empty file (no epoch in the time window gives empty arrays)
                 print(f"No data for {sta:s}!")
                 no_data.append(sta)
                 dates = np.asarray([np.datetime64('2010-01-01 12:00:00Z'),
@@ -96,22 +228,9 @@ class MultiCSV(loaders_generic.GenericCSV):
                     comp['std'] = np.asarray([0.0, 0.0])
                 continue
 
-            if self.column_header:
-                csv_data = csv_data[1:]
-
             print("Loading data for %s..." % sta)
 
-            startt = time.time()
-            dates = [date.decode('ascii') for date in csv_data[self.TIME]]
-            if date_format:
-                for i, date in enumerate(dates):
-                    YY = date[yy[0]:yy[1]]
-                    MM = date[mm[0]:mm[1]] if mm else '01'
-                    DD = date[dd[0]:dd[1]] if dd else '01'
-                    dates[i] = YY + MM + DD
-            dates = [date.replace('-', '').replace('/', '') for date in dates] # for backward compatibility
-            dates = datetime_tools.ymd2datetime(dates)
-            data['t']['data'] = datetime_tools.datetime2timestamp(dates)
+            data['t']['data'] = csv_data[self.TIME]
             loadtime_t += time.time() - startt
 
             startt = time.time()
@@ -122,6 +241,8 @@ class MultiCSV(loaders_generic.GenericCSV):
                     if comp_id in ('t', 'corrections', 'events', ''):
                         #TODO: handle corrections and events properly
                         continue
+                    if comp_grp == 'components' and not self.isComponentLoaded(comp_id):
+                        continue # description only
 
                     # Component itself
                     comp['data'] = csv_data[comp_id][:]
@@ -143,3 +264,226 @@ class MultiCSV(loaders_generic.GenericCSV):
         print(' other data loading: {:.3f}s ({:.2f}%)'.format(loadother_t, 100.*loadother_t/total_t))
 
         return data_dict
+
+    def _loadUpdates(self, stalist, path):
+
+        # Rows appended since the end of the last read of each file
+        # (unknown for data loaded by a previous version of the loader)
+        known = [i for i, sta in enumerate(stalist)
+                 if hasattr(self.timeseries_dict[sta], 'file_offset')]
+        stalist = [stalist[i] for i in known]
+        path = [path[i] for i in known]
+        offsets = [self.timeseries_dict[sta].file_offset for sta in stalist]
+        if not stalist:
+            return dict()
+
+        return self._loadData(stalist, path, offsets=offsets)
+
+
+class CFTimeSeriesNetCDF4(loaders_generic.GenericNetCDF4):
+
+    # Single NetCDF4 file following the CF conventions for time series
+    # (discrete sampling geometries), see GenericNetCDF4 for the layouts.
+    # The time vector is common to all the components.
+
+    NATIVE_TIME_WINDOW = True
+
+    def __init__(self, data_desc):
+        super().__init__(data_desc)
+
+        assert self.desc['DATA_SPEC'].upper() == 'CF_TIMESERIES'
+        assert self.desc['VERSION'] in ('1.0', )
+
+    def _loadData(self, stalist, path):
+
+        total_t = time.time()
+        loadtime_t = 0.0
+        loadother_t = 0.0
+
+        data_dict = self.newDataDicts(stalist)
+
+        # The file is opened only once per call: each variable is read for
+        # all the stations at once in a pre-sized buffer, then split per station.
+        with netCDF4.Dataset(path, 'r') as ncf:
+
+            print("Loading data for %d stations..." % len(stalist))
+
+            # The epochs outside of the time window are not read at all
+            startt = time.time()
+            t, offsets, selection = self.selectEpochs(ncf, stalist)
+            for i, sta in enumerate(stalist):
+                data_dict[sta]['t']['data'] = t[offsets[i]:offsets[i + 1]]
+            loadtime_t += time.time() - startt
+
+            startt = time.time()
+
+            # Components and associated quantities
+            components = dict()
+            for name, comp in self.data_schema['components'].items():
+                if name in ('t', 'corrections', 'events'):
+                    continue
+                if not self.isComponentLoaded(name):
+                    continue # description only
+
+                # Component itself
+                comp_data, offsets = self.readVariableBatch(ncf, comp['datapath'], selection)
+                if 'stdpath' in comp:
+                    comp_std, _ = self.readVariableBatch(ncf, comp['stdpath'], selection)
+                else:
+                    comp_std = np.zeros(comp_data.shape)
+                components[name] = (comp_data, offsets)
+
+                for i, sta in enumerate(stalist):
+                    sta_comp = data_dict[sta]['components'][name]
+                    sta_comp['data'] = comp_data[offsets[i]:offsets[i + 1]]
+                    sta_comp['std'] = comp_std[offsets[i]:offsets[i + 1]]
+
+                # Component-specific corrections
+                for grp_name, grp_corr in comp.get('corrections', dict()).items():
+                    for corr_name, corr in grp_corr.items():
+                        corr_data, c_offsets = self._readCorrectionBatch(ncf, corr, selection,
+                                                                         [components[name]])
+                        for i, sta in enumerate(stalist):
+                            sta_corr = data_dict[sta]['components'][name]['corrections'][grp_name][corr_name]
+                            sta_corr['data'] = corr_data[c_offsets[i]:c_offsets[i + 1]]
+
+                # Component-specific events
+                for grp_name, grp_events in comp.get('events', dict()).items():
+                    for events_name, events in grp_events.items():
+                        events_data, e_offsets = self.readEventsBatch(ncf, events['path'],
+                                                                      selection['indices'])
+                        for i, sta in enumerate(stalist):
+                            sta_events = data_dict[sta]['components'][name]['events'][grp_name][events_name]
+                            sta_events['data'] = events_data[e_offsets[i]:e_offsets[i + 1]]
+
+            # Common corrections
+            for grp_name, grp_corr in self.data_schema['corrections'].items():
+                for corr_name, corr in grp_corr.items():
+                    corr_data, c_offsets = self._readCorrectionBatch(ncf, corr, selection,
+                                                                     components.values())
+                    for i, sta in enumerate(stalist):
+                        sta_corr = data_dict[sta]['corrections'][grp_name][corr_name]
+                        sta_corr['data'] = corr_data[c_offsets[i]:c_offsets[i + 1]]
+
+            # Common events
+            for grp_name, grp_events in self.data_schema['events'].items():
+                for events_name, events in grp_events.items():
+                    events_data, e_offsets = self.readEventsBatch(ncf, events['path'],
+                                                                  selection['indices'])
+                    for i, sta in enumerate(stalist):
+                        sta_events = data_dict[sta]['events'][grp_name][events_name]
+                        sta_events['data'] = events_data[e_offsets[i]:e_offsets[i + 1]]
+
+            loadother_t += time.time() - startt
+
+        total_t = time.time() - total_t
+        print('Loading time: {:.3f}s'.format(total_t))
+        print(' time vector loading: {:.3f}s ({:.2f}%)'.format(loadtime_t, 100.*loadtime_t/total_t))
+        print(' other data loading: {:.3f}s ({:.2f}%)'.format(loadother_t, 100.*loadother_t/total_t))
+
+        return data_dict
+
+    def _readCorrectionBatch(self, ncf, corr, selection, components):
+
+        # Read a correction for all the stations and apply it (or remove it)
+        # at once to the batched data of each component
+        corr_data, corr_offsets = self.readVariableBatch(ncf, corr['path'], selection)
+        for comp_data, offsets in components:
+            if corr['apply']:
+                # Apply the correction
+                comp_data += corr['factor'] * corr_data
+            else:
+                # Remove the correction
+                comp_data -= corr['factor'] * corr_data
+
+        return corr_data, corr_offsets
+
+
+class LongTable(loaders_generic.GenericParquet):
+
+    # Long-format table in Parquet or Feather file(s), see GenericParquet.
+    # The time vector is common to all the components, events are not
+    # stored in such tables.
+
+    NATIVE_TIME_WINDOW = True
+
+    def __init__(self, data_desc):
+        super().__init__(data_desc)
+
+        assert self.desc['DATA_SPEC'].upper() == 'LONG_TABLE'
+        assert self.desc['VERSION'] in ('1.0', )
+
+    def _loadData(self, stalist, path):
+
+        total_t = time.time()
+
+        data_dict = self.newDataDicts(stalist)
+
+        # Columns to read: components loaded, their std and corrections
+        components = [name for name in self.data_schema['components']
+                      if name not in ('t', 'corrections', 'events')
+                      and self.isComponentLoaded(name)]
+        columns = []
+        for name in components:
+            comp = self.data_schema['components'][name]
+            columns.append(comp['datapath'])
+            if 'stdpath' in comp:
+                columns.append(comp['stdpath'])
+            for grp_corr in comp.get('corrections', dict()).values():
+                columns += [corr['path'] for corr in grp_corr.values()]
+        for grp_corr in self.data_schema['corrections'].values():
+            columns += [corr['path'] for corr in grp_corr.values()]
+
+        print("Loading data for %d stations..." % len(stalist))
+
+        # All the stations at once, only the epochs in the time window
+        t, table, offsets = self.readTable(path, stalist, list(dict.fromkeys(columns)))
+
+        for i, sta in enumerate(stalist):
+            data_dict[sta]['t']['data'] = t[offsets[i]:offsets[i + 1]]
+
+        # Components and associated quantities
+        comp_data = dict()
+        for name in components:
+            comp = self.data_schema['components'][name]
+            comp_data[name] = table[comp['datapath']]
+            if 'stdpath' in comp:
+                comp_std = table[comp['stdpath']]
+            else:
+                comp_std = np.zeros(comp_data[name].shape)
+
+            # Component-specific corrections
+            for grp_name, grp_corr in comp.get('corrections', dict()).items():
+                for corr_name, corr in grp_corr.items():
+                    self._applyCorrection(table[corr['path']], corr, [comp_data[name]])
+                    for i, sta in enumerate(stalist):
+                        sta_corr = data_dict[sta]['components'][name]['corrections'][grp_name][corr_name]
+                        sta_corr['data'] = table[corr['path']][offsets[i]:offsets[i + 1]]
+
+            for i, sta in enumerate(stalist):
+                sta_comp = data_dict[sta]['components'][name]
+                sta_comp['data'] = comp_data[name][offsets[i]:offsets[i + 1]]
+                sta_comp['std'] = comp_std[offsets[i]:offsets[i + 1]]
+
+        # Common corrections
+        for grp_name, grp_corr in self.data_schema['corrections'].items():
+            for corr_name, corr in grp_corr.items():
+                self._applyCorrection(table[corr['path']], corr, comp_data.values())
+                for i, sta in enumerate(stalist):
+                    sta_corr = data_dict[sta]['corrections'][grp_name][corr_name]
+                    sta_corr['data'] = table[corr['path']][offsets[i]:offsets[i + 1]]
+
+        total_t = time.time() - total_t
+        print('Loading time: {:.3f}s'.format(total_t))
+
+        return data_dict
+
+    def _applyCorrection(self, corr_data, corr, components):
+
+        for comp_data in components:
+            if corr['apply']:
+                # Apply the correction
+                comp_data += corr['factor'] * corr_data
+            else:
+                # Remove the correction
+                comp_data -= corr['factor'] * corr_data
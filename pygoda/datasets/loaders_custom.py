@@ -1,6 +1,5 @@
 # coding: utf-8
 
-import copy
 import functools
 import glob
 import pathlib
@@ -11,7 +10,6 @@ import netCDF4
 import scipy as sp
 import h5py
 
-from tools import yaml2bool
 from tools import datetime_tools
 from . import timeseries as ts
 from . import loaders_generic
@@ -19,178 +17,274 @@ from . import loaders_generic
 
 class GlobalMassHDF5(loaders_generic.GenericHDF5):
 
+    NATIVE_TIME_WINDOW = True
+
     def __init__(self, data_desc):
         super().__init__(data_desc)
 
         assert self.desc['DATA_SPEC'].upper() == 'GLOBALMASS_GPS'
         assert self.desc['VERSION'] in ('1.0', '1.1')
 
-    def _loadData(self, stalist, path):
+    def _loadData(self, stalist, path, starts=None):
+
+        # starts: read only the epochs from these indices (see _loadUpdates),
+        # the events are always read entirely
+        # The epochs outside of the time window are not read at all
 
         total_t = time.time()
         loadtime_t = 0.0
         loadother_t = 0.0
 
-        data_dict = {sta: copy.deepcopy(self.data_schema) for sta in stalist}
+        data_dict = self.newDataDicts(stalist)
+
+        # The file is opened only once per call: each dataset is read for all
+        # the stations at once in a pre-sized buffer, then split per station.
+        with h5py.File(path, 'r') as h5f:
+            h5_groups = [h5f[sta] for sta in stalist]
+
+            print("Loading data for %d stations..." % len(stalist))
+
+            stops = None
+            if self.time_window is not None:
+                # Time vector in decimal years in the file, one epoch per day
+                # at noon: first days whose epoch is >= tmin and >= tmax
+                day = datetime_tools.ONE_DAY
+                tmin, tmax = (datetime_tools.timestamp2decyr(np.ceil(t/day - 0.5)*day)
+                              for t in self.time_window)
+                w_starts, stops = self.searchTimeWindow(h5_groups,
+                                                        self.data_schema[self.TIME]['path'],
+                                                        tmin, tmax)
+                starts = w_starts if starts is None else np.maximum(starts, w_starts)
+            if starts is None:
+                starts = np.zeros(len(stalist), dtype=np.int64)
+
+            # Variable = 't', both for time series and profiles
+            # Can be common or different for each component
+            startt = time.time()
+            t, offsets = self.readDatasetBatch(h5_groups, self.data_schema[self.TIME]['path'],
+                                               starts=starts, stops=stops)
+            t = datetime_tools.decyr2timestamp(t, precise=False)
+            for i, sta in enumerate(stalist):
+                data_dict[sta]['t']['data'] = t[offsets[i]:offsets[i + 1]]
+                # Where to read appended epochs
+                data_dict[sta]['file_end'] = int(starts[i] + offsets[i + 1] - offsets[i])
+            loadtime_t += time.time() - startt
+
+            startt = time.time()
+
+            # Components and associated quantities
+            components = dict()
+            for name, comp in self.data_schema['components'].items():
+                if name in ('t', 'corrections', 'events'):
+                    continue
+                if not self.isComponentLoaded(name):
+                    continue # description only
+
+                # Component itself
+                comp_data, offsets = self.readDatasetBatch(h5_groups, comp['datapath'],
+                                                           starts=starts, stops=stops)
+                if 'stdpath' in comp:
+                    comp_std, _ = self.readDatasetBatch(h5_groups, comp['stdpath'],
+                                                        starts=starts, stops=stops)
+                else:
+                    comp_std = np.zeros(comp_data.shape)
+                components[name] = (comp_data, offsets)
+
+                for i, sta in enumerate(stalist):
+                    sta_comp = data_dict[sta]['components'][name]
+                    sta_comp['data'] = comp_data[offsets[i]:offsets[i + 1]]
+                    sta_comp['std'] = comp_std[offsets[i]:offsets[i + 1]]
+
+                # Component-specific time vector
+                if 't' in comp:
+                    comp_t, t_offsets = self.readDatasetBatch(h5_groups, comp[self.TIME]['path'],
+                                                              starts=starts, stops=stops)
+                    comp_t = datetime_tools.decyr2timestamp(comp_t)
+                    for i, sta in enumerate(stalist):
+                        sta_comp = data_dict[sta]['components'][name]
+                        sta_comp['t']['data'] = comp_t[t_offsets[i]:t_offsets[i + 1]]
+
+                # Component-specific corrections
+                for grp_name, grp_corr in comp.get('corrections', dict()).items():
+                    for corr_name, corr in grp_corr.items():
+                        corr_data, c_offsets = self._readCorrectionBatch(h5_groups, corr,
+                                                                         [components[name]],
+                                                                         starts=starts, stops=stops)
+                        for i, sta in enumerate(stalist):
+                            sta_corr = data_dict[sta]['components'][name]['corrections'][grp_name][corr_name]
+                            sta_corr['data'] = corr_data[c_offsets[i]:c_offsets[i + 1]]
+
+                # Component-specific events
+                for grp_name, grp_events in comp.get('events', dict()).items():
+                    for events_name, events in grp_events.items():
+                        events_data, e_offsets = self._readEventsBatch(h5_groups, events)
+                        for i, sta in enumerate(stalist):
+                            sta_events = data_dict[sta]['components'][name]['events'][grp_name][events_name]
+                            sta_events['data'] = events_data[e_offsets[i]:e_offsets[i + 1]]
+
+            # Common corrections
+            for grp_name, grp_corr in self.data_schema['corrections'].items():
+                for corr_name, corr in grp_corr.items():
+                    corr_data, c_offsets = self._readCorrectionBatch(h5_groups, corr,
+                                                                     components.values(),
+                                                                     starts=starts, stops=stops)
+                    for i, sta in enumerate(stalist):
+                        sta_corr = data_dict[sta]['corrections'][grp_name][corr_name]
+                        sta_corr['data'] = corr_data[c_offsets[i]:c_offsets[i + 1]]
+
+            # Common events
+            for grp_name, grp_events in self.data_schema['events'].items():
+                for events_name, events in grp_events.items():
+                    events_data, e_offsets = self._readEventsBatch(h5_groups, events)
+                    for i, sta in enumerate(stalist):
+                        sta_events = data_dict[sta]['events'][grp_name][events_name]
+                        sta_events['data'] = events_data[e_offsets[i]:e_offsets[i + 1]]
+
+            loadother_t += time.time() - startt
 
-        for sta in stalist:
-            with h5py.File(path, 'r') as h5f:
-                data = data_dict[sta]
-                h5f_sta = h5f[sta]
+        total_t = time.time() - total_t
+        print('Loading time: {:.3f}s'.format(total_t))
+        print(' time vector loading: {:.3f}s ({:.2f}%)'.format(loadtime_t, 100.*loadtime_t/total_t))
+        print(' other data loading: {:.3f}s ({:.2f}%)'.format(loadother_t, 100.*loadother_t/total_t))
 
-                print("Loading %s data..." % sta)
+        return data_dict
 
-                # Variable = 't', both for time series and profiles
-                # Can be common or different for each component
-                startt = time.time()
-                data['t']['data'] = datetime_tools.decyr2datetime(h5f_sta[data[self.TIME]['path']][:], precise=False) # SLOW!
-                data['t']['data'] = datetime_tools.datetime2timestamp(data[self.TIME]['data'])
-                loadtime_t += time.time() - startt
+    def _loadUpdates(self, stalist, path):
 
-                startt = time.time()
+        # Epochs appended to the datasets since the last load
+        starts = [getattr(self.timeseries_dict[sta], 'file_end', len(self.timeseries_dict[sta].t))
+                  for sta in stalist]
+        data_dict = self._loadData(stalist, path, starts=starts)
 
-                # Components and associated quantities
-                data = data_dict[sta]['components']
-                for name, comp in data.items():
-                    if name in ('t', 'corrections', 'events'):
-                        continue
+        return {sta: data for sta, data in data_dict.items() if len(data['t']['data'])}
 
-                    # Component itself
-                    comp['data'] = h5f_sta[comp['datapath']][:]
-                    if 'stdpath' in comp:
-                        comp['std'] = h5f_sta[comp['stdpath']][:]
-                    else:
-                        comp['std'] = np.zeros(comp['data'].shape)
+    def _readCorrectionBatch(self, h5_groups, corr, components, starts=None,
+                             stops=None):
 
-                    # Component-specific time vector
-                    if 't' in comp:
-                        comp['t']['data'] = datetime_tools.decyr2datetime(h5f_sta[comp[self.TIME]['path']][:])
-                        comp['t']['data'] = datetime_tools.datetime2timestamp(comp[self.TIME]['data'])
+        # Read a correction for all the stations and apply it (or remove it)
+        # at once to the batched data of each component
+        corr_data, corr_offsets = self.readDatasetBatch(h5_groups, corr['path'],
+                                                        starts=starts, stops=stops)
+        for comp_data, offsets in components:
+            if not np.array_equal(offsets, corr_offsets):
+                raise ValueError(f"Correction {corr['path']} and data " \
+                                 "have different lengths")
+            if corr['apply']:
+                # Apply the correction
+                comp_data += corr['factor'] * corr_data
+            else:
+                # Remove the correction
+                comp_data -= corr['factor'] * corr_data
 
-                    # Component-specific corrections
-                    for grp_name, grp_corr in comp.get('corrections', dict()).items():
-                        for name, corr in grp_corr.items():
-                            corr['data'] = h5f_sta[corr['path']][:]
+        return corr_data, corr_offsets
 
-                            if corr['apply']:
-                                # Apply the correction
-                                comp['data'] += corr['factor'] * corr['data']
-                            else:
-                                # Remove the correction
-                                comp['data'] -= corr['factor'] * corr['data']
+    def _readEventsBatch(self, h5_groups, events):
 
-                    # Component-specific events
-                    for grp_name, grp_events in comp.get('events', dict()).items():
-                        for name, events in grp_events.items():
-                            if events['path'] in h5f_sta:
-                                tmp = datetime_tools.decyr2datetime(h5f_sta[events['path']][:], precise=False)
-                                events['data'] = datetime_tools.datetime2timestamp(tmp)
-                            else:
-                                events['data'] = np.asarray([])
-
-                # Common corrections
-                data = data_dict[sta]['corrections']
-                for grp_name, grp_corr in data.items():
-                    for name, corr in grp_corr.items():
-                        corr['data'] = h5f_sta[corr['path']][:]
-                        for name, comp in data_dict[sta]['components'].items():
-                            if name in ('t', 'corrections', 'events'):
-                                continue
-
-                            if corr['apply']:
-                                # Apply the correction
-                                comp['data'] += corr['factor'] * corr['data']
-                            else:
-                                # Remove the correction
-                                comp['data'] -= corr['factor'] * corr['data']
-
-                # Common events
-                data = data_dict[sta]['events']
-                for grp_name, grp_events in data.items():
-                    for name, events in grp_events.items():
-                        if events['path'] in h5f_sta:
-                            tmp = datetime_tools.decyr2datetime(h5f_sta[events['path']][:], precise=False)
-                            events['data'] = datetime_tools.datetime2timestamp(tmp)
-                        else:
-                            events['data'] = np.asarray([])
-
-                loadother_t += time.time() - startt
+        # Stations with no events get an empty array
+        events_data, offsets = self.readDatasetBatch(h5_groups, events['path'],
+                                                     required=False)
+        events_data = datetime_tools.decyr2timestamp(events_data, precise=False)
 
-        total_t = time.time() - total_t
-        print('Loading time: {:.3f}s'.format(total_t))
-        print(' time vector loading: {:.3f}s ({:.2f}%)'.format(loadtime_t, 100.*loadtime_t/total_t))
-        print(' other data loading: {:.3f}s ({:.2f}%)'.format(loadother_t, 100.*loadother_t/total_t))
+        return events_data, offsets
 
-        return data_dict
 
+class AnrijsNetCDF4(loaders_generic.GenericMultiLoader,
+                    loaders_generic.GenericNetCDF4):
 
-class AnrijsNetCDF4(loaders_generic.GenericNetCDF4,
-                    loaders_generic.GenericMultiLoader):
+    # One NetCDF4 file per station, metadata in the global attributes
 
     def __init__(self, data_desc):
-        super().__init__(data_desc, 'ANRIJS_TIDE_GAUGES', ('1.0', ))
+        super().__init__(data_desc, 'BINARY', 'NETCDF4')
+
+        assert self.desc['DATA_SPEC'].upper() == 'ANRIJS_TIDE_GAUGES'
+        assert self.desc['VERSION'] in ('1.0', )
+
+    def convertTime(self, var, values):
+
+        # Without CF units, time in days (since year 0) as in the first files
+        if 'since' not in getattr(var, 'units', ''):
+            values = np.ma.filled(np.ma.asarray(values, dtype=np.float64), np.nan)
+            return datetime_tools.decyr2timestamp(values/365.2425, precise=False)
+
+        return super().convertTime(var, values)
 
     def _loadData(self, stalist, path):
 
-        data_dict = {sta: copy.deepcopy(self.data_schema) for sta in stalist}
+        data_dict = self.newDataDicts(stalist)
 
         for sta, ncdf in zip(stalist, path):
 
             data = data_dict[sta]
 
-            with netCDF4.Dataset(ncdf, "r", format="NETCDF4") as nc4f:
+            with netCDF4.Dataset(ncdf, 'r') as nc4f:
 
                 print("Loading %s data..." % sta)
 
                 # Variable = 't', both for time series and profiles
-                data['t'] = nc4f['t'][:]/365.2425
+                t_var = self.getVariable(nc4f, self.data_schema['t']['path'])
+                data['t']['data'] = self.convertTime(t_var, t_var[:])
 
-                # Events
-                # data['EVENTS'] = dict()
-                # for event in self.desc['EVENTS']:
-                #     data['EVENTS'][event] = nc4f[event][:]
+                # Components and their uncertainties
+                components = []
+                for name, comp in self.data_schema['components'].items():
+                    if name in ('t', 'corrections', 'events'):
+                        continue
+                    if not self.isComponentLoaded(name):
+                        continue # description only
 
-                # Corrections
-                if 'CORRECTIONS' in self.desc:
-                    data['CORRECTIONS'] = dict()
-                    for correction in self.desc['CORRECTIONS']:
-                        data['CORRECTIONS'][correction] = nc4f[correction][:]
+                    sta_comp = data['components'][name]
+                    sta_comp['data'] = self.readVariable(nc4f, comp['datapath'])
+                    if 'stdpath' in comp:
+                        sta_comp['std'] = self.readVariable(nc4f, comp['stdpath'])
+                    else:
+                        sta_comp['std'] = np.zeros(sta_comp['data'].shape)
+                    components.append(sta_comp['data'])
 
-                # Components and their uncertainties
-                # data['COMPONENTS'] = dict()
-                for name, comp in self.desc['COMPONENTS'].items():
-                    id_ = comp.get('id', name)
-                    # std = comp['std']
-                    data[id_] = nc4f[name][:]
-                    data['std' + id_] = 0*data[id_] #nc4f[std][:]
-
-                    if 'events' in comp:
-                        #TODO: create an event list per component?
-                        if yaml2bool(comp.get('merge_events', False)):
-                            merged_events = comp['events'][0]
-                            data[merged_events] = []
-                            for event in comp['events']:
-                                data[merged_events] += list(data['EVENTS'][event])
-                            data[merged_events].sort()
-                            data[merged_events] = np.asarray(data[merged_events])
-                        else:
-                            for event in comp['events']:
-                                data[event] = data['EVENTS'][event]
-
-                    if 'corrections' in comp:
-                        for corr_name, correction in comp['corrections'].items():
-                            factor = float(correction['factor'])
-                            applied = yaml2bool(correction['applied'])
-                            apply = yaml2bool(correction['apply'])
-                            if apply and not applied:
-                                data[id_] += factor * data['CORRECTIONS'][corr_name]
-
-                    # data['t'] = data['t'][~np.isnan(data[id_])]
-                    # data[id_] = data[id_][~np.isnan(data[id_])]
-
-                self.timeseries_dict[sta].setAttributes(data)
-                self.timeseries_dict[sta].setMainComponent('original_data')
-
-        print('%d GPS time series loaded and corrected.' % self.nsta)
-
-        return self.timeseries_dict
+                    # Component-specific corrections and events
+                    for grp_name, grp_corr in comp.get('corrections', dict()).items():
+                        for corr_name, corr in grp_corr.items():
+                            sta_corr = sta_comp['corrections'][grp_name][corr_name]
+                            sta_corr['data'] = self._readCorrection(nc4f, corr,
+                                                                    [sta_comp['data']])
+                    for grp_name, grp_events in comp.get('events', dict()).items():
+                        for events_name, events in grp_events.items():
+                            sta_events = sta_comp['events'][grp_name][events_name]
+                            sta_events['data'] = self._readEvents(nc4f, events['path'])
+
+                # Common corrections and events
+                for grp_name, grp_corr in self.data_schema['corrections'].items():
+                    for corr_name, corr in grp_corr.items():
+                        sta_corr = data['corrections'][grp_name][corr_name]
+                        sta_corr['data'] = self._readCorrection(nc4f, corr, components)
+                for grp_name, grp_events in self.data_schema['events'].items():
+                    for events_name, events in grp_events.items():
+                        sta_events = data['events'][grp_name][events_name]
+                        sta_events['data'] = self._readEvents(nc4f, events['path'])
+
+        print('%d tide gauge time series loaded.' % len(stalist))
+
+        return data_dict
+
+    def _readCorrection(self, nc4f, corr, components):
+
+        corr_data = self.readVariable(nc4f, corr['path'])
+        for comp_data in components:
+            if corr['apply']:
+                # Apply the correction
+                comp_data += corr['factor'] * corr_data
+            else:
+                # Remove the correction
+                comp_data -= corr['factor'] * corr_data
+
+        return corr_data
+
+    def _readEvents(self, nc4f, path):
+
+        # Stations with no events get an empty array
+        try:
+            var = nc4f[path]
+        except IndexError:
+            return np.asarray([])
+        events = self.convertTime(var, var[:])
+
+        return events[~np.isnan(events)]
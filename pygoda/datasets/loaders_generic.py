@@ -1,28 +1,98 @@
 # coding: utf-8
 
+import bisect
+import collections
+import concurrent.futures
 import copy
 import functools
 import glob
+import hashlib
+import multiprocessing
 import os
 import pathlib
 import re
+import threading
 import time
 
 import numpy as np
 import scipy as sp
 
-#import netCDF4
 import h5py
 
+# Optional, only needed for netCDF (GenericNetCDF4) and Parquet/Feather
+# (GenericParquet) data sets
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset
+except ImportError:
+    pa = pc = None
+
 import constants as cst
 from tools import tools
 from tools import datetime_tools
 from tools import yaml2bool
+from . import station_registry
 from . import timeseries as ts
 
 
+class SchemaTemplate():
+
+    # Data schema shared by all the stations, to fill with their arrays.
+    #
+    # The descriptions (name, unit, path, factor...) are the same for every
+    # station, they are stored once here. newData() only allocates the
+    # containers of one station: each description is a ChainMap whose first
+    # map receives the station values ('data', 'std'...) and which falls back
+    # on the shared description (to be considered read-only) for the rest.
+    # The result is used like a deep copy of the schema (setAttributes...).
+
+    NESTED = ('t', 'corrections', 'events') # per-station parts of a component
+
+    def __init__(self, schema):
+
+        self.schema = schema
+
+        self.components = dict()
+        for comp_id, comp in schema['components'].items():
+            desc = {key: value for key, value in comp.items() if key not in self.NESTED}
+            self.components[comp_id] = (desc, comp.get('t', None),
+                                        comp.get('corrections', dict()),
+                                        comp.get('events', dict()))
+
+    def newData(self):
+
+        data = {'t': collections.ChainMap(dict(), self.schema['t']),
+                'components': dict(),
+                'corrections': self._newGroups(self.schema['corrections']),
+                'events': self._newGroups(self.schema['events'])}
+
+        for comp_id, (desc, t, corrections, events) in self.components.items():
+            comp = {'corrections': self._newGroups(corrections),
+                    'events': self._newGroups(events)}
+            if t is not None:
+                comp['t'] = collections.ChainMap(dict(), t)
+            data['components'][comp_id] = collections.ChainMap(comp, desc)
+
+        return data
+
+    def _newGroups(self, groups):
+
+        return {grp_name: {name: collections.ChainMap(dict(), desc)
+                           for name, desc in grp.items()}
+                for grp_name, grp in groups.items()}
+
+
 class GenericLoader():
 
+    # True if _loadData only reads the epochs in self.time_window, otherwise
+    # the data is cropped after loading (see setTimeWindow)
+    NATIVE_TIME_WINDOW = False
+
     def __init__(self, data_desc, file_type, data_type):
 
         self.desc = data_desc
@@ -43,6 +113,37 @@ class GenericLoader():
         self.TIME = self.desc['MAPPING']['TIME']
         # assert self.TIME in self.desc['VARIABLES'] # only if common to all
 
+        # Station -> index in self.stalist/self.path (see getPaths)
+        self.registry = None
+
+        # Shared part of the data dicts (see newDataDicts)
+        self.schema_template = None
+
+        # Number of processes used to load the data (see setLoadWorkers)
+        self.load_workers = 1
+
+        # Only the epochs tmin <= t < tmax are loaded (see setTimeWindow)
+        self.time_window = None
+
+        # Type of the data, std and correction arrays (see setDataPrecision)
+        self.data_dtype = np.float64
+
+        # Components read by _loadData, None for all (see setLazyComponents)
+        self.lazy_components = False
+        self.loaded_components = None
+
+        # Binary store of the parsed data (see setCache)
+        self.cache = None
+        self.fingerprints = dict()
+
+        # Arrays of each station copied out of the shared buffers (see setOwnData)
+        self.own_data = False
+
+        # Background loading (see setPrefetcher), the lock serialises the
+        # calls to the loader from the GUI and prefetching threads
+        self.prefetcher = None
+        self.lock = threading.RLock()
+
         # Float conversion for 'accuracy' parameter
         for field in (self.LONGITUDE, self.LATITUDE, self.ELEVATION):
             if not field:
@@ -289,6 +390,7 @@ class GenericLoader():
 
         self.data_schema = schema
         self.main_component = main_comp
+        self.schema_template = SchemaTemplate(schema)
 
         return self.data_schema, self.main_component
 
@@ -296,54 +398,78 @@ class GenericLoader():
 
         # Set self.stalist, self.timeseries_dict
         self.getStationList(data_path, stalist, nsta_max)
+        # Needed by getPaths from now on, including the metadata pass
+        self.registry = station_registry.StationRegistry(self.stalist)
         # Set self.data_schema, self.main_component
         self.getDataSchema()
+        if self.lazy_components:
+            self.loaded_components = {self.main_component}
+
+        # Bulk metadata pass, raw values only (no Scalar/Angle objects yet)
+        if self.cache is None:
+            self.sta_lon, self.sta_lat, self.sta_h = self.getMetadataBatch(self.stalist,
+                                                                           self.path)
+        else:
+            self.sta_lon, self.sta_lat, self.sta_h = self.getMetadataCached(self.stalist)
+        missing = np.isnan(self.sta_lon) | np.isnan(self.sta_lat)
+
+        attrs = self.desc['ATTRIBUTES']
+        position_desc = {'lon_desc': attrs[self.LONGITUDE],
+                         'lat_desc': attrs[self.LATITUDE],
+                         'elevation_desc': attrs[self.ELEVATION] if self.ELEVATION else None}
 
         missing_metadata = []
         for ista, sta in enumerate(self.stalist):
-            if isinstance(self.path, list):
-                # One path per station
-                path = self.path[ista]
-            else:
-                path = self.path
-
-            loc = self.getMetadata(sta, path)
-            if not loc:
+            if missing[ista]:
                 missing_metadata.append(sta)
                 continue
 
-            coordinates = ts.Coordinates((loc[0], loc[1]))
-            position = ts.GeographicPosition(coordinates, loc[2])
+            position = ts.LazyGeographicPosition(self.sta_lon[ista],
+                                                 self.sta_lat[ista],
+                                                 self.sta_h[ista],
+                                                 **position_desc)
 
             loader = functools.partial(self.loadStationData, sta)
+            component_loader = functools.partial(self.loadStationComponents, sta)
             self.timeseries_dict[sta] = ts.TimeSeries(sta,
                                                       position,
-                                                      loader=loader)
+                                                      loader=loader,
+                                                      component_loader=component_loader)
             self.timeseries_dict[sta].setMainComponent(self.main_component)
 
         print('Stations with missing metadata (ignored):')
         for sta in missing_metadata:
             print(sta)
-            ista = self.stalist.index(sta)
-            del self.stalist[ista]
-            del self.path[ista]
             del self.timeseries_dict[sta]
+        if missing_metadata:
+            keep = ~missing
+            self.stalist = [sta for sta, k in zip(self.stalist, keep) if k]
+            if isinstance(self.path, list):
+                self.path = [path for path, k in zip(self.path, keep) if k]
+            self.sta_lon = self.sta_lon[keep]
+            self.sta_lat = self.sta_lat[keep]
+            self.sta_h = self.sta_h[keep]
             self.nsta = len(self.stalist)
+            self.registry = station_registry.StationRegistry(self.stalist)
 
         return self.stalist
 
-    def loadData(self, stalist):
+    def getPaths(self, stalist):
 
+        # Data file(s) of a subset of the stations, same order as stalist
         if isinstance(self.path, list):
-            path = ['']*len(stalist)
-            for i, sta in enumerate(stalist):
-                ista = self.stalist.index(sta)
-                path[i] = self.path[ista]
+            path = [self.path[ista] for ista in self.registry.getIds(stalist)]
         else:
             path = self.path
 
+        return path
+
+    def loadData(self, stalist):
+
+        path = self.getPaths(stalist)
+
         startt = time.time()
-        data = self._loadData(stalist, path)
+        data = self._loadCached(stalist, path)
         endt = time.time()
 
         for sta in stalist:
@@ -357,7 +483,7 @@ class GenericLoader():
 
     def loadAllData(self):
 
-        data = self._loadData(self.stalist, self.path)
+        data = self._loadCached(self.stalist, self.path)
 
         for sta in self.stalist:
             self.timeseries_dict[sta].setAttributes(data[sta])
@@ -369,15 +495,308 @@ class GenericLoader():
 
     def loadStationData(self, staname):
 
-        ista = self.stalist.index(staname)
-        if isinstance(self.path, list):
-            path = self.path[ista]
-        else:
-            path = self.path
-        data = self._loadData([staname], path)
+        if self.prefetcher is not None:
+            data = self.prefetcher.take(staname)
+            if data is not None:
+                return data
+
+        with self.lock:
+            data = self._loadCached([staname], self.getPaths([staname]))
 
         return data[staname]
 
+    def loadBatchData(self, stalist):
+
+        # Data dicts of some stations, without updating the TimeSeries
+        # (may be called from another thread)
+        with self.lock:
+            return self._loadCached(stalist, self.getPaths(stalist))
+
+    def setLazyComponents(self, lazy_components):
+
+        # Only read the main component when loading the data, the other
+        # components are read when needed (see loadComponentsData)
+        self.lazy_components = lazy_components
+
+    def isComponentLoaded(self, name):
+
+        # To be checked by _loadData for each component
+        return self.loaded_components is None or name in self.loaded_components
+
+    def addLoadedComponents(self, names):
+
+        # Components read from now on when loading the data
+        if self.loaded_components is not None:
+            self.loaded_components |= set(names)
+
+    def loadComponentsData(self, stalist, names):
+
+        # Data dicts of some stations with these components only (the time
+        # vector and common corrections are read again)
+        with self.lock:
+            loaded_components = self.loaded_components
+            self.loaded_components = set(names)
+            try:
+                return self._loadWindowed(stalist, self.getPaths(stalist))
+            finally:
+                self.loaded_components = loaded_components
+
+    def loadStationComponents(self, staname, names):
+
+        return self.loadComponentsData([staname], names)[staname]
+
+    def setPrefetcher(self, prefetcher):
+
+        self.prefetcher = prefetcher
+
+    def watchFiles(self):
+
+        # Current version of the data files, compared by loadUpdates
+        # (already known if the cache is used)
+        if not self.fingerprints:
+            self.fingerprints = self.getFingerprints(self.stalist, self.path)
+
+    def loadUpdates(self):
+
+        # Data appended to the files since they were last read, only for the
+        # stations in memory: {station: data dict of the new epochs only}
+        fingerprints = self.getFingerprints(self.stalist, self.path)
+        changed = [sta for sta in self.stalist
+                   if fingerprints[sta] != self.fingerprints.get(sta)]
+        # Stations not in memory will be read from the files (not the cache)
+        self.fingerprints = fingerprints
+        changed = [sta for sta in changed if self.timeseries_dict[sta].isLoaded()]
+        if not changed:
+            return dict()
+
+        with self.lock:
+            return self.castData(self._loadUpdates(changed, self.getPaths(changed)))
+
+    def _loadUpdates(self, stalist, path):
+
+        # Defined in the loaders able to read only the appended data
+        return dict()
+
+    def setLoadWorkers(self, load_workers):
+
+        # Number of worker processes (1 == serial, -1 == all the cores)
+        if load_workers < 0:
+            load_workers = os.cpu_count() or 1
+        self.load_workers = max(1, int(load_workers))
+
+    def _runLoader(self, stalist, path):
+
+        # Serial by default, overridden when the data can be split per file
+        return self._loadData(stalist, path)
+
+    def setTimeWindow(self, time_window):
+
+        # (tmin, tmax) UNIX timestamps, None to load all the epochs
+        if time_window is not None:
+            time_window = tuple(float(t) for t in time_window)
+        self.time_window = time_window
+
+    def setDataPrecision(self, precision):
+
+        # 'double' (float64) or 'single' (float32) for the data, std and
+        # corrections, the time vectors are always kept in float64
+        if precision not in ('double', 'single'):
+            raise ValueError(f"Unknown data precision '{precision}'")
+        self.data_dtype = np.float32 if precision == 'single' else np.float64
+
+    def castData(self, data_dict):
+
+        # Convert the data, std and corrections to the data precision
+        if self.data_dtype == np.float64:
+            return data_dict
+
+        def cast(values):
+            if isinstance(values, np.ndarray) and values.dtype.kind == 'f':
+                return values.astype(self.data_dtype, copy=False)
+            return values
+
+        for data in data_dict.values():
+            for comp in data['components'].values():
+                for key in ('data', 'std'):
+                    if key in comp:
+                        comp[key] = cast(comp[key])
+                for grp_corr in comp.get('corrections', dict()).values():
+                    for corr in grp_corr.values():
+                        if 'data' in corr:
+                            corr['data'] = cast(corr['data'])
+            for grp_corr in data['corrections'].values():
+                for corr in grp_corr.values():
+                    if 'data' in corr:
+                        corr['data'] = cast(corr['data'])
+
+        return data_dict
+
+    def setOwnData(self, own_data):
+
+        # The batch readers and the cache return views into one buffer
+        # shared by all the stations: such a buffer is freed only when no
+        # station uses it anymore. With a memory budget, each station gets
+        # its own arrays so that unloading it actually frees its memory.
+        self.own_data = own_data
+
+    def ownData(self, data_dict):
+
+        # Copy the arrays which are views into another buffer
+        def own(values):
+            if isinstance(values, np.ndarray) and values.base is not None:
+                return np.array(values)
+            return values
+
+        def own_items(items):
+            for item in items:
+                if 'data' in item:
+                    item['data'] = own(item['data'])
+
+        for data in data_dict.values():
+            own_items([data.get('t', dict())])
+            for comp in data.get('components', dict()).values():
+                for key in ('data', 'std'):
+                    if key in comp:
+                        comp[key] = own(comp[key])
+                own_items([comp.get('t', dict())])
+                for group in ('corrections', 'events'):
+                    for grp in comp.get(group, dict()).values():
+                        own_items(grp.values())
+            for group in ('corrections', 'events'):
+                for grp in data.get(group, dict()).values():
+                    own_items(grp.values())
+
+        return data_dict
+
+    def cropTimeWindow(self, data_dict):
+
+        # Generic version of the time window: the epochs outside of it are
+        # dropped from the loaded data (events are kept)
+        tmin, tmax = self.time_window
+
+        def crop(values, keep):
+            values = np.asarray(values)
+            if values.ndim != 1 or len(values) != len(keep):
+                return values # e.g. scalar std
+            return values[keep]
+
+        for data in data_dict.values():
+            t = np.asarray(data['t'].get('data', []))
+            keep = (t >= tmin) & (t < tmax)
+            data['t']['data'] = t[keep]
+            for comp in data['components'].values():
+                comp_keep = keep
+                if 'data' in comp.get('t', dict()):
+                    comp_t = np.asarray(comp['t']['data'])
+                    comp_keep = (comp_t >= tmin) & (comp_t < tmax)
+                    comp['t']['data'] = comp_t[comp_keep]
+                for key in ('data', 'std'):
+                    if key in comp:
+                        comp[key] = crop(comp[key], comp_keep)
+                for grp_corr in comp.get('corrections', dict()).values():
+                    for corr in grp_corr.values():
+                        corr['data'] = crop(corr.get('data', []), comp_keep)
+            for grp_corr in data['corrections'].values():
+                for corr in grp_corr.values():
+                    corr['data'] = crop(corr.get('data', []), keep)
+
+        return data_dict
+
+    def setCache(self, cache):
+
+        # Store of the parsed data, opened for this data descriptor
+        # (and time window, the cache only holds the epochs loaded)
+        self.cache = cache
+        if self.cache is not None:
+            desc = self.desc
+            if self.time_window is not None:
+                desc = dict(desc, TIME_WINDOW=list(self.time_window))
+            if self.lazy_components:
+                desc = dict(desc, LAZY_COMPONENTS=True)
+            if self.data_dtype != np.float64:
+                desc = dict(desc, DATA_DTYPE=np.dtype(self.data_dtype).name)
+            self.cache.open(desc)
+
+    def getFingerprints(self, stalist, path):
+
+        # Version of the data file(s) of each station (path, size, mtime)
+        def fingerprint(filepath):
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                return '' # e.g. file being replaced
+            return f'{os.path.abspath(filepath)}:{stat.st_size:d}:{stat.st_mtime_ns:d}'
+
+        if isinstance(path, list):
+            return {sta: fingerprint(p) for sta, p in zip(stalist, path)}
+        else:
+            common = fingerprint(path)
+            return {sta: common for sta in stalist}
+
+    def getMetadataCached(self, stalist):
+
+        # Same as getMetadataBatch, only the stations which are not up to
+        # date in the cache are actually read
+        self.fingerprints = self.getFingerprints(stalist, self.path) # all the stations
+        metadata, stale = self.cache.getMetadata(stalist, self.fingerprints)
+        if stale:
+            stale_metadata = np.asarray(self.getMetadataBatch(stale, self.getPaths(stale)))
+            self.cache.putMetadata(stale, self.fingerprints, stale_metadata)
+            is_stale = np.isin(stalist, stale)
+            metadata[:, is_stale] = stale_metadata
+        print(f'Metadata of {len(stalist) - len(stale):d} stations read from the cache.')
+
+        return metadata[0], metadata[1], metadata[2]
+
+    def _loadWindowed(self, stalist, path):
+
+        data_dict = self._runLoader(stalist, path)
+        if self.time_window is not None and not self.NATIVE_TIME_WINDOW:
+            data_dict = self.cropTimeWindow(data_dict)
+
+        return self.castData(data_dict)
+
+    def _loadCached(self, stalist, path):
+
+        data_dict = self._loadStored(stalist, path)
+        if self.own_data:
+            data_dict = self.ownData(data_dict)
+
+        return data_dict
+
+    def _loadStored(self, stalist, path):
+
+        if self.cache is None:
+            return self._loadWindowed(stalist, path)
+
+        # Stations up to date in the cache are memory-mapped, the others
+        # are loaded from the data files and added to the cache
+        data_dict = self.cache.getData(stalist, self.fingerprints)
+        missing = [sta for sta in stalist if sta not in data_dict]
+        if missing:
+            missing_data = self._loadWindowed(missing, self.getPaths(missing))
+            self.cache.putData(missing_data, self.fingerprints)
+            data_dict.update(missing_data)
+        print(f'{len(stalist) - len(missing):d} time series read from the cache.')
+
+        return {sta: data_dict[sta] for sta in stalist}
+
+    def __getstate__(self):
+
+        # Sent to the worker processes: the time series are not needed
+        # (and may hold a lot of data), only the description and schema
+        state = self.__dict__.copy()
+        state['timeseries_dict'] = dict()
+        state['cache'] = None
+        state['prefetcher'] = None
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
     def getStationList(self, data_path, stalist, nsta_max):
 
         # Defined in generic subclasses
@@ -388,17 +807,80 @@ class GenericLoader():
         # Defined in generic subclasses
         return list()
 
+    def getMetadataValues(self, sta, path):
+
+        # Raw longitude, latitude and elevation (floats), empty if missing
+        # May be overridden in generic subclasses to avoid Scalar objects
+        return [float(value) for value in self.getMetadata(sta, path)]
+
+    def getMetadataBatch(self, stalist, path):
+
+        # Longitude, latitude and elevation arrays for all the stations,
+        # NaN if missing. Generic version: one call per station, to be
+        # overridden when the file format allows a real bulk read.
+        metadata = np.full((3, len(stalist)), np.nan)
+        for ista, sta in enumerate(stalist):
+            sta_path = path[ista] if isinstance(path, list) else path
+            values = self.getMetadataValues(sta, sta_path)
+            if values:
+                metadata[:, ista] = values
+
+        return metadata[0], metadata[1], metadata[2]
+
+    def newDataDicts(self, stalist):
+
+        # Empty data dict of each station, to be filled by _loadData
+        # (same content as a deep copy of the data schema)
+        if self.schema_template is None or \
+           self.schema_template.schema is not self.data_schema:
+            self.schema_template = SchemaTemplate(self.data_schema)
+
+        return {sta: self.schema_template.newData() for sta in stalist}
+
     def _loadData(self, infile, stalist):
 
         # Only method which is written by the USER
         return dict()
 
 
+def _loadDataWorker(loader, stalist, path):
+
+    # Module-level function so that it can be sent to a worker process
+    return loader._loadData(stalist, path)
+
+
 class GenericMultiLoader(GenericLoader):
 
+    # Minimum number of stations (files) sent to a worker at once
+    MIN_CHUNK_SIZE = 16
+
     def __init__(self, data_desc, file_type, data_type):
         super().__init__(data_desc, file_type, data_type)
 
+    def _runLoader(self, stalist, path):
+
+        # One file per station: fan the files out to a pool of processes
+        nchunks = min(4*self.load_workers, len(stalist)//self.MIN_CHUNK_SIZE)
+        if self.load_workers <= 1 or nchunks <= 1:
+            return self._loadData(stalist, path)
+
+        bounds = np.linspace(0, len(stalist), nchunks + 1).astype(int)
+        chunks = [(stalist[i:j], path[i:j]) for i, j in zip(bounds[:-1], bounds[1:])]
+
+        print(f'Loading {len(stalist):d} files with {self.load_workers:d} processes...')
+        data_dict = dict()
+        # Workers started from scratch ('spawn'): forking the GUI process is
+        # unsafe. The loader is sent without its data (see __getstate__)
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(self.load_workers,
+                                                    mp_context=context) as pool:
+            futures = [pool.submit(_loadDataWorker, self, *chunk) for chunk in chunks]
+            for future in futures:
+                data_dict.update(future.result())
+
+        # Same order as stalist, whatever the order of completion
+        return {sta: data_dict[sta] for sta in stalist}
+
     def getStationList(self, data_path, stalist=[], nsta_max=0):
 
         self.path = data_path
@@ -504,6 +986,27 @@ class GenericTextLoader(GenericLoader):
 
     def getMetadata(self, sta, path):
 
+        values = self.getMetadataValues(sta, path)
+        if not values:
+            return list()
+
+        loc = [0.0, 0.0, 0.0]
+        i = 0
+        for field in (self.LONGITUDE, self.LATITUDE, self.ELEVATION):
+            if not field:
+                continue
+            field_desc = self.desc['ATTRIBUTES'][field]
+            if field == self.ELEVATION:
+                ScalarType = ts.Scalar
+            else:
+                ScalarType = ts.Angle
+            loc[i] = ScalarType(values[i], signed=True, **field_desc)
+            i += 1
+
+        return loc
+
+    def getMetadataValues(self, sta, path):
+
         header = self.extractHeader(path,
                                     split_fields=True,
                                     split_char=self.header_sep)
@@ -538,11 +1041,7 @@ class GenericTextLoader(GenericLoader):
                     # DMS, must be converted to angle
                     value = tools.to_angle(values[field_index])
 
-            if field == self.ELEVATION:
-                ScalarType = ts.Scalar
-            else:
-                ScalarType = ts.Angle
-            loc[i] = ScalarType(value, signed=True, **field_desc)
+            loc[i] = float(value)
             i += 1
 
         return loc
@@ -649,6 +1148,79 @@ class GenericHDF5(GenericLoader):
 
         return self.stalist, self.timeseries_dict
 
+    def searchTimeWindow(self, h5_groups, path, tmin, tmax):
+
+        # Range [start, stop) of the epochs tmin <= t < tmax of each station,
+        # in the units of the time dataset (sorted in ascending order).
+        # Bisection on the dataset itself: only a few values are read.
+        nsta = len(h5_groups)
+        starts = np.zeros(nsta, dtype=np.int64)
+        stops = np.zeros(nsta, dtype=np.int64)
+        for i, h5_grp in enumerate(h5_groups):
+            if path not in h5_grp or not h5_grp[path].shape:
+                stops[i] = np.iinfo(np.int64).max # read as usual
+                continue
+            dset = h5_grp[path]
+            starts[i] = bisect.bisect_left(dset, tmin)
+            stops[i] = bisect.bisect_left(dset, tmax, lo=starts[i])
+
+        return starts, stops
+
+    def readDatasetBatch(self, h5_groups, path, required=True, dtype=np.float64,
+                         starts=None, stops=None):
+
+        # Read the same dataset for many stations from an already opened file.
+        # All the data end up in one pre-sized buffer, station i being stored
+        # in buffer[offsets[i]:offsets[i+1]] (CSR-like layout).
+        # Missing datasets are only allowed if not required (e.g. events),
+        # they result in an empty slice.
+        # If given, only the values from starts[i] to stops[i] (excluded)
+        # are read for station i.
+
+        nsta = len(h5_groups)
+        if starts is None:
+            starts = np.zeros(nsta, dtype=np.int64)
+        if stops is None:
+            stops = np.full(nsta, np.iinfo(np.int64).max)
+        dsets = [None]*nsta
+        offsets = np.zeros(nsta + 1, dtype=np.int64)
+        for i, h5_grp in enumerate(h5_groups):
+            if path in h5_grp:
+                dsets[i] = h5_grp[path]
+                size = dsets[i].shape[0] if dsets[i].shape else 1
+                offsets[i + 1] = max(min(size, stops[i]) - starts[i], 0)
+            elif required:
+                raise KeyError(f"{h5_grp.name}: no dataset '{path}' in HDF5 file")
+        np.cumsum(offsets, out=offsets)
+
+        buffer = np.empty(offsets[-1], dtype=dtype)
+        for i, dset in enumerate(dsets):
+            if dset is None or offsets[i] == offsets[i + 1]:
+                continue
+            if dset.shape:
+                # Direct read, no intermediate array
+                dset.read_direct(buffer,
+                                 source_sel=np.s_[starts[i]:starts[i] + offsets[i + 1] - offsets[i]],
+                                 dest_sel=np.s_[offsets[i]:offsets[i + 1]])
+            else:
+                buffer[offsets[i]] = dset[()]
+
+        return buffer, offsets
+
+    def getMetadataBatch(self, stalist, path):
+
+        # Read the attributes of all the stations with a single file handle
+        metadata = np.zeros((3, len(stalist)))
+        fields = (self.LONGITUDE, self.LATITUDE, self.ELEVATION)
+        with h5py.File(path, 'r') as h5f:
+            for ista, sta in enumerate(stalist):
+                attrs = h5f[sta].attrs
+                for i, field in enumerate(fields):
+                    if field:
+                        metadata[i, ista] = attrs.get(field, np.nan)
+
+        return metadata[0], metadata[1], metadata[2]
+
     def getMetadata(self, sta, path):
 
         loc = [0.0, 0.0, 0.0]
@@ -670,27 +1242,618 @@ class GenericHDF5(GenericLoader):
         return loc
 
 
+
+
 class GenericNetCDF4(GenericLoader):
 
-    def __init__(self, data_desc):
-        super().__init__(data_desc, 'BINARY', 'NETCDF4')
+    # Single NetCDF4 file with a station (instance) dimension, following the
+    # CF conventions for discrete sampling geometries (featureType: timeSeries).
+    # The stations are named by the variable with cf_role = timeseries_id
+    # (or MAPPING.STATION), their metadata are variables along the station
+    # dimension and the data variables use one of these layouts:
+    #  - 'orthogonal': data(station, time) with a common time(time)
+    #  - 'incomplete': data(station, obs) and time(station, obs), padded
+    #    with missing values
+    #  - 'contiguous': data(obs) and time(obs), the observations of each
+    #    station being consecutive (ragged array, the sizes are given by the
+    #    variable whose sample_dimension attribute is obs)
+    #
+    # Each variable is read for many stations at once, by hyperslabs of
+    # consecutive stations aligned on the chunks of the variable (see
+    # readStationSlabs and readRaggedBatch).
+
+    MAX_BLOCK_SIZE = 1 << 24 # maximum number of values per hyperslab
+    BLOCK_ROWS = 64 # stations per block if the variable is not chunked
+
+    def __init__(self, data_desc, file_type='BINARY', data_type='NETCDF4'):
+        if netCDF4 is None:
+            raise ImportError('netCDF4 is required to read netCDF data sets')
+        super().__init__(data_desc, file_type, data_type)
+
+        # Station variable, found by its cf_role attribute if not given
+        self.STATION = self.desc['MAPPING'].get('STATION', None)
+
+        # Station -> index along the station dimension of the file
+        # (None with one file per station, see AnrijsNetCDF4)
+        self.station_index = None
+        self.instance_dim = ''
+
+    def getStationList(self, data_path, stalist=[], nsta_max=0):
+
+        self.path = data_path
+        self.nsta_max = nsta_max
+
+        with netCDF4.Dataset(self.path, 'r') as ncf:
+            station_var = self.getStationVariable(ncf)
+            self.instance_dim = station_var.dimensions[0]
+            names = self.readStationNames(station_var)
+        self.station_index = {sta: ista for ista, sta in enumerate(names)}
+
+        # Load basic information for all the stations that we want
+        if not stalist:
+            stalist = names
+        else:
+            unknown = [sta for sta in stalist if sta not in self.station_index]
+            if unknown:
+                print('Stations not found in the data file (ignored):')
+                for sta in unknown:
+                    print(sta)
+                stalist = [sta for sta in stalist if sta in self.station_index]
+        self.stalist = stalist
+
+        # Limit the list if required before loading everything
+        if nsta_max:
+            self.stalist = self.stalist[:min(nsta_max, len(self.stalist))]
+        self.nsta = len(self.stalist)
+
+        self.timeseries_dict = {sta: None for sta in self.stalist}
+
+        return self.stalist, self.timeseries_dict
+
+    def getStationVariable(self, ncf):
+
+        if self.STATION:
+            return ncf[self.STATION]
+
+        station_vars = ncf.get_variables_by_attributes(cf_role='timeseries_id')
+        if not station_vars:
+            raise ValueError(f'{self.path}: no station variable ' \
+                             '(cf_role = timeseries_id) in NetCDF4 file')
+
+        return station_vars[0]
+
+    def readStationNames(self, station_var):
+
+        # Names of all the stations, in the order of the station dimension
+        names = np.ma.getdata(station_var[:])
+        if names.dtype.kind == 'S' and names.ndim == 2:
+            names = netCDF4.chartostring(names) # char(station, strlen)
+
+        return [(name.decode('utf8') if isinstance(name, bytes) else str(name)).strip()
+                for name in names]
+
+    def getLayout(self, ncf, time_var):
+
+        # Layout of the data variables (see above) and name of the variable
+        # giving the number of observations per station if ragged
+        if ncf.get_variables_by_attributes(instance_dimension=lambda v: v is not None):
+            raise ValueError(f'{self.path}: indexed ragged arrays are not supported')
+
+        row_sizes = ncf.get_variables_by_attributes(sample_dimension=lambda v: v is not None)
+        if row_sizes and time_var.dimensions == (row_sizes[0].sample_dimension, ):
+            return 'contiguous', row_sizes[0].name
+        if time_var.ndim == 1:
+            return 'orthogonal', ''
+        if time_var.ndim == 2 and self.instance_dim in time_var.dimensions:
+            return 'incomplete', ''
+
+        raise ValueError(f'{self.path}: unknown layout of variable {time_var.name}')
+
+    def convertTime(self, var, values):
+
+        # Time values (or events) of a variable to UNIX timestamps,
+        # missing values are NaN
+        values = np.ma.filled(np.ma.asarray(values, dtype=np.float64), np.nan)
+        units = getattr(var, 'units', '')
+        if 'since' in units:
+            calendar = getattr(var, 'calendar', 'standard')
+            return datetime_tools.cftime2timestamp(values, units, calendar)
+        if self.desc['VARIABLES'].get(self.TIME, dict()).get('unit', '') == 'yr':
+            return datetime_tools.decyr2timestamp(values, precise=False)
+
+        return values
+
+    def selectEpochs(self, ncf, stalist):
+
+        # Time vector of the stations (CSR-like layout of readVariableBatch)
+        # and epochs to read for each of them, only those in the time window.
+        # The time vectors are assumed sorted.
+        time_var = ncf[self.data_schema['t']['path']]
+        layout, row_size = self.getLayout(ncf, time_var)
+        indices = np.fromiter((self.station_index[sta] for sta in stalist),
+                              dtype=np.int64, count=len(stalist))
+        nsta = len(stalist)
+        selection = {'layout': layout, 'indices': indices}
+
+        if layout == 'orthogonal':
+            # Common time vector: same columns for all the stations
+            t = self.convertTime(time_var, time_var[:])
+            columns = slice(0, len(t))
+            if self.time_window is not None:
+                columns = slice(*np.searchsorted(t, self.time_window))
+            t = t[columns]
+            offsets = np.arange(nsta + 1, dtype=np.int64)*len(t)
+            selection['columns'] = columns
+            t = np.tile(t, nsta)
+
+        elif layout == 'incomplete':
+            # Epochs of each station: the columns with a time value
+            columns = [None]*nsta
+            t_rows = [None]*nsta
+            for block, rows in self.readStationSlabs(time_var, indices, slice(None)):
+                rows = self.convertTime(time_var, rows)
+                for i, row in zip(block, rows):
+                    keep = ~np.isnan(row)
+                    if self.time_window is not None:
+                        keep &= (row >= self.time_window[0]) & (row < self.time_window[1])
+                    columns[i] = np.flatnonzero(keep)
+                    t_rows[i] = row[columns[i]]
+            offsets = np.zeros(nsta + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(row) for row in t_rows])
+            selection['columns'] = columns
+            t = np.concatenate(t_rows) if nsta else np.empty(0)
+
+        else:
+            # Contiguous observations of each station
+            counts = np.ma.filled(ncf[row_size][:], 0).astype(np.int64)
+            first = np.zeros(len(counts), dtype=np.int64)
+            first[1:] = np.cumsum(counts)[:-1]
+            starts = first[indices]
+            stops = starts + counts[indices]
+            t, offsets = self.readRaggedBatch(time_var, starts, stops)
+            t = self.convertTime(time_var, t)
+            if self.time_window is not None:
+                # Epochs in the window: a range of each station observations
+                bounds = np.zeros((nsta, 2), dtype=np.int64)
+                for i in range(nsta):
+                    bounds[i] = np.searchsorted(t[offsets[i]:offsets[i + 1]], self.time_window)
+                t = [t[offsets[i] + lo:offsets[i] + hi] for i, (lo, hi) in enumerate(bounds)]
+                t = np.concatenate(t) if nsta else np.empty(0)
+                starts, stops = starts + bounds[:, 0], starts + bounds[:, 1]
+                offsets = np.zeros(nsta + 1, dtype=np.int64)
+                np.cumsum(stops - starts, out=offsets[1:])
+            selection['starts'] = starts
+            selection['stops'] = stops
+
+        selection['offsets'] = offsets
+
+        return t, offsets, selection
+
+    def readStationSlabs(self, var, indices, columns):
+
+        # Read the rows of a (station, epoch) variable for the stations at
+        # these indices along the station dimension. The stations are sorted
+        # and read by hyperslabs of consecutive stations, a new hyperslab is
+        # only started after a chunk without any station requested (or if
+        # the hyperslab gets too large): each chunk is read only once.
+        # Yield the positions of the stations in indices and their rows
+        # (missing values are NaN).
+        station_axis = var.dimensions.index(self.instance_dim)
+        chunking = var.chunking()
+        chunk_rows = chunking[station_axis] if isinstance(chunking, list) else self.BLOCK_ROWS
+        ncols = len(range(*columns.indices(var.shape[1 - station_axis])))
+        max_rows = max(chunk_rows, self.MAX_BLOCK_SIZE // max(ncols, 1))
+
+        order = np.argsort(indices, kind='stable')
+        sorted_indices = indices[order]
+        chunk_ids = sorted_indices // chunk_rows
+        bounds = [0]
+        for k in range(1, len(order)):
+            if chunk_ids[k] - chunk_ids[k - 1] > 1 or \
+               sorted_indices[k] - sorted_indices[bounds[-1]] >= max_rows:
+                bounds.append(k)
+        bounds.append(len(order))
+
+        for k0, k1 in zip(bounds[:-1], bounds[1:]):
+            if k0 == k1:
+                continue
+            first, last = sorted_indices[k0], sorted_indices[k1 - 1]
+            if station_axis == 0:
+                slab = var[first:last + 1, columns]
+            else:
+                slab = var[columns, first:last + 1].T
+            slab = np.ma.filled(np.ma.asarray(slab, dtype=np.float64), np.nan)
+            yield order[k0:k1], slab[sorted_indices[k0:k1] - first]
+
+    def readRaggedBatch(self, var, starts, stops):
+
+        # Read the observations starts[i] to stops[i] (excluded) of each
+        # station from a ragged array variable (CSR-like layout of
+        # readVariableBatch). Close ranges (less than a chunk apart) are
+        # merged and read as a single hyperslab.
+        nsta = len(starts)
+        offsets = np.zeros(nsta + 1, dtype=np.int64)
+        np.cumsum(stops - starts, out=offsets[1:])
+        buffer = np.empty(offsets[-1])
+
+        chunking = var.chunking()
+        max_gap = chunking[0] if isinstance(chunking, list) else self.BLOCK_ROWS
+
+        order = np.argsort(starts, kind='stable')
+        k = 0
+        while k < nsta:
+            group = [order[k]]
+            first, last = starts[order[k]], stops[order[k]]
+            k += 1
+            while k < nsta and starts[order[k]] - last <= max_gap and \
+                  max(last, stops[order[k]]) - first <= self.MAX_BLOCK_SIZE:
+                group.append(order[k])
+                last = max(last, stops[order[k]])
+                k += 1
+            if last <= first:
+                continue
+            values = np.ma.filled(np.ma.asarray(var[first:last], dtype=np.float64), np.nan)
+            for i in group:
+                buffer[offsets[i]:offsets[i + 1]] = values[starts[i] - first:stops[i] - first]
+
+        return buffer, offsets
+
+    def getVariable(self, ncf, name):
+
+        try:
+            return ncf[name]
+        except IndexError:
+            raise KeyError(f"{self.path}: no variable '{name}' in NetCDF4 file")
+
+    def readVariableBatch(self, ncf, name, selection):
+
+        # Read the same variable for many stations at once, only the epochs
+        # of the selection (see selectEpochs). All the data end up in one
+        # buffer, station i being stored in buffer[offsets[i]:offsets[i+1]]
+        # (as in GenericHDF5.readDatasetBatch), missing values are NaN.
+        var = self.getVariable(ncf, name)
+        layout = selection['layout']
+        offsets = selection['offsets']
+        if layout == 'contiguous':
+            return self.readRaggedBatch(var, selection['starts'], selection['stops'])
+
+        buffer = np.empty(offsets[-1])
+        indices = selection['indices']
+        if layout == 'orthogonal':
+            for block, rows in self.readStationSlabs(var, indices, selection['columns']):
+                for i, row in zip(block, rows):
+                    buffer[offsets[i]:offsets[i + 1]] = row
+        else:
+            # Only the range of columns with epochs to read
+            columns = selection['columns']
+            cmin = min((c[0] for c in columns if len(c)), default=0)
+            cmax = max((c[-1] + 1 for c in columns if len(c)), default=0)
+            for block, rows in self.readStationSlabs(var, indices, slice(cmin, cmax)):
+                for i, row in zip(block, rows):
+                    buffer[offsets[i]:offsets[i + 1]] = row[columns[i] - cmin]
+
+        return buffer, offsets
+
+    def readEventsBatch(self, ncf, name, indices):
+
+        # Events of the stations from a (station, event) variable padded
+        # with missing values, stations with no events (or no variable) get
+        # an empty slice (CSR-like layout of readVariableBatch)
+        nsta = len(indices)
+        events = [np.empty(0)]*nsta
+        try:
+            var = ncf[name]
+        except IndexError:
+            var = None
+        if var is not None:
+            for block, rows in self.readStationSlabs(var, indices, slice(None)):
+                rows = self.convertTime(var, rows)
+                for i, row in zip(block, rows):
+                    events[i] = row[~np.isnan(row)]
+
+        offsets = np.zeros(nsta + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e) for e in events])
+
+        return (np.concatenate(events) if nsta else np.empty(0)), offsets
+
+    def readVariable(self, ncf, name):
+
+        # Whole variable (e.g. one file per station), missing values are NaN
+        var = self.getVariable(ncf, name)
+
+        return np.ma.filled(np.ma.asarray(var[:], dtype=np.float64), np.nan)
+
+    def getMetadataBatch(self, stalist, path):
+
+        if self.station_index is None:
+            # One file per station
+            return super().getMetadataBatch(stalist, path)
+
+        # Variables along the station dimension, each read in one go
+        metadata = np.zeros((3, len(stalist)))
+        indices = [self.station_index[sta] for sta in stalist]
+        fields = (self.LONGITUDE, self.LATITUDE, self.ELEVATION)
+        with netCDF4.Dataset(path, 'r') as ncf:
+            for i, field in enumerate(fields):
+                if not field:
+                    continue
+                if field in ncf.variables:
+                    values = self.readVariable(ncf, field)
+                    metadata[i] = values[indices]
+                else:
+                    metadata[i] = np.nan
+
+        return metadata[0], metadata[1], metadata[2]
+
+    def getMetadataValues(self, sta, path):
+
+        # Variables along the station dimension, or global attributes of the
+        # file of the station if there is one file per station
+        values = [0.0, 0.0, 0.0]
+        with netCDF4.Dataset(path, 'r') as ncf:
+            for i, field in enumerate((self.LONGITUDE, self.LATITUDE, self.ELEVATION)):
+                if not field:
+                    continue
+                try:
+                    if self.station_index is not None:
+                        value = ncf[field][self.station_index[sta]]
+                    else:
+                        value = ncf.getncattr(field)
+                except (AttributeError, IndexError):
+                    return list() # missing metadata
+                values[i] = float(np.ma.filled(np.ma.asarray(value, dtype=np.float64), np.nan))
+
+        return values
 
     def getMetadata(self, sta, path):
 
+        values = self.getMetadataValues(sta, path)
+        if not values:
+            return list()
+
         loc = [0.0, 0.0, 0.0]
         i = 0
-        with netCDF4.Dataset(path, "r", format="NETCDF4") as nc4f:
-            for field in (self.LONGITUDE, self.LATITUDE, self.ELEVATION):
-                if not field:
-                    continue
-                field_desc = self.desc['ATTRIBUTES'][field]
-                if field == self.ELEVATION:
-                    ScalarType = ts.Scalar
+        for field, value in zip((self.LONGITUDE, self.LATITUDE, self.ELEVATION), values):
+            if not field:
+                continue
+            field_desc = self.desc['ATTRIBUTES'][field]
+            if field == self.ELEVATION:
+                ScalarType = ts.Scalar
+            else:
+                ScalarType = ts.Angle
+            loc[i] = ScalarType(value,
+                                signed=True,
+                                **field_desc)
+            i += 1
+
+        return loc
+
+
+class GenericParquet(GenericLoader):
+
+    # Long-format table in Parquet (or Feather) file(s): one row per station
+    # and epoch, with a station column (MAPPING.STATION, 'station' by
+    # default), the time column and one column per component, std and
+    # correction. The metadata columns (longitude...) are read from the
+    # first row of each station. The path is either a single file or a
+    # directory of files (partitioned dataset, e.g. station=XXX/ folders).
+    #
+    # Only the columns needed are read, and the rows are filtered on the
+    # station and time window by the reader itself (predicate pushdown):
+    # the files and row groups without any station or epoch requested are
+    # skipped, using the partitions and the statistics of each row group.
+
+    FORMATS = {'PARQUET': 'parquet', 'FEATHER': 'feather'}
+    TIME_UNITS = {'s': 1, 'ms': 10**3, 'us': 10**6, 'ns': 10**9} # per second
+
+    def __init__(self, data_desc):
+        data_type = data_desc['DATA_TYPE'].upper()
+        assert data_type in self.FORMATS
+        if pa is None:
+            raise ImportError('pyarrow is required to read Parquet and Feather data sets')
+        super().__init__(data_desc, 'BINARY', data_type)
+
+        self.format = self.FORMATS[data_type]
+        self.STATION = self.desc['MAPPING'].get('STATION', 'station')
+
+        # Values of the station column, station -> index in these values
+        # and metadata of each station (same order, see getStationList)
+        self.station_values = None
+        self.station_index = None
+        self.station_metadata = None
+
+    def openDataset(self, path):
+
+        return pyarrow.dataset.dataset(path, format=self.format, partitioning='hive')
+
+    def getStationList(self, data_path, stalist=[], nsta_max=0):
+
+        self.path = data_path
+        self.nsta_max = nsta_max
+
+        # Single pass over the station and metadata columns
+        dataset = self.openDataset(self.path)
+        fields = (self.LONGITUDE, self.LATITUDE, self.ELEVATION)
+        columns = [field for field in fields if field in dataset.schema.names]
+        table = dataset.to_table(columns=[self.STATION] + columns)
+
+        stations = self.getStationColumn(table)
+        self.station_values = pc.unique(stations) # in order of appearance
+        codes = pc.index_in(stations, value_set=self.station_values).to_numpy()
+        _, first_rows = np.unique(codes, return_index=True)
+
+        self.station_metadata = np.zeros((3, len(self.station_values)))
+        for i, field in enumerate(fields):
+            if not field:
+                continue
+            if field in columns:
+                values = table[field].take(pa.array(first_rows))
+                self.station_metadata[i] = self.toNumpy(values)
+            else:
+                self.station_metadata[i] = np.nan
+
+        names = [str(value) for value in self.station_values.to_pylist()]
+        self.station_index = {sta: ista for ista, sta in enumerate(names)}
+
+        # Load basic information for all the stations that we want
+        if not stalist:
+            stalist = names
+        else:
+            unknown = [sta for sta in stalist if sta not in self.station_index]
+            if unknown:
+                print('Stations not found in the data file (ignored):')
+                for sta in unknown:
+                    print(sta)
+                stalist = [sta for sta in stalist if sta in self.station_index]
+        self.stalist = stalist
+
+        # Limit the list if required before loading everything
+        if nsta_max:
+            self.stalist = self.stalist[:min(nsta_max, len(self.stalist))]
+        self.nsta = len(self.stalist)
+
+        self.timeseries_dict = {sta: None for sta in self.stalist}
+
+        return self.stalist, self.timeseries_dict
+
+    def getStationColumn(self, table):
+
+        stations = table[self.STATION].combine_chunks()
+        if pa.types.is_dictionary(stations.type):
+            stations = stations.dictionary_decode()
+
+        return stations
+
+    def toNumpy(self, column):
+
+        # Float64 values of a column, missing values (nulls) are NaN
+        column = pc.cast(column, pa.float64())
+        if isinstance(column, pa.ChunkedArray):
+            column = column.combine_chunks()
+
+        return column.to_numpy(zero_copy_only=False)
+
+    def convertTime(self, column):
+
+        # Time column (timestamps, dates or numbers) to UNIX timestamps,
+        # dates are at noon as in the text files
+        if pa.types.is_timestamp(column.type):
+            per_second = self.TIME_UNITS[column.type.unit]
+            return self.toNumpy(pc.cast(column, pa.int64()))/per_second
+        if pa.types.is_date(column.type):
+            days = pc.cast(pc.cast(column, pa.date32()), pa.int32())
+            return self.toNumpy(days)*datetime_tools.ONE_DAY + datetime_tools.ONE_DAY//2
+        if self.desc['VARIABLES'].get(self.TIME, dict()).get('unit', '') == 'yr':
+            return datetime_tools.decyr2timestamp(self.toNumpy(column), precise=False)
+
+        return self.toNumpy(column)
+
+    def timeFilter(self, time_field, time_type):
+
+        # Condition on the time column for the time window, in the type of
+        # the column. The bounds are rounded outwards, the exact window is
+        # applied after the conversion to UNIX timestamps.
+        condition = None
+        for t, side in zip(self.time_window, (-1, 1)):
+            if not np.isfinite(t):
+                continue
+            if pa.types.is_timestamp(time_type):
+                value = self.TIME_UNITS[time_type.unit]*t
+                bound = pa.scalar(int(np.floor(value) if side < 0 else np.ceil(value)),
+                                  type=pa.int64()).cast(time_type)
+            elif pa.types.is_date(time_type):
+                days = t/datetime_tools.ONE_DAY
+                bound = pa.scalar(int(np.floor(days) if side < 0 else np.ceil(days)),
+                                  type=pa.int32()).cast(pa.date32()).cast(time_type)
+            else:
+                if self.desc['VARIABLES'].get(self.TIME, dict()).get('unit', '') == 'yr':
+                    value = datetime_tools.timestamp2decyr(t) + side*0.01 # a few days
                 else:
-                    ScalarType = ts.Angle
-                loc[i] = ScalarType(nc4f.attrs[field],
-                                  signed=True,
-                                  **field_desc)
-                i += 1
+                    value = t
+                value = np.floor(value) if side < 0 else np.ceil(value)
+                bound = pa.scalar(value).cast(time_type)
+            term = pc.field(time_field) >= bound if side < 0 else pc.field(time_field) <= bound
+            condition = term if condition is None else condition & term
+
+        return condition
+
+    def readTable(self, path, stalist, columns):
+
+        # Read some columns for many stations at once, only the rows of
+        # these stations in the time window. The rows are sorted by station
+        # (in the order of stalist) then time and each column ends up in
+        # one array, station i being stored in column[offsets[i]:offsets[i+1]]
+        # (as in GenericHDF5.readDatasetBatch), missing values are NaN.
+        # Return the time vector (UNIX timestamps), the columns and offsets.
+        dataset = self.openDataset(path)
+        time_field = self.data_schema['t']['path']
+        indices = pa.array([self.station_index[sta] for sta in stalist], type=pa.int64())
+        values = self.station_values.take(indices)
+
+        condition = pc.field(self.STATION).isin(values)
+        if self.time_window is not None:
+            time_condition = self.timeFilter(time_field, dataset.schema.field(time_field).type)
+            if time_condition is not None:
+                condition &= time_condition
+
+        names = list(dict.fromkeys([self.STATION, time_field] + columns))
+        table = dataset.to_table(columns=names, filter=condition)
+
+        positions = pc.index_in(self.getStationColumn(table), value_set=values).to_numpy()
+        t = self.convertTime(table[time_field])
+        rows = np.lexsort((t, positions))
+        if self.time_window is not None:
+            tmin, tmax = self.time_window
+            rows = rows[(t[rows] >= tmin) & (t[rows] < tmax)]
+
+        offsets = np.zeros(len(stalist) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(positions[rows], minlength=len(stalist)), out=offsets[1:])
+        data = {name: self.toNumpy(table[name])[rows] for name in columns}
+
+        return t[rows], data, offsets
+
+    def getMetadataBatch(self, stalist, path):
+
+        # Already read with the list of stations
+        indices = [self.station_index[sta] for sta in stalist]
+        metadata = self.station_metadata[:, indices]
+
+        return metadata[0], metadata[1], metadata[2]
+
+    def getMetadata(self, sta, path):
+
+        loc = [0.0, 0.0, 0.0]
+        i = 0
+        values = self.station_metadata[:, self.station_index[sta]]
+        for field, value in zip((self.LONGITUDE, self.LATITUDE, self.ELEVATION), values):
+            if not field:
+                continue
+            field_desc = self.desc['ATTRIBUTES'][field]
+            if field == self.ELEVATION:
+                ScalarType = ts.Scalar
+            else:
+                ScalarType = ts.Angle
+            loc[i] = ScalarType(value,
+                                signed=True,
+                                **field_desc)
+            i += 1
 
         return loc
+
+    def getFingerprints(self, stalist, path):
+
+        if not os.path.isdir(path):
+            return super().getFingerprints(stalist, path)
+
+        # Partitioned dataset: any file changed changes all the stations
+        # (the partitions of the stations are not known)
+        stats = []
+        for filepath in sorted(self.openDataset(path).files):
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                continue # e.g. file being replaced
+            stats.append(f'{filepath}:{stat.st_size:d}:{stat.st_mtime_ns:d}')
+        common = hashlib.sha1('\n'.join(stats).encode('utf8')).hexdigest()
+
+        return {sta: common for sta in stalist}
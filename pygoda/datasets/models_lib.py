@@ -34,17 +34,20 @@ class GenericModel():
         self.stalist = dataset.getStationsList()
         self.data = None
 
-        self.metaparams_list += ['RMS', 'WRMS']
+        # Not += on the class attribute: a new list for each model object
+        self.metaparams_list = self.metaparams_list + ['RMS', 'WRMS']
 
         self.model_infos = load_models_desc()['MODELS'][self.name]
 
-    def getData(self):
-        # Input
+    def getData(self, stalist=None):
+        # Input, of all the stations by default (see prepareData)
+        if stalist is None:
+            stalist = self.stalist
         self.data = self.dataset
-        self.t = {sta: self.data[sta].t for sta in self.stalist}
-        self.y = {sta: self.data[sta].data for sta in self.stalist}
-        self.sig = {sta: self.data[sta].data.std for sta in self.stalist}
-        self.N = {sta: len(self.y[sta]) for sta in self.stalist}
+        self.t = {sta: self.data[sta].t for sta in stalist}
+        self.y = {sta: self.data[sta].data for sta in stalist}
+        self.sig = {sta: self.data[sta].data.std for sta in stalist}
+        self.N = {sta: len(self.y[sta]) for sta in stalist}
 
         # Output
         self.fitted_params = {sta: dict() for sta in self.stalist}
@@ -110,17 +113,47 @@ class GenericModel():
         self.fitted_metaparams[sta]['RMS'] = self.rms[sta]
         self.fitted_metaparams[sta]['WRMS'] = self.wrms[sta]
 
-    def fitModel(self):
+    def invalidate(self, stalist):
+        # The data of these stations has changed, they must be fitted again
+        if not self.data:
+            return # nothing fitted yet
+        for sta in stalist:
+            self.t[sta] = self.data[sta].t
+            self.y[sta] = self.data[sta].data
+            self.sig[sta] = self.data[sta].data.std
+            self.N[sta] = len(self.y[sta])
+            self.fitted_params[sta] = dict()
+            self.fitted_metaparams[sta] = dict()
+            self.fitted_models[sta] = None
+            self.rms[sta] = np.NaN
+            self.wrms[sta] = np.NaN
+
+    def prepareData(self, stalist):
+        # Input of the stations not read yet: only the data of the stations
+        # fitted is loaded (e.g. the others were read from the store)
+        if not self.data:
+            self.getData(stalist=[])
+        missing = [sta for sta in stalist if sta not in self.t]
+        if missing:
+            self.invalidate(missing)
+
+    def fitModel(self, stalist=None):
 
         print('Fitting model %s...' % self.name)
 
-        for sta in self.stalist:
+        if stalist is None:
+            stalist = self.stalist
+        self.prepareData(stalist)
+
+        for sta in stalist:
 
             M = self.setupModel(sta)
 
             # Inversion
             try:
-                x, residuals, rank, singval = np.linalg.lstsq(M, self.y[sta], rcond=self.rcond)
+                # Always in double precision, whatever the data precision
+                y = np.asarray(self.y[sta], dtype=np.float64)
+                x, residuals, rank, singval = np.linalg.lstsq(M, y, rcond=self.rcond)
 
                 nparams = len(self.params_list)
                 for name, value in zip(self.params_list, x[:nparams]):
@@ -162,7 +195,12 @@ class GenericModel():
         return self.fitted_metaparams[sta][param]
 
     def getModel(self, sta):
-        return self.fitted_model[sta]
+        # Fitted first if needed: the store of the features (FeaturesCache)
+        # only keeps the values, not the fitted models
+        self.prepareData([sta])
+        if self.fitted_models[sta] is None:
+            self.fitModel([sta])
+        return self.fitted_models[sta]
 
     def getInfo(self, infos=''):
         if infos:
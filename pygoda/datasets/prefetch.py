@@ -0,0 +1,84 @@
+# coding: utf-8
+
+import threading
+
+
+class Prefetcher():
+
+    # Loads the data of some stations in a background thread, before they
+    # are actually needed (e.g. next grid page with load_on_the_fly).
+    #
+    # The worker thread only produces the data dicts returned by the loader,
+    # they are handed over to the GUI thread by take() (called by
+    # GenericLoader.loadStationData), which then calls TimeSeries.setAttributes
+    # as usual: the TimeSeries objects are never modified by the worker.
+
+    BATCH_SIZE = 8 # stations loaded at once by the worker
+
+    def __init__(self, loader):
+
+        self.loader = loader
+
+        self.condition = threading.Condition()
+        self.queue = [] # stations to load, in order
+        self.wanted = set() # stations of the last request
+        self.loading = set() # stations being loaded by the worker
+        self.ready = dict() # station -> data dict, waiting for take()
+        self.stopped = False
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def request(self, stalist):
+
+        # Replace the previous request: data prefetched for stations which
+        # are not requested anymore is dropped
+        with self.condition:
+            self.wanted = set(stalist)
+            self.ready = {sta: data for sta, data in self.ready.items()
+                          if sta in self.wanted}
+            self.queue = [sta for sta in stalist if sta not in self.ready
+                          and sta not in self.loading]
+            self.condition.notify_all()
+
+    def take(self, staname):
+
+        # Data dict of the station if prefetched (None otherwise), waits for
+        # the worker if the station is being loaded
+        with self.condition:
+            if staname in self.queue:
+                self.queue.remove(staname) # will be loaded by the caller
+            while staname in self.loading:
+                self.condition.wait()
+            return self.ready.pop(staname, None)
+
+    def stop(self):
+
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def _run(self):
+
+        while True:
+            with self.condition:
+                while not self.queue and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                batch = self.queue[:self.BATCH_SIZE]
+                del self.queue[:self.BATCH_SIZE]
+                self.loading = set(batch)
+
+            try:
+                data_dict = self.loader.loadBatchData(batch)
+            except Exception as e:
+                print(f'Prefetching failed: {e}')
+                data_dict = dict()
+
+            with self.condition:
+                self.ready.update({sta: data for sta, data in data_dict.items()
+                                   if sta in self.wanted})
+                self.loading = set()
+                self.condition.notify_all()
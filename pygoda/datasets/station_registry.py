@@ -0,0 +1,87 @@
+# coding: utf-8
+
+import numpy as np
+
+
+class StationRegistry():
+
+    # Dense integer ID of each station, its index in the list given at
+    # creation, which does not change afterwards (sorting, filtering...).
+    #
+    # Any list of stations (cfg.stalist, filter outputs...) can then be seen
+    # as an array of IDs or as a boolean mask over all the stations, which
+    # replaces the 'sta in stalist' and stalist.index(sta) linear searches
+    # by O(1) lookups or vectorised operations.
+
+    MAX_POSITIONS = 4 # number of lists whose positions are kept
+
+    def __init__(self, stalist):
+
+        self.names = np.asarray(stalist, dtype=object) # ID -> name
+        self.ids = {sta: ista for ista, sta in enumerate(stalist)} # name -> ID
+        self.nsta = len(self.names)
+
+        # Positions in the last ordered lists given to getPositions
+        self.positions = [] # (copy of stalist, positions)
+
+    def __len__(self):
+
+        return self.nsta
+
+    def __contains__(self, staname):
+
+        return staname in self.ids
+
+    def getId(self, staname):
+
+        return self.ids[staname]
+
+    def getIds(self, stalist):
+
+        return np.fromiter((self.ids[sta] for sta in stalist), dtype=int,
+                           count=len(stalist))
+
+    def getNames(self, ids):
+
+        return list(self.names[ids])
+
+    def getMask(self, stalist):
+
+        mask = np.zeros(self.nsta, dtype=bool)
+        mask[self.getIds(stalist)] = True
+
+        return mask
+
+    def getStations(self, mask):
+
+        # Stations of a mask, in ID order
+        return list(self.names[mask])
+
+    def filterList(self, stalist, mask):
+
+        # Stations of stalist which are in the mask, in the order of stalist
+        ids = self.getIds(stalist)
+        return list(self.names[ids[mask[ids]]])
+
+    def getPositions(self, stalist):
+
+        # Index of each station (by ID) in the ordered list stalist, -1 if
+        # it is not in the list. The result is kept for the last few lists
+        # given, compared by value (a list may be modified in place): much
+        # faster than looking up all the IDs again.
+        for cached_list, positions in self.positions:
+            if len(cached_list) == len(stalist) and cached_list == stalist:
+                return positions
+
+        positions = np.full(self.nsta, -1, dtype=int)
+        positions[self.getIds(stalist)] = np.arange(len(stalist))
+        self.positions = [(list(stalist), positions)] + \
+                         self.positions[:self.MAX_POSITIONS - 1]
+
+        return positions
+
+    def getPosition(self, staname, stalist):
+
+        # Same as stalist.index(staname), but -1 if not in the list
+        return int(self.getPositions(stalist)[self.ids[staname]])
+
@@ -300,6 +300,49 @@ class GeographicPosition():
         return 2 * 6371 * np.arcsin(np.sqrt(h))
 
 
+class LazyGeographicPosition(GeographicPosition):
+
+    # Same interface as GeographicPosition, built from raw floats: the Angle
+    # and Scalar objects are only created the first time they are accessed
+    # (typically when the GUI needs to display them).
+
+    def __init__(self, lon, lat, elevation=None,
+                 lon_desc=None, lat_desc=None, elevation_desc=None):
+
+        self._lonlat = (lon, lat)
+        self._lonlat_desc = (lon_desc or dict(), lat_desc or dict())
+        self._elevation = elevation
+        self._elevation_desc = elevation_desc
+        self._coord = None
+        self._elevation_scalar = None
+
+    @property
+    def coord(self):
+        if self._coord is None:
+            (lon, lat), (lon_desc, lat_desc) = self._lonlat, self._lonlat_desc
+            self._coord = Coordinates((Angle(lon, signed=True, **lon_desc),
+                                       Angle(lat, signed=True, **lat_desc)))
+        return self._coord
+
+    @property
+    def lon(self):
+        return self.coord.lon
+
+    @property
+    def lat(self):
+        return self.coord.lat
+
+    @property
+    def elevation(self):
+        if self._elevation_desc is None:
+            # No elevation attribute in the dataset
+            return self._elevation
+        if self._elevation_scalar is None:
+            self._elevation_scalar = Scalar(self._elevation, signed=True,
+                                            **self._elevation_desc)
+        return self._elevation_scalar
+
+
 class TimeVector(np.ndarray):
 
     # From https://numpy.org/doc/stable/user/basics.subclassing.html
@@ -375,24 +418,69 @@ class TSComponent(np.ndarray):
         self.correction_applied = getattr(obj, 'correction_applied', False)
 
 
+class PackedArrays():
+
+    # Arrays of all the stations stored in one contiguous array, the array
+    # of the i-th station being data[offsets[i]:offsets[i + 1]] (CSR-style)
+
+    def __init__(self, arrays, dtype=None):
+
+        lengths = np.fromiter((len(array) for array in arrays),
+                              dtype=np.int64, count=len(arrays))
+        self.offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+
+        if len(arrays):
+            # np.asarray: base class, whatever the subclass of the arrays
+            self.data = np.concatenate([np.asarray(array, dtype=dtype) for array in arrays])
+        else:
+            self.data = np.asarray([], dtype=dtype)
+
+    def __len__(self):
+
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+    def isView(self, i, array):
+
+        # True if the array is the i-th array itself (not a copy)
+        array = np.asarray(array)
+        segment = self[i]
+        return array.dtype == segment.dtype and len(array) == len(segment) and \
+               array.__array_interface__['data'][0] == segment.__array_interface__['data'][0]
+
+    @property
+    def lengths(self):
+
+        return np.diff(self.offsets)
+
+
 # @dataclass(frozen=True)
 class TimeSeries():
 
-    def __init__(self, name, position, loader=None, **attrs):
+    def __init__(self, name, position, loader=None, component_loader=None, **attrs):
 
         self.name = name
         self.setPosition(position)
         self.t = np.asarray([])
+        self.loaded = False # data set, possibly empty (no epoch in the time window)
 
         self.loader = loader
+        self.component_loader = component_loader # see loadComponents
+        self.on_load = None # called with the station name after loadData
 
         self.main_component = ''
         self.components = dict()
         self.n_components = 0
+        self.missing_components = set() # known but not loaded yet
 
         self.corrections = dict()
         self.n_corrections = 0
         self.pending_corrections = dict()
+        self.requested_corrections = dict() # last call to applyCorrections
 
         self.events = dict()
         self.all_events = np.asarray([])
@@ -406,7 +494,7 @@ class TimeSeries():
 
     @property
     def t(self):
-        if not len(self.__t):
+        if not self.loaded:
             self.loadData()
         return self.__t
 
@@ -416,7 +504,7 @@ class TimeSeries():
 
     @property
     def data(self):
-        if not len(self.__data):
+        if not self.loaded:
             self.loadData()
         return self.__data
 
@@ -426,7 +514,7 @@ class TimeSeries():
 
     @property
     def std_data(self):
-        if not len(self.__data):
+        if not self.loaded:
             self.loadData()
         return self.__std_data
 
@@ -437,50 +525,105 @@ class TimeSeries():
     def loadData(self):
         attrs = self.loader()
         self.setAttributes(attrs)
+        if self.main_component in self.missing_components:
+            self.loadComponents([self.main_component])
         # self.setMainComponent(main_comp)
         self.__data = getattr(self, self.main_component)
         self.__std_data = self.__data.std
         if self.pending_corrections:
             self.applyCorrections(self.pending_corrections)
+        if self.on_load is not None:
+            self.on_load(self.name)
+
+    def unloadData(self):
+        # Free the data arrays, only the metadata is kept. The data will be
+        # loaded again (with the same corrections) when accessed.
+        if self.loader is None:
+            return False
+
+        for name in self.components:
+            delattr(self, name)
+        self.components = dict()
+        self.n_components = 0
+        self.missing_components = set()
+        self.corrections = dict()
+        self.n_corrections = 0
+        self.events = dict()
+        self.all_events = np.asarray([])
+        self.n_events = 0
+
+        self.__t = np.asarray([])
+        self.__data = np.asarray([])
+        self.__std_data = np.asarray([])
+        self.loaded = False
+
+        if self.requested_corrections:
+            self.pending_corrections = copy.deepcopy(self.requested_corrections)
+
+        return True
 
     def isLoaded(self):
-        return True if len(self.__t) else False
+        return self.loaded
+
+    def loadComponents(self, names):
+        # Read the data of components which were left out when loading
+        # (see GenericLoader.setLazyComponents)
+        names = [name for name in names if name in self.missing_components]
+        if not names or self.component_loader is None:
+            return
+        self.addComponents(self.component_loader(names))
+
+    def getComponent(self, name):
+        # Component loaded first if needed, e.g. for a feature which does
+        # not use the main component
+        if name in self.missing_components and self.isLoaded():
+            self.loadComponents([name])
+        return self.components[name]
+
+    def getDataSize(self):
+        # Memory used by the data arrays (bytes)
+        if not self.isLoaded():
+            return 0
+
+        size = self.__t.nbytes + self.all_events.nbytes
+        for comp in self.components.values():
+            size += comp.nbytes + np.asarray(comp.std).nbytes
+            for grp_corr in comp.corrections.values():
+                size += sum(corr.nbytes for corr in grp_corr.values())
+            for grp_events in comp.events.values():
+                size += sum(events.nbytes for events in grp_events.values())
+        size += sum(corr.nbytes for corr in self.corrections.values())
+        size += sum(events.nbytes for events in self.events.values())
+
+        return size
+
+    @property
+    def lon(self):
+        return self.position.lon
+
+    @property
+    def lat(self):
+        return self.position.lat
+
+    @property
+    def h(self):
+        return self.position.elevation
 
     def setPosition(self, position):
 
+        # lon, lat and h are read from the position when needed
         self.position = position
-        self.lon = self.position.lon
-        self.lat = self.position.lat
-        self.h = self.position.elevation
 
     def setAttributes(self, attrs):
 
         if 't' in attrs:
             t_attrs = attrs['t']
             self.t = TimeVector(attrs['t']['data'], **t_attrs)
+            self.loaded = True
 
         # Components specific
         for name, comp in attrs.get('components', dict()).items():
-            setattr(self, name, TSComponent(comp['data'], **comp))
-            new_comp = getattr(self, name)
-            # Sometimes it's convenient to access the components through a dict:
-            self.components[name] = new_comp
-            if 't' in comp:
-                t_attrs = comp['t']
-                setattr(new_comp, 't',
-                        TimeVector(comp['t']['data'], **t_attrs))
-            new_comp.corrections = dict()
-            for grp_name, grp_corr in comp.get('corrections', dict()).items():
-                new_comp.corrections[grp_name] = dict()
-                for corr_name, corr in grp_corr.items():
-                    new_comp.corrections[grp_name][corr_name] = TSComponent(corr['data'], **corr)
-            new_comp.events = dict()
-            for grp_name, grp_events in comp.get('events', dict()).items():
-                new_comp.events[grp_name] = dict()
-                for events_name, events in grp_events.items():
-                    data = events.get('data', [])
-                    new_comp.events[grp_name][events_name] = TimeVector(data, **events)
-                    self.n_events += len(data)
+            self._setComponent(name, comp)
         self.n_components = len(self.components)
         # For testing
         #name = 'fake'
@@ -509,12 +652,146 @@ class TimeSeries():
                 continue
             setattr(self, k, v)
 
+    def _setComponent(self, name, comp):
+
+        if 'data' not in comp:
+            # Not loaded (lazy loading), only the description is known
+            self.missing_components.add(name)
+            comp = dict(comp, data=[], corrections=dict(), events=dict())
+            comp.pop('t', None)
+        else:
+            self.missing_components.discard(name)
+
+        setattr(self, name, TSComponent(comp['data'], **comp))
+        new_comp = getattr(self, name)
+        # Sometimes it's convenient to access the components through a dict:
+        self.components[name] = new_comp
+        if 't' in comp:
+            t_attrs = comp['t']
+            setattr(new_comp, 't',
+                    TimeVector(comp['t']['data'], **t_attrs))
+        new_comp.corrections = dict()
+        for grp_name, grp_corr in comp.get('corrections', dict()).items():
+            new_comp.corrections[grp_name] = dict()
+            for corr_name, corr in grp_corr.items():
+                new_comp.corrections[grp_name][corr_name] = TSComponent(corr['data'], **corr)
+        new_comp.events = dict()
+        for grp_name, grp_events in comp.get('events', dict()).items():
+            new_comp.events[grp_name] = dict()
+            for events_name, events in grp_events.items():
+                data = events.get('data', [])
+                new_comp.events[grp_name][events_name] = TimeVector(data, **events)
+                self.n_events += len(data)
+
+    def addComponents(self, attrs):
+
+        # Set the components of attrs which are not loaded yet, the other
+        # parts of attrs (time vector, common corrections...) are ignored
+        for name, comp in attrs.get('components', dict()).items():
+            if name in self.missing_components and 'data' in comp:
+                self._setComponent(name, comp)
+        if self.main_component not in self.missing_components:
+            self.setMainComponent(self.main_component)
+
+    def setArrays(self, t, components):
+
+        # Replace the time vector and the components (data, std) by arrays with
+        # the same content, e.g. views into the packed arrays of a DataSet.
+        # Attributes (name, unit, corrections...) are kept.
+        new_t = np.asarray(t).view(TimeVector)
+        new_t.__dict__.update(self.t.__dict__)
+        self.t = new_t
+
+        for name, (data, std) in components.items():
+            new_comp = np.asarray(data).view(TSComponent)
+            new_comp.__dict__.update(self.components[name].__dict__)
+            new_comp.std = std
+            setattr(self, name, new_comp)
+            self.components[name] = new_comp
+
+        self.setMainComponent(self.main_component)
+
+    def appendData(self, attrs):
+
+        # Extend the data with new epochs, attrs being the same kind of dict
+        # as for setAttributes but with the new epochs only. The corrections
+        # of the new epochs are set to the current state (see applyCorrections)
+        # and the events are replaced (not time-aligned).
+
+        def extend(array, new_values):
+            new_array = np.concatenate((np.asarray(array), new_values)).view(type(array))
+            new_array.__dict__.update(array.__dict__)
+            return new_array
+
+        self.t = extend(self.t, attrs['t']['data'])
+
+        for name, comp_attrs in attrs.get('components', dict()).items():
+            if name in self.missing_components or 'data' not in comp_attrs:
+                continue # read entirely when needed
+            comp = self.components[name]
+            data = np.array(comp_attrs['data'], dtype=comp.dtype)
+
+            for grp_name, grp_corr in comp_attrs.get('corrections', dict()).items():
+                for corr_name, corr in grp_corr.items():
+                    old_corr = comp.corrections[grp_name][corr_name]
+                    if old_corr.correction_applied and not corr['applied']:
+                        data += old_corr.correction_factor * corr['data']
+                    elif not old_corr.correction_applied and corr['applied']:
+                        data -= old_corr.correction_factor * corr['data']
+                    comp.corrections[grp_name][corr_name] = extend(old_corr, corr['data'])
+            if name == self.main_component:
+                # Component-independent corrections are toggled on this one only
+                for grp_name, grp_corr in attrs.get('corrections', dict()).items():
+                    for corr_name, corr in grp_corr.items():
+                        old_corr = self.corrections[corr_name]
+                        if old_corr.correction_applied and not corr['applied']:
+                            data += old_corr.correction_factor * corr['data']
+                        elif not old_corr.correction_applied and corr['applied']:
+                            data -= old_corr.correction_factor * corr['data']
+
+            new_comp = extend(comp, data)
+            new_comp.std = np.concatenate((np.broadcast_to(comp.std, comp.shape),
+                                           comp_attrs['std'])).astype(comp.dtype, copy=False)
+            if 't' in comp_attrs:
+                new_comp.t = extend(comp.t, comp_attrs['t']['data'])
+            new_comp.events = dict()
+            for grp_name, grp_events in comp_attrs.get('events', dict()).items():
+                new_comp.events[grp_name] = dict()
+                for events_name, events in grp_events.items():
+                    new_comp.events[grp_name][events_name] = TimeVector(events.get('data', []), **events)
+            setattr(self, name, new_comp)
+            self.components[name] = new_comp
+
+        for grp_name, grp_corr in attrs.get('corrections', dict()).items():
+            for corr_name, corr in grp_corr.items():
+                self.corrections[corr_name] = extend(self.corrections[corr_name], corr['data'])
+
+        self.events = dict()
+        self.all_events = np.asarray([])
+        for grp_name, grp_events in attrs.get('events', dict()).items():
+            for events_name, events in grp_events.items():
+                self.events[events_name] = TimeVector(events.get('data', []), **events)
+        if self.events:
+            self.all_events = np.sort(np.concatenate(list(self.events.values())))
+        self.n_events = len(self.all_events) + sum(len(events) for comp in self.components.values()
+                                                   for grp_events in comp.events.values()
+                                                   for events in grp_events.values())
+
+        for k, v in attrs.items():
+            if k in ('t', 'components', 'corrections', 'events'):
+                continue
+            setattr(self, k, v)
+
+        self.setMainComponent(self.main_component)
+
     def setMainComponent(self, target):
 
         # if target not in self.components.keys():
         #     raise ValueError("%s is not a component of this TimeSeries instance" % target)
         # self.data = getattr(self.__dict__['components'], target)
         self.main_component = target
+        if target in self.missing_components and self.isLoaded():
+            self.loadComponents([target])
         try:
             self.__data = getattr(self, self.main_component)
             self.__std_data = self.__data.std
@@ -528,6 +805,8 @@ class TimeSeries():
 
         if not component:
             component = self.main_component
+        if component == self.main_component:
+            self.requested_corrections = copy.deepcopy(corrections)
 
         try:
             comp = getattr(self, component)
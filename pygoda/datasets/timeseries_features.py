@@ -12,7 +12,9 @@ import strictyaml as yaml
 
 import constants as cst
 import config as cfg
+from . import features_pool
 from . import fit_data
+from . import station_registry
 from . import timeseries
 
 def spherical_distance(p1, p2):
@@ -28,6 +30,294 @@ def load_features_desc():
 
     return features_desc
 
+def feature_to_float(value):
+    # Some features are 0-d or 1-element arrays (e.g. TIME.SPAN)
+    value = np.asarray(value, dtype=float).ravel()
+    return value[0] if len(value) else np.nan
+
+def segment_reduce(ufunc, values, offsets, empty=np.nan):
+    """Reduction of each segment values[offsets[i]:offsets[i+1]]
+
+    Empty segments get the value empty.
+    """
+
+    if values.dtype == bool:
+        values = values.astype(np.int64) # counts
+    lengths = np.diff(offsets)
+    result = np.full(len(lengths), empty, dtype=np.result_type(values, empty))
+    nonempty = lengths > 0
+    if np.any(nonempty):
+        # Empty segments skipped: each segment ends where the next one starts
+        result[nonempty] = ufunc.reduceat(values, offsets[:-1][nonempty])
+
+    return result
+
+def segment_nanreduce(ufunc, values, offsets):
+    """Same as segment_reduce ignoring NaN (NaN if only NaN), e.g. nanmin"""
+
+    valid = ~np.isnan(values)
+    neutral = {np.minimum: np.inf, np.maximum: -np.inf, np.add: 0.0}[ufunc]
+    result = segment_reduce(ufunc, np.where(valid, values, neutral), offsets)
+    result[segment_reduce(np.add, valid, offsets, empty=0) == 0] = np.nan
+
+    return result
+
+def segment_diff(values, offsets):
+    """Differences within each segment, and the offsets of the segments"""
+
+    lengths = np.maximum(np.diff(offsets) - 1, 0)
+    diff_offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(lengths, out=diff_offsets[1:])
+
+    # Differences between the last and first values of two segments removed
+    keep = np.ones(max(len(values) - 1, 0), dtype=bool)
+    bounds = offsets[1:-1]
+    keep[bounds[(bounds > 0) & (bounds < len(values))] - 1] = False
+
+    return np.diff(values)[keep], diff_offsets
+
+def segment_nanmedian(values, offsets, block_size=256):
+    """Median of each segment, ignoring NaN (same as np.nanmedian)
+
+    The stations are sorted by number of valid values and processed by
+    blocks of similar lengths (2-D array, NaN replaced by +inf at the end of
+    each row): the middle values of all the rows of a block are selected by
+    a single partial sort, instead of one median computation per station.
+    """
+
+    lengths = np.diff(offsets)
+    nvalid = segment_reduce(np.add, ~np.isnan(values), offsets, empty=0)
+    result = np.full(len(lengths), np.nan)
+
+    order = np.argsort(nvalid, kind='stable')
+    order = order[nvalid[order] > 0]
+    for i in range(0, len(order), block_size):
+        block = order[i:i + block_size]
+        columns = np.arange(lengths[block].max())
+        outside = columns >= lengths[block][:, None]
+        rows = values[np.where(outside, 0, offsets[block][:, None] + columns)]
+        rows[outside | np.isnan(rows)] = np.inf
+
+        n = nvalid[block]
+        lo, hi = (n - 1)//2, n//2
+        rows = np.partition(rows, np.unique(np.concatenate((lo, hi))), axis=1)
+        irow = np.arange(len(block))
+        result[block] = (rows[irow, lo] + rows[irow, hi])/2
+
+    return result
+
+
+class PackedFeatures():
+
+    # Features of many stations at once (TIME.*, DATA.* and SIGMA.*).
+    #
+    # The time vector, data and std of all the stations are concatenated
+    # (timeseries.PackedArrays, station i being [offsets[i]:offsets[i + 1]])
+    # and each feature is computed by a few segment reductions over these
+    # arrays, instead of one call per station. The arrays of a packed data
+    # set (see dataset.PackedDataSet) are used as they are. The intermediate results shared by
+    # several features (valid epochs, medians...) are only computed once.
+    # Same values as the per-station functions of TimeSeriesFeatures, except
+    # for stations without enough values, where NaN is returned instead of
+    # raising an exception (e.g. DATA.OFFSET_MIN with a single epoch).
+
+    FEATURES = ('TIME.SPAN', 'TIME.MIN', 'TIME.MAX', 'TIME.DENSITY',
+                'TIME.GAPS', 'TIME.LARGEST_GAP',
+                'DATA.N', 'DATA.MIN', 'DATA.MAX', 'DATA.MINMAX', 'DATA.MEDIAN',
+                'DATA.VAR_MEDIAN', 'DATA.OFFSET_MIN', 'DATA.OFFSET_MAX',
+                'DATA.OFFSET_MAX_SMART',
+                'SIGMA.SIGMA_MED', 'SIGMA.SIGMA_MIN', 'SIGMA.SIGMA_MAX')
+
+    def __init__(self, series, packed=None):
+
+        self.series = series
+        self.packed = self._getPacked(packed)
+        if self.packed is not None:
+            t, data, _ = self.packed
+        else:
+            t = timeseries.PackedArrays([ts.t for ts in series], dtype=np.float64)
+            data = timeseries.PackedArrays([ts.data for ts in series], dtype=np.float64)
+
+        self.offsets = t.offsets
+        self.lengths = t.lengths
+        self.t = np.asarray(t.data, dtype=np.float64)
+        self.data = np.asarray(data.data, dtype=np.float64)
+
+        self.values = dict() # intermediate results
+
+    def _getPacked(self, packed):
+
+        # Time vector, data and std of the main component in the packed data
+        # set, if the series are exactly its stations and still views into it
+        if packed is None or len(packed) != len(self.series):
+            return None
+        name = self.series[0].main_component if self.series else ''
+        if name not in packed.components:
+            return None
+        if any(ts.main_component != name or ts.name != sta or \
+               not packed.t.isView(ista, ts.t) or \
+               not packed.components[name].isView(ista, ts.data) or \
+               not packed.std[name].isView(ista, ts.std_data)
+               for ista, (sta, ts) in enumerate(zip(packed.stalist, self.series))):
+            return None
+
+        return packed.t, packed.components[name], packed.std[name]
+
+    def compute(self, feat_id):
+
+        return getattr(self, '_' + feat_id.replace('.', '_'))()
+
+    def _shared(self, name, function):
+
+        if name not in self.values:
+            self.values[name] = function()
+        return self.values[name]
+
+    def _valid(self):
+
+        # Epochs with data (not NaN) and their time vector
+        def valid():
+            mask = ~np.isnan(self.data)
+            nvalid = segment_reduce(np.add, mask, self.offsets, empty=0)
+            offsets = np.zeros(len(self.offsets), dtype=np.int64)
+            np.cumsum(nvalid, out=offsets[1:])
+            return self.t[mask], nvalid, offsets
+        return self._shared('valid', valid)
+
+    def _first_last(self, values, offsets):
+
+        # First and last value of each segment (NaN if empty)
+        nonempty = np.diff(offsets) > 0
+        first = np.full(len(nonempty), np.nan)
+        last = np.full(len(nonempty), np.nan)
+        first[nonempty] = values[offsets[:-1][nonempty]]
+        last[nonempty] = values[offsets[1:][nonempty] - 1]
+        return first, last
+
+    def _std(self):
+
+        def std():
+            if self.packed is not None:
+                return np.asarray(self.packed[2].data, dtype=np.float64)
+            # std may be a scalar (0.0 by default)
+            return timeseries.PackedArrays([np.broadcast_to(ts.std_data, np.shape(ts.data))
+                                            for ts in self.series], dtype=np.float64).data
+        return self._shared('std', std)
+
+    def _data_median(self):
+
+        return self._shared('median', lambda: segment_nanmedian(self.data, self.offsets))
+
+    def _TIME_SPAN(self):
+
+        t_valid, nvalid, offsets = self._valid()
+        first, last = self._first_last(t_valid, offsets)
+        return np.where(nvalid > 1, last - first, 0.0)
+
+    def _TIME_MIN(self):
+
+        t_valid, _, offsets = self._valid()
+        return segment_reduce(np.minimum, t_valid, offsets)
+
+    def _TIME_MAX(self):
+
+        t_valid, _, offsets = self._valid()
+        return segment_reduce(np.maximum, t_valid, offsets)
+
+    def _TIME_DENSITY(self):
+
+        _, nvalid, _ = self._valid()
+        first, last = self._first_last(self.t, self.offsets)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return nvalid/(last - first)
+
+    def _TIME_GAPS(self):
+
+        # Sum of the gaps between valid epochs, divided by the number of epochs
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self._TIME_SPAN()/self.lengths
+
+    def _TIME_LARGEST_GAP(self):
+
+        t_valid, _, offsets = self._valid()
+        gaps, gap_offsets = segment_diff(t_valid, offsets)
+        return segment_reduce(np.maximum, gaps, gap_offsets)
+
+    def _DATA_N(self):
+
+        _, nvalid, _ = self._valid()
+        return nvalid
+
+    def _DATA_MIN(self):
+
+        return self._shared('min', lambda: segment_nanreduce(np.minimum, self.data,
+                                                             self.offsets))
+
+    def _DATA_MAX(self):
+
+        return self._shared('max', lambda: segment_nanreduce(np.maximum, self.data,
+                                                             self.offsets))
+
+    def _DATA_MINMAX(self):
+
+        return self._DATA_MAX() - self._DATA_MIN()
+
+    def _DATA_MEDIAN(self):
+
+        return self._data_median()
+
+    def _DATA_VAR_MEDIAN(self):
+
+        median = np.repeat(self._data_median(), self.lengths)
+        deviations = np.abs(self.data - median)
+        deviations[np.isnan(deviations)] = 0.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return segment_reduce(np.add, deviations, self.offsets)/self.lengths
+
+    def _data_offsets(self):
+
+        # Absolute differences between consecutive values (NaN if any is NaN)
+        def offsets():
+            diffs, diff_offsets = segment_diff(self.data, self.offsets)
+            return np.abs(diffs), diff_offsets
+        return self._shared('offsets', offsets)
+
+    def _DATA_OFFSET_MIN(self):
+
+        return segment_nanreduce(np.minimum, *self._data_offsets())
+
+    def _DATA_OFFSET_MAX(self):
+
+        return segment_nanreduce(np.maximum, *self._data_offsets())
+
+    def _DATA_OFFSET_MAX_SMART(self):
+
+        # See largestOffsetCustom: with Z[j + 2] - Z[j] = e[j], the offsets
+        # of a station starting at o are min(|e[o + 2k]|, |e[o + 2k + 1]|)
+        # for k < n//2 - 1, NaN propagated
+        counts = np.maximum(self.lengths//2 - 1, 0)
+        count_offsets = np.zeros(len(self.offsets), dtype=np.int64)
+        np.cumsum(counts, out=count_offsets[1:])
+        k = np.arange(count_offsets[-1]) - np.repeat(count_offsets[:-1], counts)
+        positions = np.repeat(self.offsets[:-1], counts) + 2*k
+
+        e = np.abs(self.data[2:] - self.data[:-2])
+        offsets = np.minimum(e[positions], e[positions + 1])
+        return segment_reduce(np.maximum, offsets, count_offsets)
+
+    def _SIGMA_SIGMA_MED(self):
+
+        return segment_nanmedian(self._std(), self.offsets)
+
+    def _SIGMA_SIGMA_MIN(self):
+
+        return segment_nanreduce(np.minimum, self._std(), self.offsets)
+
+    def _SIGMA_SIGMA_MAX(self):
+
+        return segment_nanreduce(np.maximum, self._std(), self.offsets)
+
+
 def largestOffsetCustom(data, sig):
     Z, stdZ = data, sig
     offsets = np.min([np.abs(np.diff(Z[:-1:2])),\
@@ -47,8 +337,7 @@ def timeSpan(t, data):
     if len(t_nonan) == 0:
         return 0.0
     elif len(t_nonan) == 1:
-        it = np.where(~np.isnan(data))[0]
-        return np.diff(t[it:min(it+1, len(t))])
+        return 0.0
     else:
         return t_nonan[-1] - t_nonan[0]
 
@@ -95,10 +384,27 @@ class TimeSeriesFeatures():
         'timespan': lambda x, y: timeseries.Duration(x),
     }
 
+    # What the features are computed from (by feature ID, else by group): a
+    # change of one of these sources marks the features depending on it
+    # dirty, for the stations concerned (see invalidate). The features of a
+    # model depend on its fit ('MODELS.<name>'), which depends on the data
+    # and std given to the model (see GenericModel.getData).
+    DEPENDENCIES = {
+        'SPACE': ('POSITION', ),
+        'SPACE.D0': ('POSITION', 'REFERENCE_POINT'),
+        'TIME': ('DATA', ),
+        'DATA': ('DATA', ),
+        'DATA.OFFSET_MAX_SMART': ('DATA', 'STD'),
+        'SIGMA': ('STD', ),
+        'EVENTS': ('EVENTS', ),
+    }
+    MODELS_DEPENDENCIES = ('DATA', 'STD')
+
     def __init__(self, dataset, models):
 
         self.data = dataset
         self.stalist = dataset.getStationsList().copy()
+        self.stations = station_registry.StationRegistry(self.stalist)
         #self.stalist.sort()
 
         self.models = models
@@ -150,9 +456,24 @@ class TimeSeriesFeatures():
         # Features values for each station
         self.sta_features = {feat_id: dict() for feat_id in self.features.keys()}
 
+        # Values computed in previous sessions (see setCache)
+        self.cache = None
+        self.get_fingerprints = None
+
+        # Worker processes fitting the models (see setWorkers)
+        self.pool = None
+        self.progress = None
+
+        # Stations of the features to compute again (see invalidate)
+        self.dirty = dict()
+
+        # Values of the features as arrays aligned with the station IDs
+        # (see getValues), dropped when the features are computed again
+        self.arrays = dict()
+
         # self.computeFeatures(compute_models=False)
 
-    def computeFeatures(self, names=None, compute_models=True):
+    def computeFeatures(self, names=None, compute_models=True, stalist=None):
 
         if names:
             if not isinstance(names, list):
@@ -161,27 +482,189 @@ class TimeSeriesFeatures():
         else:
             features = self.features
 
-        for feat_id, features in features.items():
+        if stalist is None:
+            stalist = self.stalist
+
+        # Stations to compute for each feature
+        todo = dict()
+        for feat_id in features:
             if feat_id[0] == '.':
                 continue # Names are already stored
+            if 'MODELS.' in feat_id and not compute_models:
+                continue
+            todo[feat_id] = stalist
+
+        # Values stored in a previous session (see setCache): only the
+        # missing and stale ones are computed
+        cached_ids = []
+        if self.cache is not None:
+            cached_ids = [feat_id for feat_id in todo if not feat_id.startswith('SPACE.')]
+        if cached_ids:
+            keys = self.getCacheKeys(stalist)
+            for feat_id in cached_ids:
+                values, todo[feat_id] = self.cache.getValues(feat_id, stalist, keys)
+                self.sta_features[feat_id].update(self.castValues(feat_id, values))
+
+        # Features computed for all the stations at once
+        packed_ids = [feat_id for feat_id, sta_todo in todo.items()
+                      if feat_id in PackedFeatures.FEATURES and sta_todo]
+        if packed_ids:
+            needed = set().union(*(todo[feat_id] for feat_id in packed_ids))
+            packed_list = [sta for sta in stalist if sta in needed]
+            for sta in packed_list:
+                self.data.touch(sta) # data needed
+            packed = PackedFeatures([self.data[sta] for sta in packed_list],
+                                    self.data.packed)
+            for feat_id in packed_ids:
+                self.sta_features[feat_id].update(zip(packed_list,
+                                                      packed.compute(feat_id).tolist()))
+
+        for feat_id, sta_todo in todo.items():
+            if feat_id in packed_ids or not sta_todo:
+                continue # Already computed
+            elif feat_id == 'SPACE.D0':
+                # Only the positions are needed, all the stations at once
+                lon = np.array([self.data[sta].lon for sta in sta_todo], dtype=float)
+                lat = np.array([self.data[sta].lat for sta in sta_todo], dtype=float)
+                distances = spherical_distance((lon, lat), cfg.reference_point)
+                self.sta_features[feat_id].update(zip(sta_todo, distances.tolist()))
             elif 'MODELS.' in feat_id:
                 # Dealing with a model
-                if not compute_models:
-                    continue
                 _, model, param = feat_id.split('.')
                 # Fit the model first
                 # print(model, param)
-                if not cfg.models[model].data or \
-                   not cfg.models[model].fitted_metaparams[self.stalist[0]]:
-                    cfg.models[model].fitModel()
+                if not cfg.models[model].data:
+                    # Only these stations (e.g. others read from the cache)
+                    self.fitModel(model, sta_todo)
+                else:
+                    # Stations never fitted or invalidated since
+                    unfitted = [sta for sta in sta_todo if not cfg.models[model].fitted_metaparams[sta]]
+                    if unfitted:
+                        self.fitModel(model, unfitted)
                 # Then get the params
-                for sta in self.stalist:
+                for sta in sta_todo:
                     self.sta_features[feat_id][sta] = self.features[feat_id](sta)
             else:
                 #TODO: improve that
-                for sta in self.stalist:
+                for sta in sta_todo:
+                    if not feat_id.startswith('SPACE.'):
+                        self.data.touch(sta) # data needed
                     self.sta_features[feat_id][sta] = self.features[feat_id](self.data[sta])
 
+        for feat_id in cached_ids:
+            if todo[feat_id]:
+                values = {sta: feature_to_float(self.sta_features[feat_id][sta])
+                          for sta in todo[feat_id]}
+                self.cache.putValues(feat_id, values, keys)
+
+        # Up to date for these stations now
+        for feat_id in todo:
+            self.arrays.pop(feat_id, None)
+            if feat_id in self.dirty:
+                self.dirty[feat_id].difference_update(stalist)
+                if not self.dirty[feat_id]:
+                    del self.dirty[feat_id]
+
+    def getDependencies(self, feat_id):
+
+        # Sources the feature is computed from (see DEPENDENCIES)
+        if feat_id.startswith('MODELS.'):
+            return {'.'.join(feat_id.split('.')[:2])} # fit of the model
+        group = feat_id.split('.')[0]
+        return set(self.DEPENDENCIES.get(feat_id, self.DEPENDENCIES.get(group, ())))
+
+    def invalidate(self, sources, stalist=None):
+
+        # These sources have changed (e.g. 'DATA' when another component is
+        # selected, 'REFERENCE_POINT'...) for these stations (all if None):
+        # the features already computed from them are marked dirty, and only
+        # computed again when needed (see refresh). Returns the dirty features.
+        if stalist is None:
+            stalist = self.stalist
+
+        sources = set(sources)
+        if sources & set(self.MODELS_DEPENDENCIES):
+            for name, model in self.models.items():
+                model.invalidate(stalist)
+                sources.add('MODELS.' + name)
+
+        dirty = []
+        for feat_id, values in self.sta_features.items():
+            if feat_id[0] == '.' or not values:
+                continue # nothing computed yet
+            if self.getDependencies(feat_id) & sources:
+                self.dirty.setdefault(feat_id, set()).update(stalist)
+                dirty.append(feat_id)
+
+        return dirty
+
+    def isDirty(self, feat_id):
+
+        return feat_id in self.dirty
+
+    def refresh(self, feat_id):
+
+        # Compute again the dirty stations of the feature, if any
+        if feat_id in self.dirty:
+            dirty = self.dirty[feat_id]
+            self.computeFeatures(feat_id, stalist=[sta for sta in self.stalist if sta in dirty])
+
+    def fitModel(self, model, stalist):
+
+        # On the worker processes if any (see setWorkers)
+        if self.pool is None:
+            cfg.models[model].fitModel(stalist)
+        else:
+            self.pool.fitModel(cfg.models[model], stalist, progress=self.progress)
+
+    def setWorkers(self, workers):
+
+        # Number of processes fitting the models (1 == serial, -1 == all the cores)
+        if self.pool is not None:
+            self.pool.stop()
+        self.pool = features_pool.FeaturesPool(workers) if workers != 1 else None
+
+    def setProgress(self, progress):
+
+        # progress(task, ndone, ntotal) is called as the results come
+        self.progress = progress
+
+    def setCache(self, cache, get_fingerprints):
+
+        # Store of the values computed in previous sessions (FeaturesCache),
+        # get_fingerprints(stalist) gives the version of the data files
+        self.cache = cache
+        self.get_fingerprints = get_fingerprints
+
+    def getCacheKeys(self, stalist):
+
+        # Key of the current data of the stations: component displayed,
+        # corrections requested and version of the data files
+        components = {sta: self.data[sta].main_component for sta in stalist}
+        corrections = {sta: self.data[sta].requested_corrections for sta in stalist}
+
+        return self.cache.getKeys(stalist, components, corrections,
+                                  self.get_fingerprints(stalist))
+
+    def isInteger(self, feat_id):
+
+        return 'MODELS.' not in feat_id and \
+               self.getInfo(feat_id).get('type') in ('int', 'integer')
+
+    def castValues(self, feat_id, values):
+
+        # Values read from a file are floats
+        if not self.isInteger(feat_id):
+            return values
+        return {sta: value if np.isnan(value) else int(value)
+                for sta, value in values.items()}
+
+    def updateStations(self, stalist):
+
+        # The data of these stations has changed: fit the models again and
+        # update the features already computed, for these stations only
+        self.invalidate(('DATA', 'STD', 'EVENTS'), stalist)
+
     def sortByFeature(self, feature_id, order_asc,
                       return_list=True, store_result=True):
 
@@ -190,44 +673,56 @@ class TimeSeriesFeatures():
         elif feature_id == '.NAMES':
             sorted_feat = {sta: sta for sta in sorted(self.stalist)}
         else:
-            feature = self.sta_features[feature_id]
-            if not feature:
-                self.computeFeatures(feature_id)
+            # Stations with no value (NaN) at the end, whatever the order
+            ids = self.argsortByFeature(feature_id, order_asc)
+            sorted_list = self.stations.getNames(ids)
+            if return_list and not store_result:
+                return sorted_list
+            if store_result:
                 feature = self.sta_features[feature_id]
-            if order_asc:
-                sorted_feat = {k: v for k, v in \
-                               sorted(feature.items(),
-                                      key=lambda x: x[1]
-                                          if not np.isnan(x[1]) else np.inf)}
+                sorted_feat = {sta: feature.get(sta, np.nan) for sta in sorted_list}
             else:
-                sorted_feat = {k: v for k, v in \
-                               sorted(feature.items(),
-                                      key=lambda x: -x[1]
-                                          if not np.isnan(x[1]) else np.inf)}
-
-            # if not order_asc:
-            #     sorted_feat = {sta: sorted_feat[sta] \
-            #                      for sta in list(sorted_feat.keys())[::-1]}
-
-            # Put stations with no data at the end
-            # sorted_feat_raw = sorted_feat.copy()
-            # for k, v in sorted_feat_raw.items():
-            #     if np.isnan(v) or v == '':
-            #         del sorted_feat[k]
-            #         sorted_feat.update({k: v})
+                # Float values, NaN if none
+                sorted_feat = dict(zip(sorted_list, self.getValues(feature_id)[ids].tolist()))
 
         if store_result:
             self.sta_features[feature_id] = sorted_feat
 
         if return_list:
             sorted_feat = list(sorted_feat.keys())
-            # Already reversed
-            # if not order_asc:
-            #     sorted_feat.reverse()
 
         return sorted_feat
 
+    def getValues(self, feature_id):
+
+        # Values of the feature (computed if needed) in a float array aligned
+        # with the station IDs (see self.stations), NaN if no value
+        self.refresh(feature_id)
+        if not self.sta_features[feature_id]:
+            self.computeFeatures(feature_id)
+
+        if feature_id not in self.arrays:
+            feature = self.sta_features[feature_id]
+            values = [feature.get(sta, np.nan) for sta in self.stalist]
+            try:
+                array = np.fromiter(values, dtype=float, count=len(values))
+            except (TypeError, ValueError):
+                # Some features are 0-d or 1-element arrays
+                array = np.array([feature_to_float(value) for value in values])
+            self.arrays[feature_id] = array
+
+        return self.arrays[feature_id]
+
+    def argsortByFeature(self, feature_id, order_asc):
+
+        # Station IDs sorted by the values of the feature (ascending if
+        # order_asc), NaN values last, ties keep the IDs order (stable sort)
+        values = self.getValues(feature_id)
+
+        return np.lexsort([values if order_asc else -values, np.isnan(values)])
+
     def getStationsFeature(self, feature_id, staname=None):
+        self.refresh(feature_id)
         if staname:
             return self.sta_features[feature_id][staname]
         else:
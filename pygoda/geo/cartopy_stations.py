@@ -63,7 +63,7 @@ class CartopyStations():
 
     def plotStationsCategories(self):
 
-        plotted_indices = [cfg.plotted_sta[staname] for staname in cfg.stalist]
+        plotted_indices = cfg.plotted_mask[cfg.stations.getIds(cfg.stalist)]
 
         list_categories = copy.deepcopy(cfg.CATEGORIES[cfg.current_grp])
         if cfg.current_grp != cfg.GRP_QUALITY:
@@ -98,7 +98,7 @@ class CartopyStations():
 
     def plotStationsFeatures(self):
 
-        feature = cfg.features.sta_features[cfg.sort_by]
+        feature = cfg.features.getStationsFeature(cfg.sort_by)
         values_all = np.asarray([feature[sta] for sta in cfg.stalist \
                                  if not np.isnan(feature[sta])])
         mean = np.mean(values_all)
@@ -121,7 +121,7 @@ class CartopyStations():
                 vmax = -vmin
 
         # Stations on current figure
-        ivisible = [cfg.plotted_sta[staname] for staname in cfg.stalist]
+        ivisible = cfg.plotted_mask[cfg.stations.getIds(cfg.stalist)]
         values = [feature[sta] for sta in cfg.stalist if cfg.plotted_sta[sta]]
         # size_normalize = np.abs(values)/max(abs(vmax), abs(vmin))
         # size_normalize[size_normalize > 1] = 1.
@@ -135,7 +135,7 @@ class CartopyStations():
                         c=values, cmap=cmap, vmin=vmin, vmax=vmax, zorder=2)
 
         # Stations not on current figure
-        ihidden = [not cfg.plotted_sta[staname] for staname in cfg.stalist]
+        ihidden = ~cfg.plotted_mask[cfg.stations.getIds(cfg.stalist)]
         values = [feature[sta] for sta in cfg.stalist if not cfg.plotted_sta[sta]]
         # size_normalize = np.abs(values)/max(abs(vmax), abs(vmin))
         # size_normalize[size_normalize > 1] = 1.
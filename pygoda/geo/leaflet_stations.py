@@ -162,7 +162,7 @@ class LeafletStations():
 
     def plotStationsCategories(self):
 
-        plotted_indices = [cfg.plotted_sta[staname] for staname in cfg.stalist]
+        plotted_indices = cfg.plotted_mask[cfg.stations.getIds(cfg.stalist)]
         plotted_indices = np.asarray(plotted_indices)
         stalist = np.asarray(cfg.stalist)
 
@@ -201,7 +201,7 @@ class LeafletStations():
 
     def plotStationsFeatures(self):
 
-        feature = cfg.features.sta_features[cfg.sort_by]
+        feature = cfg.features.getStationsFeature(cfg.sort_by)
         values_all = np.asarray([feature[sta] for sta in cfg.stalist])
         mean = np.mean(values_all)
         if (values_all <= 0).all():
@@ -222,7 +222,7 @@ class LeafletStations():
                 vmax = -vmin
 
         # Stations on current figure
-        ivisible = [cfg.plotted_sta[staname] for staname in cfg.stalist]
+        ivisible = cfg.plotted_mask[cfg.stations.getIds(cfg.stalist)]
         values = [feature[sta] for sta in cfg.stalist if cfg.plotted_sta[sta]]
         size_normalize = np.abs(values)/max(abs(vmax), abs(vmin))
         size_normalize[size_normalize > 1] = 1.
@@ -235,7 +235,7 @@ class LeafletStations():
                         c=values, cmap=cmap, vmin=vmin, vmax=vmax, zorder=2)
 
         # Stations not on current figure
-        ihidden = [not cfg.plotted_sta[staname] for staname in cfg.stalist]
+        ihidden = ~cfg.plotted_mask[cfg.stations.getIds(cfg.stalist)]
         values = [feature[sta] for sta in cfg.stalist if not cfg.plotted_sta[sta]]
         size_normalize = np.abs(values)/max(abs(vmax), abs(vmin))
         size_normalize[size_normalize > 1] = 1.
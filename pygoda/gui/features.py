@@ -102,7 +102,9 @@ class FeaturesPlotPanel(QtWidgets.QWidget):
         sorted_sta_all = cfg.features.sortByFeature(feat_id, not reversed,
                                                 return_list=False,
                                                 store_result=False).copy()
-        self.sorted_sta = {sta: value for sta, value in sorted_sta_all.items() if sta in cfg.stalist}
+        shown = cfg.stations.getMask(cfg.stalist)
+        self.sorted_sta = {sta: value for sta, value in sorted_sta_all.items()
+                           if shown[cfg.stations.getId(sta)]}
 
         try:
             group, feat = feat_id.split('.')
@@ -160,13 +162,17 @@ class FeaturesPlotPanel(QtWidgets.QWidget):
 
         sorted_sta_tmp = self.sorted_sta.copy()
         if stalist:
-            self.sorted_sta = {sta: value for sta, value in sorted_sta_tmp.items() if sta in stalist}
+            kept = cfg.stations.getMask(stalist)
+            self.sorted_sta = {sta: value for sta, value in sorted_sta_tmp.items()
+                               if kept[cfg.stations.getId(sta)]}
         else:
             reversed = True if self.sort_order.checkState() == QtCore.Qt.Checked else False
             sorted_sta_all = cfg.features.sortByFeature(self.feat_id1, not reversed,
                                                     return_list=False,
                                                     store_result=False).copy()
-            self.sorted_sta = {sta: value for sta, value in sorted_sta_all.items() if sta in cfg.filter_history[self.id]}
+            kept = cfg.stations.getMask(cfg.filter_history[self.id])
+            self.sorted_sta = {sta: value for sta, value in sorted_sta_all.items()
+                               if kept[cfg.stations.getId(sta)]}
 
         self.feature_plot.setFeature(self.sorted_sta)
 
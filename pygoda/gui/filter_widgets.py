@@ -62,7 +62,7 @@ class FilterWidget(QtWidgets.QWidget):
         stalist_cat = self.category_filter_widget.updateFilter(no_signal=True)
         stalist_geo = self.geo_filter_widget.updateFilter(no_signal=True)
 
-        stalist = [sta for sta in stalist_cat if sta in stalist_geo]
+        stalist = cfg.stations.filterList(stalist_cat, cfg.stations.getMask(stalist_geo))
 
         if not stalist:
             no_station = QtWidgets.QMessageBox(self)
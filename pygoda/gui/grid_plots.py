@@ -150,6 +150,21 @@ class GridPlots(pg.GraphicsLayoutWidget):
             self.grid_to_dependencies.emit({'UPDATE': True})
             self.send(sta_events)
 
+        self.prefetchPages()
+
+    def prefetchPages(self, pages=None):
+        # Load the data of the pages around the current one (and of the given
+        # pages) in the background, if loading the data on the fly
+        pages = list(pages) if pages is not None else []
+        for ipage in range(1, cfg.prefetch_pages + 1):
+            pages += [self.ipage + ipage, self.ipage - ipage]
+
+        stalist = []
+        for ipage in pages:
+            if 0 <= ipage*cfg.nplots < cfg.nsta and ipage != self.ipage:
+                stalist += cfg.stalist[ipage*cfg.nplots:min((ipage+1)*cfg.nplots, cfg.nsta)]
+        cfg.dataset.prefetchData(stalist)
+
     def clearGrid(self):
         if self.plotted_sta:
             for iplot, staname in enumerate(self.plotted_sta):
@@ -209,6 +224,12 @@ class GridPlots(pg.GraphicsLayoutWidget):
             self.grid_to_dependencies.emit({'PAGE': -1})
             return
 
+        if 'DATA_UPDATED' in sta_events:
+            # New epochs appended to the data of some stations
+            if any(sta in self.plotted_sta for sta in sta_events['DATA_UPDATED']):
+                self.createPlotsGrid(self.plotted_sta)
+            return
+
         if 'COMPONENT' in sta_events:
             # self.createPlotsGrid()
             self.grid_to_dependencies.emit({'PAGE': self.ipage, 'UPDATE': True})
@@ -219,7 +240,7 @@ class GridPlots(pg.GraphicsLayoutWidget):
             # which is not plotted yet.
             staname = sta_events['PLOT_REQUEST']
             self.selected_sta = [staname]
-            ista = cfg.stalist.index(staname)
+            ista = cfg.stations.getPosition(staname, cfg.stalist)
             self.ipage = ista//cfg.nplots
             self.grid_to_dependencies.emit({'PAGE': self.ipage})
             return
@@ -252,6 +273,16 @@ class GridPlots(pg.GraphicsLayoutWidget):
                 self.graphs[iplot].setFeature(sta_events['DISPLAY_FEATURE'])
                 plot_to_update.append(iplot)
 
+        if cst.HOVERED in sta_events:
+            # Stations hovered on the map or in the features panel: the user
+            # may jump to their page next
+            positions = cfg.stations.getPositions(cfg.stalist)
+            pages = {positions[cfg.stations.getId(sta)]//cfg.nplots
+                     for sta in sta_events[cst.HOVERED]
+                     if sta not in self.plotted_sta and positions[cfg.stations.getId(sta)] >= 0}
+            if pages:
+                self.prefetchPages(pages)
+
         # States have changed for some stations, update the hovered/selected lists and plots
         for event, list_sta in sta_events.items():
             if event not in cst.STATE_EVENTS:
@@ -757,7 +788,8 @@ class GridPlots(pg.GraphicsLayoutWidget):
 
     def plotsIndices(self, stalist):
 
-        return [self.plotted_sta.index(staname) for staname in stalist]
+        positions = cfg.stations.getPositions(self.plotted_sta)
+        return list(positions[cfg.stations.getIds(stalist)])
 
     def setPlotState(self, indices, state):
 
@@ -1039,6 +1071,7 @@ class GridSubplot(pg.ViewBox):
             return
         self.first_plot = False
 
+        cfg.dataset.touchData(self.staname)
         data = cfg.dataset.getData(self.staname)
         t = data.t
         Z = data.data
@@ -1338,7 +1371,7 @@ class GridSubplot(pg.ViewBox):
 
         if 'MODELS.' in self.feature:
             _, selected_model, _ = self.feature.split('.')
-            fitted_model = cfg.models[selected_model].fitted_models[self.staname]
+            fitted_model = cfg.models[selected_model].getModel(self.staname)
             if fitted_model is not None:
                 # self.model_item = pg.PlotCurveItem(t, fitted_model, pen=pg.mkPen(color='#FF0000', width=2),
                 #                               antialias=True, connect='finite')
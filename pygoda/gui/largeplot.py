@@ -335,6 +335,7 @@ class LargePlot(pg.PlotWidget):
 
     def plot(self):
 
+        cfg.dataset.touchData(self.staname)
         data = cfg.dataset.getData(self.staname)
         self.t = data.t
         self.Z = data.data
@@ -416,7 +417,7 @@ class LargePlot(pg.PlotWidget):
 
         if 'MODELS.' in cfg.displayed_feature:
             _, selected_model, _ = cfg.displayed_feature.split('.')
-            fitted_model = cfg.models[selected_model].fitted_models[self.staname]
+            fitted_model = cfg.models[selected_model].getModel(self.staname)
             if fitted_model is not None:
                 # self.model = pg.PlotCurveItem(t, fitted_model, pen=pg.mkPen(color='#FF0000', width=2),
                 #                               antialias=True, connect='finite')
@@ -149,12 +149,9 @@ class LeafletMapPanel(QtWidgets.QWidget):
             # but wait for the plot signal to update the map.
             # Note: in practice, this signal is received *after*
             # the PLOTTED signal, so it is useless.
-            for sta in self.selected_sta:
-                if sta not in cfg.stalist:
-                    del self.selected_sta[self.selected_sta.index(sta)]
-            for sta in self.hovered_sta:
-                if sta not in cfg.stalist:
-                    del self.hovered_sta[self.hovered_sta.index(sta)]
+            kept = cfg.stations.getMask(cfg.stalist)
+            self.selected_sta = cfg.stations.filterList(self.selected_sta, kept)
+            self.hovered_sta = cfg.stations.filterList(self.hovered_sta, kept)
             return
 
         # The current group of categories has changed
@@ -67,11 +67,28 @@ class ProjectWindow(QtWidgets.QMainWindow):
         # Load the data
         load_params = {'stalist': cfg.stations_list,
                        'nsta_max': cfg.nsta_max}
+        # Features store, also used when filled by batch.py
+        features_cache_path = ''
+        if cfg.features_cache or os.path.isdir(self.project.features_cache_path):
+            features_cache_path = self.project.features_cache_path
         print('Loading the data...')
         cfg.dataset.loadData(load_on_the_fly=cfg.load_on_the_fly,
                              load_nsta=cfg.load_nsta,
+                             load_workers=cfg.load_workers,
+                             cache_path=self.project.cache_path if cfg.data_cache else '',
+                             pack_data=cfg.pack_data,
+                             time_window=self.project.time_window,
+                             lazy_components=cfg.lazy_components,
+                             data_precision=cfg.data_precision,
+                             features_cache_path=features_cache_path,
+                             features_workers=cfg.features_workers,
+                             max_in_memory=cfg.max_in_memory,
+                             max_memory_size=cfg.max_memory_size,
                              **load_params)
 
+        if cfg.load_on_the_fly and cfg.prefetch_pages > 0:
+            cfg.dataset.startPrefetcher()
+
         # Create config shortcuts for CONSTANT data
         cfg.dataset.createConfigShortcuts()
 
@@ -82,6 +99,7 @@ class ProjectWindow(QtWidgets.QMainWindow):
         cfg.sta_category = cfg.sta_category_all.copy()
         cfg.nsta = len(cfg.stalist)
         cfg.plotted_sta = {staname: False for staname in cfg.stalist_all}
+        cfg.plotted_mask = np.zeros(cfg.nsta_all, dtype=bool)
 
         # Set the default data component to display
         #TODO: set that in the project config file
@@ -289,6 +307,7 @@ class ProjectWindow(QtWidgets.QMainWindow):
 
         # Create the controller for signals management (Controller in MVC pattern)
         self.controller = ctl.SignalDispatcher()
+        cfg.features.setProgress(self.showProgress)
 
         # View -> Controller for any interaction
         # Note: the object triggering the signal sometimes update itself first
@@ -322,6 +341,13 @@ class ProjectWindow(QtWidgets.QMainWindow):
         cfg.dataset.data_to_gui.connect(self.sta_map.updateMap)
         cfg.dataset.data_to_gui.connect(self.leaflet_map.updateMap)
 
+        # Live update: look for new epochs in the data files at regular intervals
+        if cfg.live_update > 0:
+            cfg.dataset.watchData()
+            self.live_update_timer = QtCore.QTimer(self)
+            self.live_update_timer.timeout.connect(self.updateData)
+            self.live_update_timer.start(int(cfg.live_update*1000))
+
         # Status bar
         self.status = self.statusBar()
         self.general_info = QtWidgets.QLabel("Pygoda - beta version")
@@ -363,6 +389,12 @@ class ProjectWindow(QtWidgets.QMainWindow):
     #         result = obj.eventFilter(self, event)
     #     return result
 
+    @QtCore.Slot()
+    def updateData(self):
+        stalist = cfg.dataset.updateData()
+        if stalist:
+            cfg.dataset.send({'DATA_UPDATED': stalist})
+
     @QtCore.Slot()
     def updateStatus(self, message_dict):
         if 'main_status' in message_dict:
@@ -372,6 +404,11 @@ class ProjectWindow(QtWidgets.QMainWindow):
         if 'grid_status' in message_dict:
             self.grid_info.setText(message_dict['grid_status'])
 
+    def showProgress(self, task, ndone, ntotal):
+        self.controller.updateStatus(main=f'{task}: {ndone:d}/{ntotal:d} stations')
+        # Computed in the GUI thread: repaint the status bar only
+        QtWidgets.QApplication.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
+
     def setBtnKey(self, btn, group, new_category):
         print('Select category', new_category, 'in', group)
         for category in self.kbd_mouse_actions[btn][group]:
@@ -483,7 +520,14 @@ class ProjectWindow(QtWidgets.QMainWindow):
         export_data.exportAttributes(filepath, cfg.stalist, attrs=['lon', 'lat'], sep=sep)
 
     def exportData(self):
-        pass
+        suggested_output = os.path.join(cfg.basedir, cfg.project_name + '.parquet')
+        types_list = "Parquet file (*.parquet);; Feather file (*.feather);; All files (*)"
+        filepath, ftype = QtWidgets.QFileDialog.getSaveFileName(self, "Export data set",
+                                                                suggested_output,
+                                                                types_list)
+        if not filepath:
+            return
+        export_data.exportParquet(filepath, cfg.stalist)
 
     def readSettings(self):
         settings = QtCore.QSettings("GlobalMass", "Pygoda")
@@ -550,6 +594,10 @@ class ProjectWindow(QtWidgets.QMainWindow):
             dock.close()
         for feature_plot in self.features_plot:
             feature_plot.close()
+        # Worker processes fitting the models, if any
+        cfg.features.setWorkers(1)
+        # Thread loading the data in the background, if any
+        cfg.dataset.stopPrefetcher()
         super().closeEvent(event)
 
     @QtCore.Slot()
@@ -8,6 +8,7 @@ import strictyaml as yaml
 
 import config as cfg
 import constants as cst
+from tools import datetime_tools
 
 class Projects():
 
@@ -85,6 +86,8 @@ class Project():
         self.project_filepath = filepath # project file location
         self.basedir = '' # base directory of the project
         self.cat_lists_path = '' # where category lists are stored
+        self.cache_path = '' # where the data cache is stored (if enabled)
+        self.features_cache_path = '' # where the computed features are stored
         self.data_path = '' # data directory
         self.data_desc_filepath = '' # data description file
         self.stations_filepath = '' # station list file
@@ -115,6 +118,7 @@ class Project():
         self.data_desc = ''
         self.stations = []
         self.nsta_max = 0
+        self.time_window = None
 
         self.config = None
 
@@ -137,6 +141,9 @@ class Project():
         self.basedir = self.project.get('basedir', self.project_path)
         self.cat_lists_path = os.path.join(self.basedir, self.name + '_lists')
         os.makedirs(self.cat_lists_path, exist_ok=True)
+        self.cache_path = os.path.join(self.basedir, self.name + '_cache')
+        # Features computed in previous sessions or in batch mode (see batch.py)
+        self.features_cache_path = os.path.join(self.cat_lists_path, 'features_cache')
 
         self.data_path = self.project['DATA']['path']
         if not os.path.isabs(self.data_path):
@@ -169,6 +176,17 @@ class Project():
         # which depend on the parameters in PERFORMANCES section!
         self.nsta_max = int(self.project['DATA'].get('nsta_max', 0))
 
+        # Only the epochs in this date range are loaded, e.g. '2015, 2020-06' or
+        # a block sequence of the two dates,
+        # either date can be left empty (end date included)
+        self.time_window = None
+        if time_window := self.project['DATA'].get('time_window', []):
+            if isinstance(time_window, str):
+                time_window = time_window.split(',')
+            start, end = (list(time_window) + ['', ''])[:2]
+            self.time_window = datetime_tools.dates2timerange(start.strip(),
+                                                              end.strip())
+
         if 'CONFIG' in self.project:
 
             # Project file which can contain both additional config and themes.
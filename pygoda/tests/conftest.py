@@ -0,0 +1,11 @@
+# coding: utf-8
+
+# Like pygoda.py, the modules are imported from the pygoda.py folder and
+# read their descriptors (datasets/*.yaml) relative to it
+
+import os
+import sys
+
+PYGODA_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYGODA_PATH)
+os.chdir(PYGODA_PATH)
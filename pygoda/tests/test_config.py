@@ -0,0 +1,46 @@
+# coding: utf-8
+
+import pytest
+
+pytest.importorskip('cartopy')
+pytest.importorskip('strictyaml')
+
+import config
+import constants as cst
+
+
+def load_config(tmp_path, text):
+
+    config_file = tmp_path / 'project.yaml'
+    config_file.write_text(text)
+    project_config = config.ProjectConfiguration([cst.DEFAULT_CONFIG_FILE, str(config_file)])
+    for config_filepath in project_config.config_filepaths:
+        project_config._updateConfig(config_filepath)
+
+    return project_config
+
+
+def test_performances_defaults(tmp_path):
+    project_config = load_config(tmp_path, 'PERFORMANCES:\n  load_nsta: 60\n')
+
+    assert project_config.load_nsta == 60
+    assert project_config.data_cache is False
+    assert project_config.pack_data is False
+    assert project_config.lazy_components is False
+    assert project_config.features_cache is False
+    assert project_config.data_precision == 'double'
+    assert project_config.load_first_page is True
+    assert project_config.load_on_the_fly is False
+
+
+def test_performances(tmp_path):
+    project_config = load_config(tmp_path, 'PERFORMANCES:\n'
+                                           '  data_cache: True\n'
+                                           '  pack_data: true\n'
+                                           '  lazy_components: 1\n'
+                                           '  features_cache: False\n')
+
+    assert project_config.data_cache is True
+    assert project_config.pack_data is True
+    assert project_config.lazy_components is True
+    assert project_config.features_cache is False
@@ -0,0 +1,125 @@
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+from datasets import data_cache
+
+DESC = {'type': 'CSV', 'path': '/data', 'components': ['E', 'N', 'U']}
+
+
+def make_data(seed):
+
+    rng = np.random.default_rng(seed)
+    n = 10 + seed
+    return {'t': np.sort(rng.uniform(0, 1e9, n)),
+            'components': {'U': {'data': rng.normal(size=n),
+                                 'std': rng.uniform(size=n).astype(np.float32)}},
+            'events': [],
+            'empty': np.empty(0),
+            'name': f'S{seed}'}
+
+
+def assert_data_equal(data, expected):
+    np.testing.assert_array_equal(data['t'], expected['t'])
+    for key in ('data', 'std'):
+        np.testing.assert_array_equal(data['components']['U'][key],
+                                      expected['components']['U'][key])
+        assert data['components']['U'][key].dtype == expected['components']['U'][key].dtype
+    assert data['events'] == expected['events']
+    assert data['empty'].shape == (0, )
+    assert data['name'] == expected['name']
+
+
+@pytest.fixture
+def stored(tmp_path):
+
+    data_dict = {sta: make_data(i) for i, sta in enumerate(('A', 'B', 'C'))}
+    fingerprints = {sta: [f'/data/{sta}.csv', 100, 1.5] for sta in data_dict}
+    cache = data_cache.DataCache(str(tmp_path))
+    cache.open(DESC)
+    cache.putData(data_dict, fingerprints)
+
+    return cache, data_dict, fingerprints
+
+
+def test_round_trip(stored):
+    cache, data_dict, fingerprints = stored
+
+    data = cache.getData(list(data_dict), fingerprints)
+    assert list(data) == list(data_dict)
+    for sta in data_dict:
+        assert_data_equal(data[sta], data_dict[sta])
+
+
+def test_reopen(stored, tmp_path):
+    _, data_dict, fingerprints = stored
+
+    cache = data_cache.DataCache(str(tmp_path))
+    cache.open(DESC)
+    data = cache.getData(list(data_dict), fingerprints)
+    for sta in data_dict:
+        assert_data_equal(data[sta], data_dict[sta])
+
+
+def test_changed_fingerprint(stored, tmp_path):
+    _, data_dict, fingerprints = stored
+
+    # Only the modified file is stale, also after reopening
+    fingerprints = dict(fingerprints, B=['/data/B.csv', 120, 2.5])
+    for cache in (stored[0], data_cache.DataCache(str(tmp_path))):
+        cache.open(DESC)
+        assert sorted(cache.getData(list(data_dict), fingerprints)) == ['A', 'C']
+
+
+def test_changed_descriptor(stored, tmp_path):
+    _, data_dict, fingerprints = stored
+
+    cache = data_cache.DataCache(str(tmp_path))
+    cache.open(dict(DESC, components=['U']))
+    assert cache.getData(list(data_dict), fingerprints) == dict()
+    assert cache.getMetadata(list(data_dict), fingerprints)[1] == list(data_dict)
+
+    # The previous store is gone
+    cache.open(DESC)
+    assert cache.getData(list(data_dict), fingerprints) == dict()
+
+
+def test_modified_in_place(stored):
+    cache, data_dict, fingerprints = stored
+
+    data = cache.getData(['A'], fingerprints)
+    data['A']['t'][:] = 0
+    data['A']['components']['U']['data'] += 1
+
+    # Neither the next read nor the file see the changes
+    assert_data_equal(cache.getData(['A'], fingerprints)['A'], data_dict['A'])
+    cache.open(DESC)
+    assert_data_equal(cache.getData(['A'], fingerprints)['A'], data_dict['A'])
+
+
+def test_metadata(stored):
+    cache, data_dict, fingerprints = stored
+
+    # Same sequence as the loaders: only the stale stations are updated
+    stalist = ['A', 'B', 'D']
+    fingerprints = dict(fingerprints, D=['/data/D.csv', 10, 1.0])
+    metadata, stale = cache.getMetadata(stalist, fingerprints)
+    assert stale == ['D']
+    assert np.all(np.isnan(metadata)) # data stored without metadata
+
+    cache.putMetadata(stale, fingerprints, np.array([[1.0], [2.0], [3.0]]))
+    metadata, stale = cache.getMetadata(stalist, fingerprints)
+    assert stale == []
+    np.testing.assert_array_equal(metadata[:, 2], [1.0, 2.0, 3.0])
+    assert sorted(cache.getData(stalist, fingerprints)) == ['A', 'B']
+
+    # Outdated station: the data stored before are stale
+    fingerprints = dict(fingerprints, A=['/data/A.csv', 200, 3.0])
+    metadata, stale = cache.getMetadata(stalist, fingerprints)
+    assert stale == ['A']
+    cache.putMetadata(stale, fingerprints, np.array([[4.0], [5.0], [6.0]]))
+    metadata, stale = cache.getMetadata(stalist, fingerprints)
+    assert stale == []
+    np.testing.assert_array_equal(metadata[:, 0], [4.0, 5.0, 6.0])
+    assert sorted(cache.getData(stalist, fingerprints)) == ['B']
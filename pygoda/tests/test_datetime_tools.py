@@ -0,0 +1,106 @@
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+from tools import datetime_tools
+
+Y2000 = 946684800 # 2000-01-01 00:00:00 UTC
+
+
+@pytest.mark.parametrize('units, origin', [
+    ('days since 2000-01-01', Y2000),
+    ('days since 2000-1-1', Y2000),
+    ('days since 2000-01-01 00:00:00', Y2000),
+    ('days since 2000-01-01 00:00:00 UTC', Y2000),
+    ('days since 2000-01-01 UTC', Y2000),
+    ('days since 2000-1-1 0:0:0', Y2000),
+    ('days since 2000-01-01T00:00:00Z', Y2000),
+    ('days since 2000-01-01T00:00:00', Y2000),
+    ('days since 2000-01-01 00:00:00.0', Y2000),
+    ('days since 2000-01-01 12:30:00', Y2000 + 45000),
+    ('days since 2000-01-01 00:00:00 +01:00', Y2000 - 3600),
+    ('days since 2000-01-01 00:00:00 -2', Y2000 + 7200),
+    ('days since 2000-01-01 0:0:0 0', Y2000),
+])
+def test_cftime2timestamp_origins(units, origin):
+    values = np.array([0.0, 1.5, np.nan])
+    timestamps = datetime_tools.cftime2timestamp(values, units)
+    np.testing.assert_array_equal(timestamps, [origin, origin + 1.5*86400, np.nan])
+
+
+def test_cftime2timestamp_units():
+    assert datetime_tools.cftime2timestamp(2, 'hours since 1970-01-01') == 7200
+    assert datetime_tools.cftime2timestamp(2, 'seconds since 1970-1-1 00:00:00 UTC') == 2
+
+
+@pytest.mark.parametrize('units, calendar', [
+    ('days after 2000-01-01', 'standard'),
+    ('weeks since 2000-01-01', 'standard'),
+    ('days since 01/01/2000', 'standard'),
+    ('days since 2000-01-01 00:00:00 CET', 'standard'),
+    ('days since 2000-01-01', 'noleap'),
+])
+def test_cftime2timestamp_invalid(units, calendar):
+    with pytest.raises(ValueError):
+        datetime_tools.cftime2timestamp([0.0], units, calendar)
+
+
+@pytest.fixture
+def formula_backend(monkeypatch):
+    # Closed form, no decyr.txt needed
+    monkeypatch.setattr(datetime_tools, 'DECYR_BACKEND', 'formula')
+
+
+@pytest.fixture(scope='module')
+def ngl_days():
+    # Days listed in the NGL decyr.txt file
+    days = np.arange(np.datetime64('1990-01-01'), np.datetime64('2030-01-01'))
+    return np.char.replace(np.datetime_as_string(days), '-', '')
+
+
+@pytest.mark.parametrize('ymd, decyr', [
+    ('19920101', 1992.0),
+    ('19920102', 1992.0027),
+    ('19930101', 1993.0021),
+    ('19940101', 1994.0014),
+    ('19950101', 1995.0007),
+    ('19960101', 1996.0),
+    ('20000101', 2000.0),
+])
+def test_decyr_ngl_values(formula_backend, ymd, decyr):
+    assert datetime_tools.ymd2decyr_NGL(ymd) == decyr
+    assert datetime_tools.decyr2ymd(decyr) == ymd
+
+
+def test_decyr_round_trip(formula_backend, ngl_days):
+    decyr = datetime_tools.ymd2decyr_NGL(ngl_days)
+    np.testing.assert_array_equal(datetime_tools.decyr2ymd(decyr), ngl_days)
+
+    # Same days as the per-date conversion (up to the rounding of the 4th decimal)
+    expected = np.array([datetime_tools.ymd2decyr(ymd) for ymd in ngl_days])
+    np.testing.assert_allclose(decyr, expected, rtol=0, atol=1e-4 + 1e-9)
+
+    # Timestamps at noon
+    timestamps = datetime_tools.decyr2timestamp(decyr)
+    np.testing.assert_array_equal(timestamps % 86400, 43200)
+    np.testing.assert_array_equal(datetime_tools.timestamp2decyr(timestamps), decyr)
+    np.testing.assert_array_equal(datetime_tools.timestamp2decyr(timestamps - 43200), decyr)
+
+
+def test_decyr_not_precise(formula_backend, ngl_days):
+    decyr = datetime_tools.ymd2decyr_NGL(ngl_days)
+    shifted = decyr + np.where(np.arange(len(decyr)) % 2, 5e-4, -5e-4)
+    np.testing.assert_array_equal(datetime_tools.decyr2ymd(shifted, precise=False), ngl_days)
+
+    with pytest.raises(ValueError):
+        datetime_tools.decyr2timestamp(shifted)
+
+
+def test_get_all_decyr(formula_backend, ngl_days):
+    all_decyr = datetime_tools.get_all_decyr()
+
+    # All the days of decyr.txt, last one included
+    decyr = datetime_tools.ymd2decyr_NGL(np.append(ngl_days, '20300101'))
+    assert all_decyr == [f'{d:09.4f}' for d in decyr]
+    assert datetime_tools.decyr2ymd(all_decyr[-1]) == '20300101'
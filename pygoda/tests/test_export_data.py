@@ -0,0 +1,83 @@
+# coding: utf-8
+
+import contextlib
+import copy
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('cartopy')
+pytest.importorskip('h5py')
+pytest.importorskip('pyarrow')
+
+from benchmarks import synthetic_data
+from datasets import export_data
+from datasets import load_data
+
+LONG_TABLE_DESC = {
+    'FILE_TYPE': 'BINARY',
+    'DATA_SPEC': 'LONG_TABLE',
+    'VERSION': '1.0',
+    'MAPPING': {'LONGITUDE': 'lon', 'LATITUDE': 'lat',
+                'ELEVATION': 'h', 'TIME': 't', 'STATION': 'station'},
+    'ATTRIBUTES': {'lon': {'name': 'Longitude', 'unit': 'deg', 'accuracy': '1e-2'},
+                   'lat': {'name': 'Latitude', 'unit': 'deg', 'accuracy': '1e-2'},
+                   'h': {'name': 'Elevation', 'unit': 'm', 'accuracy': '1e-3'}},
+    'VARIABLES': {'t': {'name': 'Time vector'}},
+    'COMPONENTS': {'Z': {'name': 'Vertical land motion', 'unit': 'mm',
+                         'accuracy': '1e-2', 'std': 'stdZ'}},
+}
+
+
+def make_loader(data_path, data_desc, time_window=None):
+
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        loader = load_data.LoaderInterface(data_desc).getLoader()
+        if time_window is not None:
+            loader.setTimeWindow(time_window)
+        loader.configureLoader(data_path)
+
+    return loader
+
+
+def load(loader):
+
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        return loader.loadBatchData(loader.stalist)
+
+
+@pytest.mark.parametrize('suffix, data_type', [('.parquet', 'PARQUET'),
+                                               ('.feather', 'FEATHER')])
+def test_export_reload(tmp_path, monkeypatch, suffix, data_type):
+    source = make_loader(*synthetic_data.generate_dataset(str(tmp_path), 'csv', 6))
+    expected = load(source)
+    monkeypatch.setattr(export_data.cfg, 'data', source.timeseries_dict, raising=False)
+
+    # Several row groups, each station in the order of the list
+    stalist = source.stalist[::-1]
+    filepath = str(tmp_path / ('export' + suffix))
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        export_data.exportParquet(filepath, stalist, row_group_size=2000)
+
+    data_desc = dict(LONG_TABLE_DESC, DATA_TYPE=data_type)
+    loader = make_loader(filepath, copy.deepcopy(data_desc))
+    assert loader.stalist == stalist
+    np.testing.assert_array_equal(loader.sta_lon, [source.sta_lon[source.stalist.index(sta)]
+                                                   for sta in stalist])
+    data = load(loader)
+    for sta in stalist:
+        np.testing.assert_array_equal(data[sta]['t']['data'], expected[sta]['t']['data'])
+        for key in ('data', 'std'):
+            np.testing.assert_array_equal(data[sta]['components']['Z'][key],
+                                          expected[sta]['components']['Z'][key])
+
+    # Only the epochs in the time window
+    tmin, tmax = 1.2e9, 1.3e9
+    data = load(make_loader(filepath, copy.deepcopy(data_desc), time_window=(tmin, tmax)))
+    for sta in stalist:
+        t = expected[sta]['t']['data']
+        keep = (t >= tmin) & (t < tmax)
+        np.testing.assert_array_equal(data[sta]['t']['data'], t[keep])
+        np.testing.assert_array_equal(data[sta]['components']['Z']['data'],
+                                      expected[sta]['components']['Z']['data'][keep])
@@ -0,0 +1,239 @@
+# coding: utf-8
+
+import contextlib
+import copy
+import os
+
+import numpy as np
+import pytest
+
+from datasets import load_data
+from datasets import loaders_common
+from tools import datetime_tools
+
+CSV = """\
+# Station TEST
+2010-01-01,1.5,0.1
+2010-01-02,-999,0.2
+2010-01-03,,0.3 # no data
+20100104,2.25,-999.0
+
+2010/01/05,3.0,0.5
+"""
+
+COLUMNS = [(0, 't', None), (1, 'U', -999), (2, 'U_std', -999.0)]
+
+CF_DESC = {
+    'FILE_TYPE': 'BINARY',
+    'DATA_TYPE': 'NETCDF4',
+    'DATA_SPEC': 'CF_TIMESERIES',
+    'VERSION': '1.0',
+    'MAPPING': {'LONGITUDE': 'lon', 'LATITUDE': 'lat',
+                'ELEVATION': 'h', 'TIME': 'time'},
+    'ATTRIBUTES': {'lon': {'name': 'Longitude', 'unit': 'deg', 'accuracy': '1e-2'},
+                   'lat': {'name': 'Latitude', 'unit': 'deg', 'accuracy': '1e-2'},
+                   'h': {'name': 'Elevation', 'unit': 'm', 'accuracy': '1e-3'}},
+    'VARIABLES': {'time': {'name': 'Time vector'}},
+    'COMPONENTS': {'U': {'name': 'Up', 'unit': 'mm', 'accuracy': '1e-2', 'std': 'U_std'}},
+}
+
+CF_EPOCHS = 1262347200 + 86400*np.arange(200.0) # daily from 2010-01-01 12:00
+
+
+def read_baseline(csvpath):
+
+    # Previous reader (np.genfromtxt and per-row dates)
+    csv_data = np.genfromtxt(csvpath, encoding='ascii', delimiter=',',
+                             dtype=[('t', '|S10'), ('U', float), ('U_std', float)],
+                             missing_values=[None, -999, -999.0])
+    dates = [date.decode('ascii').replace('-', '').replace('/', '')
+             for date in csv_data['t']]
+    t = datetime_tools.datetime2timestamp(datetime_tools.ymd2datetime(dates))
+    values = {name: np.where(csv_data[name] == -999, np.nan, csv_data[name])
+              for name in ('U', 'U_std')}
+
+    return t, values
+
+
+def test_read_csv_columns(tmp_path):
+    csvpath = tmp_path / 'TEST.csv'
+    csvpath.write_text(CSV)
+
+    csv_data, nrows, end = loaders_common.read_csv_columns(csvpath, COLUMNS, time_field='t')
+    t = loaders_common.csv_dates2timestamp(csv_data['t'])
+
+    t_expected, expected = read_baseline(csvpath)
+    assert nrows == len(t_expected) == 5
+    assert end == len(CSV)
+    np.testing.assert_array_equal(t, t_expected)
+    for name in ('U', 'U_std'):
+        np.testing.assert_array_equal(csv_data[name], expected[name])
+
+
+def test_read_csv_header(tmp_path):
+    csvpath = tmp_path / 'TEST.csv'
+    csvpath.write_text('date;U;U_std\n01/02/2010;1.0;0.1\n28/02/2012;2.0;0.2\n')
+
+    csv_data, nrows, _ = loaders_common.read_csv_columns(csvpath, COLUMNS, time_field='t',
+                                                         delimiter=';', column_header=True)
+    t = loaders_common.csv_dates2timestamp(csv_data['t'], 'DD/MM/YYYY')
+
+    assert nrows == 2
+    np.testing.assert_array_equal(t, datetime_tools.datetime2timestamp(
+        datetime_tools.ymd2datetime(['20100201', '20120228'])))
+    np.testing.assert_array_equal(csv_data['U'], [1.0, 2.0])
+
+
+def test_read_csv_empty(tmp_path):
+    csvpath = tmp_path / 'TEST.csv'
+    csvpath.write_text('# no data\n\n')
+
+    assert loaders_common.read_csv_columns(csvpath, COLUMNS, time_field='t') == (dict(), 0, 11)
+
+
+def test_read_csv_appended(tmp_path):
+    csvpath = tmp_path / 'TEST.csv'
+    csvpath.write_text(CSV)
+    _, _, end = loaders_common.read_csv_columns(csvpath, COLUMNS, time_field='t')
+
+    # Only the complete lines appended since the last read
+    with open(csvpath, 'a') as f:
+        f.write('2010-01-06,4.0,0.6\n2010-01-0')
+    csv_data, nrows, end = loaders_common.read_csv_columns(
+        csvpath, COLUMNS, time_field='t', offset=end,
+        time_converter=loaders_common.csv_dates2timestamp)
+
+    assert nrows == 1
+    assert end == len(CSV) + 19
+    np.testing.assert_array_equal(csv_data['t'], datetime_tools.datetime2timestamp(
+        datetime_tools.ymd2datetime(['20100106'])))
+    np.testing.assert_array_equal(csv_data['U'], [4.0])
+
+
+@pytest.mark.parametrize('dates, date_format', [
+    (['2015-02-29'], ''),
+    (['2015-13-01'], ''),
+    (['2015-0A-01'], ''),
+    (['01/02/2010'], 'YYYY-MM-DD'),
+])
+def test_csv_dates_invalid(dates, date_format):
+    with pytest.raises(ValueError):
+        loaders_common.csv_dates2timestamp(np.array(dates, dtype=bytes), date_format)
+
+
+def make_cf_series(nsta=5, seed=0):
+
+    # Epochs (subset of CF_EPOCHS), U and U_std of each station
+    rng = np.random.default_rng(seed)
+    series = []
+    for _ in range(nsta):
+        start, stop = np.sort(rng.choice(len(CF_EPOCHS) + 1, size=2, replace=False))
+        columns = np.arange(start, stop)
+        columns = columns[rng.random(len(columns)) > 0.1]
+        U = rng.normal(size=len(columns))
+        U[rng.random(len(columns)) < 0.05] = np.nan
+        series.append((columns, U, rng.uniform(0.5, 1, len(columns))))
+
+    return series
+
+
+def write_cf_netcdf(ncpath, layout, series):
+
+    netCDF4 = pytest.importorskip('netCDF4')
+    nsta = len(series)
+    with netCDF4.Dataset(ncpath, 'w') as ncf:
+        ncf.featureType = 'timeSeries'
+        ncf.createDimension('station', nsta)
+        station = ncf.createVariable('station', str, ('station', ))
+        station.cf_role = 'timeseries_id'
+        for ista in range(nsta):
+            station[ista] = f'S{ista:03d}'
+        for ista, name in enumerate(('lon', 'lat', 'h')):
+            ncf.createVariable(name, 'f8', ('station', ))[:] = np.arange(nsta) + ista
+
+        if layout == 'orthogonal':
+            ncf.createDimension('time', len(CF_EPOCHS))
+            dims, time_dims = ('station', 'time'), ('time', )
+        elif layout == 'incomplete':
+            ncf.createDimension('obs', max(len(columns) for columns, _, _ in series))
+            dims = time_dims = ('station', 'obs')
+        else:
+            ncf.createDimension('obs', sum(len(columns) for columns, _, _ in series))
+            dims = time_dims = ('obs', )
+            row_size = ncf.createVariable('row_size', 'i4', ('station', ))
+            row_size.sample_dimension = 'obs'
+            row_size[:] = [len(columns) for columns, _, _ in series]
+        time = ncf.createVariable('time', 'f8', time_dims, fill_value=np.nan)
+        time.units = 'seconds since 1970-01-01'
+        variables = [ncf.createVariable(name, 'f8', dims, fill_value=np.nan)
+                     for name in ('U', 'U_std')]
+
+        if layout == 'orthogonal':
+            time[:] = CF_EPOCHS
+        obs = 0
+        for ista, (columns, *values) in enumerate(series):
+            if layout == 'orthogonal':
+                for var, value in zip(variables, values):
+                    var[ista, columns] = value
+            elif layout == 'incomplete':
+                time[ista, :len(columns)] = CF_EPOCHS[columns]
+                for var, value in zip(variables, values):
+                    var[ista, :len(columns)] = value
+            else:
+                time[obs:obs + len(columns)] = CF_EPOCHS[columns]
+                for var, value in zip(variables, values):
+                    var[obs:obs + len(columns)] = value
+                obs += len(columns)
+
+
+def load_cf(ncpath, stalist, time_window=None):
+
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        loader = load_data.LoaderInterface(copy.deepcopy(CF_DESC)).getLoader()
+        if time_window is not None:
+            loader.setTimeWindow(time_window)
+        loader.configureLoader(ncpath, stalist)
+        data = loader.loadBatchData(loader.stalist)
+
+    positions = [(loader.sta_lon[i], loader.sta_lat[i], loader.sta_h[i])
+                 for i in range(len(loader.stalist))]
+
+    return data, positions
+
+
+@pytest.mark.parametrize('layout', ['orthogonal', 'incomplete', 'contiguous'])
+def test_cf_timeseries(tmp_path, layout):
+    series = make_cf_series()
+    ncpath = str(tmp_path / f'{layout}.nc')
+    write_cf_netcdf(ncpath, layout, series)
+
+    stalist = ['S003', 'S000', 'S004', 'S001']
+    data, positions = load_cf(ncpath, stalist)
+    assert list(data) == stalist
+    assert positions == [(3, 4, 5), (0, 1, 2), (4, 5, 6), (1, 2, 3)]
+    for sta in stalist:
+        columns, U, U_std = series[int(sta[1:])]
+        t = data[sta]['t']['data']
+        comp = data[sta]['components']['U']
+        if layout == 'orthogonal':
+            # Common time vector, no data (NaN) for the other epochs
+            np.testing.assert_array_equal(t, CF_EPOCHS)
+            missing = np.ones(len(CF_EPOCHS), dtype=bool)
+            missing[columns] = False
+            assert np.all(np.isnan(comp['data'][missing]))
+            assert np.all(np.isnan(comp['std'][missing]))
+            t, comp = t[columns], {key: comp[key][columns] for key in ('data', 'std')}
+        np.testing.assert_array_equal(t, CF_EPOCHS[columns])
+        np.testing.assert_array_equal(comp['data'], U)
+        np.testing.assert_array_equal(comp['std'], U_std)
+
+    # Only the epochs in the time window are read
+    tmin, tmax = CF_EPOCHS[50] - 3600, CF_EPOCHS[150]
+    windowed, _ = load_cf(ncpath, stalist, time_window=(tmin, tmax))
+    for sta in stalist:
+        t = data[sta]['t']['data']
+        keep = (t >= tmin) & (t < tmax)
+        np.testing.assert_array_equal(windowed[sta]['t']['data'], t[keep])
+        for key in ('data', 'std'):
+            np.testing.assert_array_equal(windowed[sta]['components']['U'][key],
+                                          data[sta]['components']['U'][key][keep])
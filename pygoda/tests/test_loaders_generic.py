@@ -0,0 +1,206 @@
+# coding: utf-8
+
+import collections.abc
+import contextlib
+import glob
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('h5py')
+
+from benchmarks import synthetic_data
+from datasets import data_cache
+from datasets import load_data
+
+NSTA = 6
+
+
+@pytest.fixture(scope='module')
+def data_dir(tmp_path_factory):
+
+    return str(tmp_path_factory.mktemp('synthetic'))
+
+
+def get_dataset(data_dir, data_format, components=False):
+
+    # Data path and descriptor of a small synthetic dataset, with a second
+    # component ATM (HDF5) or N (CSV, some missing values) if requested
+    data_path, data_desc = synthetic_data.generate_dataset(data_dir, data_format, NSTA)
+    if components and data_format == 'hdf5':
+        data_desc['COMPONENTS']['ATM'] = {'name': 'Atmospheric loading', 'unit': 'mm',
+                                          'accuracy': '1e-2', 'field': 'atm'}
+    elif components:
+        csv_dir = os.path.join(data_dir, 'components_csv')
+        os.makedirs(csv_dir, exist_ok=True)
+        for csvpath in glob.glob(data_path):
+            with open(csvpath) as f:
+                lines = f.read().splitlines()
+            for i, line in enumerate(lines):
+                if line == 'date,Z,stdZ':
+                    lines[i] = line + ',N'
+                elif not line.startswith('#'):
+                    lines[i] = line + (',' if i % 10 == 0 else f',{0.25*i:.2f}')
+            with open(os.path.join(csv_dir, os.path.basename(csvpath)), mode='w') as f:
+                f.write('\n'.join(lines) + '\n')
+        data_path = os.path.join(csv_dir, '*.csv')
+        data_desc['COMPONENTS']['N'] = {'name': 'North', 'unit': 'mm',
+                                        'accuracy': '1e-2', 'missing': 'NaN'}
+
+    return data_path, data_desc
+
+
+def make_loader(dataset, cache_path='', **options):
+
+    # Configured loader of a dataset (see get_dataset), options are given
+    # to the set* methods of the loader before configuring it
+    data_path, data_desc = dataset
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        loader = load_data.LoaderInterface(data_desc).getLoader()
+        for name, value in options.items():
+            getattr(loader, 'set' + name[0].upper() + name[1:])(value)
+        if cache_path:
+            loader.setCache(data_cache.DataCache(cache_path))
+        loader.configureLoader(data_path)
+
+    return loader
+
+
+def load(loader, stalist=None):
+
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        return loader.loadBatchData(stalist or loader.stalist)
+
+
+def assert_data_equal(data, expected):
+
+    # Same nested dicts, same arrays (values and dtypes)
+    if isinstance(expected, collections.abc.Mapping): # dict, ChainMap
+        assert sorted(data) == sorted(expected)
+        for key in expected:
+            assert_data_equal(data[key], expected[key])
+    elif isinstance(expected, list):
+        assert len(data) == len(expected)
+        for value, expected_value in zip(data, expected):
+            assert_data_equal(value, expected_value)
+    elif isinstance(expected, np.ndarray):
+        assert isinstance(data, np.ndarray)
+        assert data.dtype == expected.dtype
+        np.testing.assert_array_equal(data, expected)
+    elif isinstance(expected, float) and np.isnan(expected):
+        assert np.isnan(data)
+    else:
+        assert data == expected
+
+
+@pytest.mark.parametrize('data_format', ['csv', 'hdf5'])
+def test_cached_load(data_dir, data_format, tmp_path):
+    expected = load(make_loader(get_dataset(data_dir, data_format)))
+
+    # Metadata and data read from the files, then from the cache
+    for _ in range(2):
+        loader = make_loader(get_dataset(data_dir, data_format), cache_path=str(tmp_path))
+        assert loader.stalist == list(expected)
+        assert_data_equal(load(loader), expected)
+        assert_data_equal(load(loader, loader.stalist[::-2]),
+                          {sta: expected[sta] for sta in loader.stalist[::-2]})
+
+
+@pytest.mark.parametrize('data_format', ['csv', 'hdf5'])
+def test_time_window(data_dir, data_format):
+    expected = load(make_loader(get_dataset(data_dir, data_format)))
+    tmin, tmax = 1.2e9, 1.3e9
+
+    data = load(make_loader(get_dataset(data_dir, data_format), timeWindow=(tmin, tmax)))
+    for sta in expected:
+        t = expected[sta]['t']['data']
+        keep = (t >= tmin) & (t < tmax)
+        np.testing.assert_array_equal(data[sta]['t']['data'], t[keep])
+        for key in ('data', 'std'):
+            np.testing.assert_array_equal(data[sta]['components']['Z'][key],
+                                          expected[sta]['components']['Z'][key][keep])
+
+
+@pytest.mark.parametrize('data_format', ['csv', 'hdf5'])
+def test_empty_time_window(data_dir, data_format):
+    # Before the first epoch of all the stations
+    loader = make_loader(get_dataset(data_dir, data_format), timeWindow=(0, synthetic_data.T0))
+
+    for sta, data in load(loader).items():
+        assert len(data['t']['data']) == 0
+        for key in ('data', 'std'):
+            assert len(data['components']['Z'][key]) == 0
+
+    # Loaded once, even if empty
+    ts = loader.timeseries_dict[loader.stalist[0]]
+    calls = []
+    station_loader = ts.loader
+    ts.loader = lambda: calls.append(ts.name) or station_loader()
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        assert len(ts.t) == len(ts.data) == len(ts.std_data) == 0
+    assert ts.isLoaded()
+    assert calls == [ts.name]
+
+
+@pytest.mark.parametrize('data_format', ['csv', 'hdf5'])
+def test_lazy_components(data_dir, data_format):
+    dataset = get_dataset(data_dir, data_format, components=True)
+    expected = load(make_loader(dataset))
+    other = 'ATM' if data_format == 'hdf5' else 'N'
+    assert sorted(expected[sorted(expected)[0]]['components']) == sorted(['Z', other])
+
+    # Main component only, the other one read when requested
+    loader = make_loader(get_dataset(data_dir, data_format, components=True),
+                         lazyComponents=True)
+    data = load(loader)
+    for sta in expected:
+        assert 'data' not in data[sta]['components'][other] # description only
+        assert_data_equal(data[sta]['components']['Z'], expected[sta]['components']['Z'])
+        np.testing.assert_array_equal(data[sta]['t']['data'], expected[sta]['t']['data'])
+
+    stalist = loader.stalist[1::2]
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        data = loader.loadComponentsData(stalist, [other])
+    assert sorted(data) == sorted(stalist)
+    for sta in stalist:
+        assert 'data' not in data[sta]['components']['Z']
+        assert_data_equal(data[sta]['components'][other], expected[sta]['components'][other])
+
+    # Through the time series
+    ts = loader.timeseries_dict[loader.stalist[0]]
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        np.testing.assert_array_equal(ts.t, expected[ts.name]['t']['data'])
+        assert ts.missing_components == {other}
+        comp = ts.getComponent(other)
+    assert ts.missing_components == set()
+    np.testing.assert_array_equal(comp, expected[ts.name]['components'][other]['data'])
+    np.testing.assert_array_equal(ts.getComponent('Z'),
+                                  expected[ts.name]['components']['Z']['data'])
+
+
+@pytest.mark.parametrize('data_format', ['csv', 'hdf5'])
+def test_single_precision(data_dir, data_format, tmp_path):
+    expected = load(make_loader(get_dataset(data_dir, data_format)))
+
+    # Read from the files, then from the cache
+    for _ in range(2):
+        loader = make_loader(get_dataset(data_dir, data_format), cache_path=str(tmp_path),
+                             dataPrecision='single')
+        data = load(loader)
+        for sta in expected:
+            assert_data_equal(data[sta]['t'], expected[sta]['t']) # float64
+            for name, comp in expected[sta]['components'].items():
+                for key in ('data', 'std'):
+                    assert_data_equal(data[sta]['components'][name][key],
+                                      comp[key].astype(np.float32))
+                for grp_name, grp_corr in comp.get('corrections', dict()).items():
+                    for corr_name, corr in grp_corr.items():
+                        assert_data_equal(
+                            data[sta]['components'][name]['corrections'][grp_name][corr_name]['data'],
+                            corr['data'].astype(np.float32))
+
+
+def test_data_precision_invalid(data_dir):
+    with pytest.raises(ValueError):
+        make_loader(get_dataset(data_dir, 'csv'), dataPrecision='half')
@@ -0,0 +1,72 @@
+# coding: utf-8
+
+import types
+
+import numpy as np
+import pytest
+
+from datasets import fit_data
+from datasets import timeseries
+
+
+class StationsDict(dict):
+
+    # Minimal data set, keeping track of the stations read
+
+    def __init__(self, series):
+        super().__init__(series)
+        self.read = set()
+
+    def __getitem__(self, sta):
+        self.read.add(sta)
+        return super().__getitem__(sta)
+
+    def getStationsList(self):
+        return list(self.keys())
+
+
+def make_dataset(seed=0, nsta=8):
+
+    rng = np.random.default_rng(seed)
+    series = dict()
+    for ista in range(nsta):
+        n = int(rng.integers(50, 200))
+        t = np.sort(rng.uniform(0, 3e8, n)).round()
+        data = 1e-8*t + np.sin(2e-7*t) + rng.normal(size=n)
+        std = rng.uniform(0.5, 1, n)
+        series[f'S{ista:03d}'] = types.SimpleNamespace(
+            t=t, data=timeseries.TSComponent(data, std=std))
+
+    return StationsDict(series)
+
+
+@pytest.mark.parametrize('name', ['LINEAR', 'SEASONAL_LINEAR'])
+def test_get_model(name):
+    expected = fit_data.timeseries_models[name](make_dataset())
+    expected.fitModel()
+
+    # Fitted when first requested, only this station is read
+    dataset = make_dataset()
+    model = fit_data.timeseries_models[name](dataset)
+    for sta in ('S003', 'S005'):
+        np.testing.assert_allclose(model.getModel(sta), expected.fitted_models[sta])
+        assert model.fitted_metaparams[sta] == pytest.approx(expected.fitted_metaparams[sta])
+    assert dataset.read == {'S003', 'S005'}
+
+    fitted_model = model.getModel('S003')
+    assert model.getModel('S003') is fitted_model # not fitted again
+
+
+def test_fit_subset():
+    dataset = make_dataset()
+    model = fit_data.timeseries_models['LINEAR'](dataset)
+    model.fitModel(['S001', 'S002'])
+
+    assert dataset.read == {'S001', 'S002'}
+    assert model.fitted_models['S000'] is None
+    assert model.fitted_metaparams['S001']
+
+    # Data changed: fitted again when requested
+    model.invalidate(['S001'])
+    assert model.fitted_models['S001'] is None
+    assert len(model.getModel('S001')) == len(dataset['S001'].t)
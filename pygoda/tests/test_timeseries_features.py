@@ -0,0 +1,134 @@
+# coding: utf-8
+
+import types
+import warnings
+
+import numpy as np
+import pytest
+
+from datasets import timeseries_features
+
+
+class StationsDict(dict):
+
+    # Minimal data set: the features only need the list of stations
+
+    def getStationsList(self):
+        return list(self.keys())
+
+
+def make_series(seed=0, nsta=200):
+
+    # Short series with NaN, constant std, single and empty epochs
+    rng = np.random.default_rng(seed)
+    series = dict()
+    for ista in range(nsta):
+        n = int(rng.integers(1, 40))
+        t = np.sort(rng.uniform(0, 1e9, n)).round()
+        data = rng.normal(size=n)
+        data[rng.random(n) < 0.2] = np.nan
+        if ista % 37 == 0:
+            data[:] = np.nan
+        std = rng.uniform(0, 1, n) if ista % 5 else 0.0
+        series[f'S{ista:03d}'] = types.SimpleNamespace(t=t, data=data, std_data=std)
+
+    return StationsDict(series)
+
+
+def baseline(function, ts):
+
+    # Per-station function, NaN where it cannot be computed
+    with warnings.catch_warnings(), np.errstate(all='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)
+        try:
+            return float(function(ts))
+        except ValueError:
+            return np.nan
+
+
+@pytest.fixture(scope='module')
+def features():
+
+    series = make_series()
+    return timeseries_features.TimeSeriesFeatures(series, models=dict()), series
+
+
+@pytest.mark.parametrize('feat_id', timeseries_features.PackedFeatures.FEATURES)
+def test_packed_features(features, feat_id):
+    ts_features, series = features
+    packed = timeseries_features.PackedFeatures(list(series.values()))
+    with np.errstate(all='ignore'):
+        values = packed.compute(feat_id)
+
+    expected = [baseline(ts_features.features[feat_id], ts) for ts in series.values()]
+    np.testing.assert_allclose(values, expected, rtol=1e-12, equal_nan=True)
+
+
+def test_packed_features_no_station():
+    packed = timeseries_features.PackedFeatures([])
+    assert len(packed.compute('DATA.MEDIAN')) == 0
+
+
+class DataSet(StationsDict):
+
+    # Data set keeping track of the stations whose data is used
+
+    packed = None
+
+    def __init__(self, series):
+        super().__init__(series)
+        self.touched = set()
+
+    def touch(self, sta):
+        self.touched.add(sta)
+
+
+class Model():
+
+    # Model without parameters, keeping track of the invalidated stations
+
+    def __init__(self):
+        self.invalidated = []
+
+    def getInfo(self, key):
+        return []
+
+    def invalidate(self, stalist):
+        self.invalidated += list(stalist)
+
+
+def test_invalidate_refresh():
+    dataset = DataSet(make_series(nsta=20))
+    model = Model()
+    ts_features = timeseries_features.TimeSeriesFeatures(dataset, models={'LINEAR': model})
+    ids = {sta: ista for ista, sta in enumerate(ts_features.stalist)}
+    with np.errstate(all='ignore'):
+        median = ts_features.getValues('DATA.MEDIAN').copy()
+        sigma = ts_features.getValues('SIGMA.SIGMA_MAX').copy()
+
+    # Data changed for some stations: only the features computed from the
+    # data are dirty, and the models are fitted again
+    stalist = ['S003', 'S011']
+    for sta in stalist:
+        dataset[sta].data = dataset[sta].data + 10
+    dirty = ts_features.invalidate(('DATA', ), stalist)
+    assert dirty == ['DATA.MEDIAN']
+    assert ts_features.isDirty('DATA.MEDIAN')
+    assert not ts_features.isDirty('SIGMA.SIGMA_MAX')
+    assert model.invalidated == stalist
+    assert ts_features.invalidate(('POSITION', )) == []
+
+    # Computed again for these stations only
+    dataset.touched.clear()
+    with np.errstate(all='ignore'):
+        values = ts_features.getValues('DATA.MEDIAN')
+    assert not ts_features.isDirty('DATA.MEDIAN')
+    assert dataset.touched == set(stalist)
+    expected = median.copy()
+    expected[[ids[sta] for sta in stalist]] += 10
+    np.testing.assert_allclose(values, expected, rtol=1e-12, equal_nan=True)
+    np.testing.assert_array_equal(ts_features.getValues('SIGMA.SIGMA_MAX'), sigma)
+
+    # Nothing left to compute
+    ts_features.refresh('DATA.MEDIAN')
+    assert dataset.touched == set(stalist)
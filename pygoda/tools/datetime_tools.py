@@ -6,6 +6,7 @@
 import csv
 import datetime
 import os
+import re
 import shutil
 import time
 import urllib.request
@@ -27,6 +28,34 @@ DECYR_KEYS = list()
 DECYR = np.array([])
 UNIX_EPOCH = np.datetime64(0, 's')
 ONE_SECOND = np.timedelta64(1, 's')
+ONE_DAY = 86400
+# NGL decimal years: 2000.0000 is 2000-01-01 at noon and a year is 365.25 days
+DECYR_EPOCH = 2000
+DECYR_EPOCH_DAY = 10957 # days between 1970-01-01 and 2000-01-01
+DECYR_DAYS_PER_YEAR = 365.25
+DECYR_BACKENDS = ('formula', 'table')
+DECYR_BACKEND = 'formula' # closed form (no file needed) or NGL decyr.txt
+DECYR_RANGE = ('1990-01-01', '2030-01-01') # dates listed in decyr.txt
+# CF time units (seconds) and calendars compatible with numpy datetime64
+CF_UNITS = {'seconds': 1, 'second': 1, 'secs': 1, 'sec': 1, 's': 1,
+            'minutes': 60, 'minute': 60, 'mins': 60, 'min': 60,
+            'hours': 3600, 'hour': 3600, 'hrs': 3600, 'hr': 3600, 'h': 3600,
+            'days': ONE_DAY, 'day': ONE_DAY, 'd': ONE_DAY}
+CF_CALENDARS = ('standard', 'gregorian', 'proleptic_gregorian')
+CF_DATE_T = re.compile(r'^\d{1,4}-\d{1,2}-\d{1,2}T')
+CF_ORIGIN = re.compile(r'^(\d{1,4})-(\d{1,2})-(\d{1,2})'
+                       r'(?:\s+(\d{1,2}):(\d{1,2})(?::(\d{1,2}(?:\.\d*)?))?)?'
+                       r'\s*(Z|UTC|GMT|[+-]?\d{1,2}(?::?\d{2})?)?$', re.IGNORECASE)
+
+def set_decyr_backend(backend):
+    """Select how decimal years are converted: 'formula' or 'table'"""
+
+    global DECYR_BACKEND
+
+    if backend not in DECYR_BACKENDS:
+        raise ValueError(f'Unknown decimal year backend {backend}, ' \
+                         f'must be one of {DECYR_BACKENDS}')
+    DECYR_BACKEND = backend
 
 def _init_decyr():
     """Download (if necessary) and load in memory the decimal year file"""
@@ -68,6 +97,20 @@ def _init_decyr():
 #TODO: a little bit slow, need improvement later
 
 def decyr2ymd(decyr_date, precise=True):
+    """Convert from decimal year YYYY.YYYY to YYYYMMDD date string"""
+
+    if DECYR_BACKEND == 'table':
+        return decyr2ymd_NGL(decyr_date, precise=precise)
+
+    days = np.int64(decyr2timestamp(decyr_date, precise=precise)) // ONE_DAY
+    ymd = np.char.replace(np.datetime_as_string(days.astype('datetime64[D]')), '-', '')
+
+    if ymd.ndim == 0:
+        return str(ymd)
+    return ymd
+
+
+def decyr2ymd_NGL(decyr_date, precise=True):
     """Convert from decimal year YYYY.YYYY to YYYYMMDD date string using NGL file"""
 
     global DECYR2YMD, DECYR_KEYS, DECYR
@@ -113,6 +156,37 @@ def decyr2ymd(decyr_date, precise=True):
 
 
 def ymd2decyr_NGL(ymd_date):
+    """Convert a YYYYMMDD date string to decimal year YYYY.YYYY (NGL convention)"""
+
+    if DECYR_BACKEND == 'table':
+        return _ymd2decyr_table(ymd_date)
+
+    return timestamp2decyr(_ymd2days(ymd_date)*ONE_DAY)
+
+def _ymd2days(ymd_date):
+    """Convert YYYYMMDD date strings to days since 1970-01-01"""
+
+    ymd = np.asarray(ymd_date, dtype='U8')
+    try:
+        ymd_int = ymd.astype(np.int64)
+    except ValueError:
+        raise ValueError('The provided date is not a valid YYYYMMDD date.')
+    years, months, days = ymd_int // 10000, ymd_int // 100 % 100, ymd_int % 100
+
+    dates = (years - 1970).astype('datetime64[Y]') + (months - 1).astype('timedelta64[M]')
+    dates = dates.astype('datetime64[D]') + (days - 1).astype('timedelta64[D]')
+
+    # Invalid dates (e.g. 20150229) do not survive the round trip
+    if not np.all(np.char.replace(np.datetime_as_string(dates), '-', '') == ymd):
+        raise ValueError('The provided date is not a valid YYYYMMDD date.')
+
+    dates = dates.astype(np.int64)
+
+    if dates.ndim == 0:
+        return int(dates)
+    return dates
+
+def _ymd2decyr_table(ymd_date):
     """Convert a YYYYMMDD date string to decimal year YYYY.YYYY using NGL file"""
 
     global YMD2DECYR
@@ -186,36 +260,87 @@ def ymd2decyr(ymd_date):
     return np.round(year + fraction + correction, 4)
 
 
+## Decimal year to UNIX timestamp and back (vectorised)
+
+def decyr2timestamp(decyr_date, precise=True):
+    """Convert from decimal year YYYY.YYYY to UNIX timestamp (at noon)"""
+
+    # Closed form of the NGL decyr.txt convention (see ymd2decyr):
+    #   decyr = round(2000 + (day - 2000-01-01)/365.25, 4)
+    # where day is the date (at noon) in days since 1970-01-01.
+    # One day is 0.0027 year so the day is unambiguous with 4 decimals.
+    decyr = np.asarray(decyr_date, dtype=np.float64)
+    days = np.rint((decyr - DECYR_EPOCH)*DECYR_DAYS_PER_YEAR)
+
+    if not precise:
+        # Nearest *rounded* decimal year, as when searching in decyr.txt
+        # (the earliest day wins in case of a tie)
+        candidates = days[..., np.newaxis] + np.array([-1., 0., 1.])
+        rounded = np.round(DECYR_EPOCH + candidates/DECYR_DAYS_PER_YEAR, 4)
+        nearest = np.argmin(np.abs(rounded - decyr[..., np.newaxis]), axis=-1)
+        days = np.take_along_axis(candidates, nearest[..., np.newaxis], -1)[..., 0]
+    else:
+        # The decimal year must be the one of a day rounded to 4 decimals
+        # (a small margin accepts both roundings when the 5th decimal is 5)
+        exact = DECYR_EPOCH + days/DECYR_DAYS_PER_YEAR
+        if not np.all(np.abs(decyr - exact) <= 0.5e-4 + 1e-6):
+            raise ValueError('The provided date is not a valid '
+                             'decimal year (computed at noon).')
+
+    timestamp = (days + DECYR_EPOCH_DAY)*ONE_DAY + ONE_DAY//2
+
+    if timestamp.ndim == 0:
+        return float(timestamp)
+    return timestamp
+
+
+def timestamp2decyr(unix_timestamp):
+    """Convert from UNIX timestamp to decimal year YYYY.YYYY"""
+
+    # Any time of the day gives the decimal year of that day
+    days = np.floor(np.asarray(unix_timestamp, dtype=np.float64)/ONE_DAY)
+    decyr = np.round(DECYR_EPOCH + (days - DECYR_EPOCH_DAY)/DECYR_DAYS_PER_YEAR, 4)
+
+    if decyr.ndim == 0:
+        return float(decyr)
+    return decyr
+
+
 ## Decimal year and YYYYMMDD to Numpy datetime64
 
 def decyr2datetime(decyr_date, precise=True):
     """Convert from decimal year YYYY.YYYY to numpy datetime64"""
 
-    ymd_date = decyr2ymd(decyr_date, precise=precise)
+    timestamp = decyr2timestamp(decyr_date, precise=precise)
 
-    startt = time.time()
-    if isinstance(ymd_date, list) or isinstance(ymd_date, np.ndarray):
-        datetime_list = [""] * len(ymd_date)
-        for i, date in enumerate(ymd_date):
-            year, month, day = date[0:4], date[4:6], date[6:8]
-            datetime_list[i] = f'{year}-{month}-{day} 12:00:00Z'
-        return np.array(datetime_list, dtype='datetime64')
-    else:
-        year, month, day = ymd_date[0:4], ymd_date[4:6], ymd_date[6:8]
-        return np.datetime64(f'{year}-{month}-{day} 12:00:00Z')
+    return UNIX_EPOCH + np.int64(timestamp)*ONE_SECOND
 
 def ymd2datetime(ymd_date):
     """Convert from YYYYMMDD date string to numpy datetime64"""
 
-    if isinstance(ymd_date, list) or isinstance(ymd_date, np.ndarray):
-        datetime_list = [""] * len(ymd_date)
-        for i, date in enumerate(ymd_date):
-            year, month, day = date[0:4], date[4:6], date[6:8]
-            datetime_list[i] = np.datetime64(f'{year}-{month}-{day} 12:00:00Z')
-        return np.asarray(datetime_list)
-    else:
-        year, month, day = ymd_date[0:4], ymd_date[4:6], ymd_date[6:8]
-        return np.datetime64(f'{year}-{month}-{day} 12:00:00Z')
+    timestamp = _ymd2days(ymd_date)*ONE_DAY + ONE_DAY//2
+
+    return UNIX_EPOCH + np.int64(timestamp)*ONE_SECOND
+
+def ymd2timestamp(years, months, days):
+    """Convert integer years, months and days to UNIX timestamps (at noon)"""
+
+    years, months, days = (np.asarray(x, dtype=np.int64) for x in (years, months, days))
+
+    dates = (years - 1970).astype('datetime64[Y]') + (months - 1).astype('timedelta64[M]')
+    dates = dates.astype('datetime64[D]') + (days - 1).astype('timedelta64[D]')
+
+    # Invalid dates (e.g. 2015-02-29) overflow to the next month
+    valid = (months >= 1) & (months <= 12) & (days >= 1)
+    valid &= dates.astype('datetime64[M]').astype(np.int64) % 12 == months - 1
+    if not np.all(valid):
+        raise ValueError('The provided date is not a valid date.')
+
+    timestamp = dates.astype(np.int64)*ONE_DAY + ONE_DAY//2
+
+    if timestamp.ndim == 0:
+        return float(timestamp)
+    return np.float64(timestamp)
 
 
 ## Numpy datetime64 to UNIX timestamp and back
@@ -232,6 +357,70 @@ def datetime2timestamp(numpy_datetime64, integer=False):
         return timestamp
 
 
+def cftime2timestamp(values, units, calendar='standard'):
+    """Convert CF time values (e.g. 'days since 1970-01-01') to UNIX timestamps
+
+    Only the calendars matching the numpy (proleptic Gregorian) calendar
+    are supported ('standard' for dates after 1582), missing values (NaN)
+    are kept.
+    """
+
+    if calendar.lower() not in CF_CALENDARS:
+        raise ValueError(f"Unsupported CF calendar '{calendar}'")
+
+    unit, since, origin = units.strip().partition(' since ')
+    unit = unit.strip().lower()
+    if not since or unit not in CF_UNITS:
+        raise ValueError(f"Invalid CF time units '{units}'")
+
+    # Origin 'YYYY-M-D[( |T)h:m[:s[.f]]][ timezone]', the date and time may
+    # be separated by a single 'T' (not to be mixed with the 'T' of 'UTC')
+    origin = origin.strip()
+    if CF_DATE_T.match(origin):
+        origin = origin.replace('T', ' ', 1)
+    match = CF_ORIGIN.match(origin)
+    if not match:
+        raise ValueError(f"Invalid origin in CF time units '{units}'")
+    year, month, day, hour, minute, second, zone = match.groups()
+    # Not necessarily zero-padded in CF, always with numpy
+    origin = np.datetime64(f'{int(year):04d}-{int(month):02d}-{int(day):02d}', 's')
+    offset = 3600*int(hour or 0) + 60*int(minute or 0) + float(second or 0)
+    if zone and zone.upper() not in ('Z', 'UTC', 'GMT'):
+        # Time zone offset '+h', '-hh:mm', 'hhmm'...
+        sign = -1 if zone[0] == '-' else 1
+        zone = zone.lstrip('+-').replace(':', '')
+        hours, minutes = (zone[:-2], zone[-2:]) if len(zone) > 2 else (zone, 0)
+        offset -= sign*(3600*int(hours) + 60*int(minutes))
+
+    timestamp = np.asarray(values, dtype=np.float64)*CF_UNITS[unit]
+    timestamp += datetime2timestamp(origin) + offset
+
+    if timestamp.ndim == 0:
+        return float(timestamp)
+    return timestamp
+
+
+def dates2timerange(start='', end=''):
+    """Convert a date range to UNIX timestamps [tmin, tmax)
+
+    The dates are ISO strings with any precision (e.g. '2015', '2015-06' or
+    '2015-06-30') and the end date is included: '2020' stops at the end
+    of 2020. Empty dates give an unbounded range.
+    """
+
+    tmin, tmax = -np.inf, np.inf
+    if start:
+        tmin = float(datetime2timestamp(np.datetime64(start)))
+    if end:
+        end = np.datetime64(end)
+        unit = np.datetime_data(end.dtype)[0]
+        tmax = float(datetime2timestamp(end + np.timedelta64(1, unit)))
+    if tmin >= tmax:
+        raise ValueError(f'Empty date range [{start}, {end}]')
+
+    return tmin, tmax
+
+
 def timestamp2datetime(unix_timestamp):
     """Convert a UNIX timestamp to numpy datetime64"""
 
@@ -304,7 +493,11 @@ def match_time_vectors(t_target, t_all):
 def get_all_decyr():
     """Return all the decimal year dates listed in decyr.txt"""
 
-    if not DECYR:
+    if DECYR_BACKEND == 'formula':
+        days = np.arange(*np.array(DECYR_RANGE, dtype='datetime64[D]').astype(np.int64) + [0, 1])
+        return [f"{d:09.4f}" for d in timestamp2decyr(days*ONE_DAY)]
+
+    if not DECYR2YMD:
         _init_decyr()
 
     return list(DECYR2YMD.keys())
@@ -339,6 +532,31 @@ def main():
 
     print(my_date, '==', '%.4f' % decyr_date)
 
+    ## Vectorised decimal year <-> UNIX timestamp, checked against decyr.txt
+
+    if not os.path.isfile(DECYR_FILE_TXT):
+        print(f'{DECYR_FILE_TXT} not found, skipping the checks against NGL table')
+        return
+
+    _init_decyr()
+    ymd = np.asarray(list(DECYR2YMD.values()))
+    timestamp = decyr2timestamp(DECYR)
+    assert np.all(timestamp == datetime2timestamp(ymd2datetime(ymd)))
+    assert np.all(timestamp == decyr2timestamp(DECYR, precise=False))
+    assert np.all(timestamp2decyr(timestamp) == DECYR)
+
+    ## Closed-form and table backends give the same results
+
+    assert np.all(decyr2ymd(DECYR) == ymd)
+    assert np.all(ymd2decyr_NGL(ymd) == DECYR)
+    assert get_all_decyr() == DECYR_KEYS
+    set_decyr_backend('table')
+    assert np.all(decyr2ymd(DECYR) == ymd)
+    assert np.all(ymd2decyr_NGL(ymd) == DECYR)
+    set_decyr_backend('formula')
+
+    print('%d dates checked against %s' % (DECYR.size, DECYR_FILE_TXT))
+
 
 if __name__ == '__main__':
     main()